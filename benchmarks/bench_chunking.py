@@ -0,0 +1,87 @@
+"""
+Бенчмарк стратегий разбивки на чанки: recall@k поиска и расход токенов.
+
+Корпус (по умолчанию recipes.txt) разбивается каждой конфигурацией, чанки
+кодируются локальной моделью эмбедингов. Запросы — предложения корпуса;
+попадание засчитывается, если среди top-k чанков есть чанк, содержащий
+середину предложения. Для каждой конфигурации выводятся число чанков,
+средний и максимальный размер чанка в токенах модели, всего токенов на
+индексацию, число чанков длиннее окна модели (обрезаются) и recall@k.
+
+Запуск:
+    python benchmarks/bench_chunking.py [--model NAME] [--corpus PATH] [--k 3]
+        [--configs chars:1000:200,tokens:128:16,sentences:128:16]
+"""
+
+import argparse
+import os
+import re
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+from services.local_backends import TorchBackend
+from utils.chunking import chunk_document, get_token_counter
+
+DEFAULT_CONFIGS = "chars:1000:200,chars:500:100,tokens:256:32,tokens:128:16,sentences:256:32,sentences:128:16"
+
+def load_queries(text: str, min_length: int = 25):
+    """Предложения и строки корпуса как запросы: (текст, середина в документе)"""
+    queries = []
+    for match in re.finditer(r"[^\n.!?]+[.!?]?", text):
+        sentence = match.group().strip()
+        if len(sentence) >= min_length:
+            queries.append((sentence, (match.start() + match.end()) // 2))
+    return queries
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    return vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк стратегий разбивки на чанки")
+    parser.add_argument("--model", default=Config.LOCAL_MODEL_NAME)
+    parser.add_argument("--corpus", default=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "recipes.txt"))
+    parser.add_argument("--configs", default=DEFAULT_CONFIGS, help="стратегия:размер:перекрытие через запятую")
+    parser.add_argument("--k", type=int, default=3)
+    args = parser.parse_args()
+    
+    with open(args.corpus, encoding="utf-8") as f:
+        text = f.read()
+    queries = load_queries(text)
+    
+    backend = TorchBackend(args.model)
+    tokenizer = f"hf:{args.model}"
+    count_tokens = get_token_counter(tokenizer)
+    max_seq_length = getattr(backend.model, "max_seq_length", None) or 512
+    query_vectors = normalize(backend.encode([query for query, _ in queries]))
+    print(f"📚 Корпус: {len(text)} символов, {len(queries)} запросов, модель {args.model} (окно {max_seq_length} токенов)")
+    
+    print()
+    print(
+        f"{'конфигурация':<20} {'чанков':>7} {'ток/чанк':>9} {'макс ток':>9} "
+        f"{'всего ток':>10} {'обрезано':>9} {f'recall@{args.k}':>10} {'время, с':>9}"
+    )
+    for config in args.configs.split(","):
+        strategy, chunk_size, overlap = config.split(":")
+        started = time.perf_counter()
+        chunks = chunk_document(text, None, int(chunk_size), int(overlap), strategy, tokenizer)
+        chunk_vectors = normalize(backend.encode(list(chunks)))
+        elapsed = time.perf_counter() - started
+        
+        tokens = count_tokens(list(chunks))
+        top = np.argsort(-(query_vectors @ chunk_vectors.T), axis=1)[:, :args.k]
+        hits = sum(
+            any(chunks[i].start <= middle < chunks[i].end for i in row)
+            for row, (_, middle) in zip(top, queries)
+        )
+        print(
+            f"{config:<20} {len(chunks):>7} {np.mean(tokens):>9.1f} {max(tokens):>9} {sum(tokens):>10} "
+            f"{sum(1 for t in tokens if t > max_seq_length):>9} {hits / len(queries):>10.3f} {elapsed:>9.2f}"
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Бенчмарк загрузки документа: последовательные этапы против конвейера.
+
+Генерирует PDF из N страниц и загружает его в коллекцию во временной базе
+ChromaDB двумя способами: как раньше (извлечь всё → разбить всё → эмбединги
+всех чанков → запись) и через IngestionPipeline. Эмбединги по умолчанию
+имитируются задержкой на чанк (как у удаленного API), с --model считаются
+локальной моделью. Выводит общее время и время работы каждого этапа.
+
+Запуск:
+    python benchmarks/bench_ingestion_pipeline.py [--pages 300] [--embed-ms 2] [--model NAME]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import fitz  # PyMuPDF
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+from services.file_processor import FileProcessor
+from services.ingestion_pipeline import IngestionPipeline
+from services.vector_store import VectorStore
+from utils.chunking import chunk_document, chunking_settings
+
+class BenchEmbeddingsService:
+    """Минимальный сервис эмбедингов для бенчмарка: задержка на чанк или локальная модель"""
+    
+    tokenizer = None
+    
+    def __init__(self, vector_store: VectorStore, embed_ms: float, model: str = None):
+        self.vector_store = vector_store
+        self.embed_ms = embed_ms
+        self.backend = None
+        if model:
+            from services.local_backends import TorchBackend
+            self.backend = TorchBackend(model)
+    
+    def embed_chunks(self, chunks):
+        if self.backend is not None:
+            return self.backend.encode(list(chunks)).tolist()
+        time.sleep(len(chunks) * self.embed_ms / 1000)
+        return [[float(len(chunk)), 1.0, 0.0] for chunk in chunks]
+    
+    def chunk_records(self, file_id, chunks, metadata=None, start_index=0):
+        ids = [f"{file_id}_{i}" for i in range(start_index, start_index + len(chunks))]
+        metadatas = [{**(metadata or {}), "file_id": file_id, "chunk_index": i} for i in range(start_index, start_index + len(chunks))]
+        return ids, metadatas
+    
+    def delete_document(self, file_id, collection_name):
+        self.vector_store.get_collection(collection_name).delete(where={"file_id": file_id})
+
+def build_pdf(path: str, pages: int):
+    line = "Clause: the parties undertake to perform the terms and conditions of this agreement. "
+    doc = fitz.open()
+    for page_number in range(1, pages + 1):
+        body = f"Page {page_number}\n" + "\n".join(line for _ in range(30))
+        doc.new_page().insert_textbox(fitz.Rect(36, 36, 576, 806), body, fontsize=9, fontname="helv")
+    doc.save(path)
+    doc.close()
+
+def sequential(processor, service, saved, collection, chunking):
+    """Загрузка до конвейера: каждый этап ждет полного завершения предыдущего"""
+    timings = {}
+    started = time.perf_counter()
+    file_data = processor.process_saved_file(saved)
+    timings["extract"] = time.perf_counter() - started
+    
+    stage_started = time.perf_counter()
+    chunks = chunk_document(
+        file_data["text"], file_data["extraction_metadata"],
+        chunking["chunk_size"], chunking["chunk_overlap"], chunking["chunking_strategy"]
+    )
+    timings["chunk"] = time.perf_counter() - stage_started
+    
+    stage_started = time.perf_counter()
+    embeddings = service.embed_chunks(chunks)
+    timings["embed"] = time.perf_counter() - stage_started
+    
+    stage_started = time.perf_counter()
+    ids, metadatas = service.chunk_records(saved["file_id"], chunks, {"total_chunks": len(chunks)})
+    service.vector_store.add(collection, ids=ids, embeddings=embeddings, documents=list(chunks), metadatas=metadatas)
+    timings["write"] = time.perf_counter() - stage_started
+    timings["total"] = time.perf_counter() - started
+    return len(chunks), timings
+
+def report(name, chunks_count, timings):
+    print(
+        f"{name:<12} {chunks_count:>7} {timings['total']:>8.2f} "
+        + " ".join(f"{timings[stage]:>8.2f}" for stage in ("extract", "chunk", "embed", "write"))
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк конвейерной загрузки документа")
+    parser.add_argument("--pages", type=int, default=300)
+    parser.add_argument("--embed-ms", type=float, default=2.0, help="Имитируемая задержка эмбединга на чанк, мс")
+    parser.add_argument("--model", help="Локальная модель вместо имитации эмбедингов")
+    args = parser.parse_args()
+    
+    workdir = tempfile.mkdtemp()
+    upload_dir = os.path.join(workdir, "uploads")
+    os.makedirs(upload_dir)
+    pdf_path = os.path.join(workdir, "bench.pdf")
+    build_pdf(pdf_path, args.pages)
+    print(f"📄 PDF: {args.pages} страниц, эмбединги: {args.model or f'{args.embed_ms} мс на чанк'}")
+    
+    # Последовательный разбор в одном процессе, чтобы сравнивать только перекрытие этапов
+    Config.PDF_PARALLEL_MIN_PAGES = 0
+    processor = FileProcessor(upload_dir, max_file_size=0)
+    service = BenchEmbeddingsService(VectorStore(os.path.join(workdir, "chroma")), args.embed_ms, args.model)
+    chunking = chunking_settings()
+    
+    print()
+    print(f"{'режим':<12} {'чанков':>7} {'всего, с':>8} {'extract':>8} {'chunk':>8} {'embed':>8} {'write':>8}")
+    with open(pdf_path, "rb") as f:
+        saved = processor.save_upload(f, "bench.pdf")
+    report("sequential", *sequential(processor, service, saved, "bench-sequential", chunking))
+    
+    with open(pdf_path, "rb") as f:
+        saved = processor.save_upload(f, "bench.pdf")
+    result = IngestionPipeline(service, "bench-pipeline", chunking).run(
+        saved["file_id"], processor.iter_saved_file(saved), {}
+    )
+    report("pipeline", result["chunks_count"], result["timings"])
+
+if __name__ == "__main__":
+    main()
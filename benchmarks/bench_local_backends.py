@@ -0,0 +1,105 @@
+"""
+Бенчмарк бэкендов локальной модели эмбедингов: torch (fp32), int8, onnx.
+
+Измеряет задержку одиночного запроса (p50/p95), пропускную способность
+батчевой индексации, минимальное косинусное сходство с fp32 и recall@k
+поиска относительно fp32 на корпусе из recipes.txt.
+
+Запуск:
+    python benchmarks/bench_local_backends.py [--model NAME] [--backends torch,int8,onnx]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+from services.local_backends import BACKENDS, TorchBackend, min_cosine_similarity
+
+def load_corpus(path: str, passage_size: int = 500):
+    """Делит текст на фрагменты и берет начало каждого фрагмента как запрос"""
+    with open(path, encoding="utf-8") as f:
+        text = " ".join(f.read().split())
+    passages = [text[i:i + passage_size] for i in range(0, len(text), passage_size)]
+    queries = [passage[:80] for passage in passages[::5]]
+    return passages, queries
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    return vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+
+def top_k(query_vectors: np.ndarray, passage_vectors: np.ndarray, k: int) -> np.ndarray:
+    scores = normalize(query_vectors) @ normalize(passage_vectors).T
+    return np.argsort(-scores, axis=1)[:, :k]
+
+def recall_at_k(reference: np.ndarray, candidate: np.ndarray) -> float:
+    hits = sum(len(set(ref) & set(cand)) for ref, cand in zip(reference, candidate))
+    return hits / reference.size
+
+def bench_backend(backend, passages, queries, batch_size: int):
+    # Прогрев
+    backend.encode(queries[:2])
+    
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        backend.encode([query])
+        latencies.append((time.perf_counter() - started) * 1000)
+    
+    started = time.perf_counter()
+    passage_vectors = np.concatenate([
+        backend.encode(passages[i:i + batch_size]) for i in range(0, len(passages), batch_size)
+    ])
+    elapsed = time.perf_counter() - started
+    
+    return {
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+        "throughput": len(passages) / elapsed,
+        "query_vectors": backend.encode(queries),
+        "passage_vectors": passage_vectors,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк бэкендов локальной модели")
+    parser.add_argument("--model", default=Config.LOCAL_MODEL_NAME)
+    parser.add_argument("--backends", default="torch,int8,onnx")
+    parser.add_argument("--corpus", default=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "recipes.txt"))
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+    
+    passages, queries = load_corpus(args.corpus)
+    print(f"📚 Корпус: {len(passages)} фрагментов, {len(queries)} запросов, модель {args.model}")
+    
+    results = {}
+    for name in [TorchBackend.name] + [b for b in args.backends.split(",") if b and b != TorchBackend.name]:
+        if name not in BACKENDS:
+            print(f"⚠️ Неизвестный бэкенд {name}, пропускаем")
+            continue
+        try:
+            backend = BACKENDS[name](args.model)
+        except ImportError as e:
+            print(f"⚠️ Бэкенд {name} недоступен: {e}")
+            continue
+        results[name] = bench_backend(backend, passages, queries, args.batch_size)
+    
+    reference = results[TorchBackend.name]
+    reference_top = top_k(reference["query_vectors"], reference["passage_vectors"], args.k)
+    
+    print()
+    print(f"{'бэкенд':<8} {'p50, мс':>9} {'p95, мс':>9} {'текст/с':>9} {'min cos':>9} {f'recall@{args.k}':>10}")
+    for name, result in results.items():
+        cosine = min_cosine_similarity(reference["passage_vectors"], result["passage_vectors"])
+        recall = recall_at_k(reference_top, top_k(result["query_vectors"], result["passage_vectors"], args.k))
+        print(
+            f"{name:<8} {result['p50_ms']:>9.2f} {result['p95_ms']:>9.2f} "
+            f"{result['throughput']:>9.1f} {cosine:>9.4f} {recall:>10.3f}"
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Бенчмарк извлечения текста из большого PDF: последовательный разбор
+против пула процессов с разным числом рабочих.
+
+Генерирует документ из N страниц с плотным текстом (или берет готовый PDF),
+измеряет время TextExtractor.extract_text_with_metadata и ускорение
+относительно последовательного режима.
+
+Запуск:
+    python benchmarks/bench_pdf_extraction.py [--pages 2000] [--workers 1,2,4,8] [--pdf PATH]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import fitz  # PyMuPDF
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+from utils.text_extractor import TextExtractor, shutdown_pdf_pool
+
+def build_pdf(path: str, pages: int):
+    """Создает PDF с плотным текстом на каждой странице"""
+    line = "Clause: the parties undertake to perform the terms and conditions of this agreement. "
+    doc = fitz.open()
+    for page_number in range(1, pages + 1):
+        page = doc.new_page()
+        body = f"Page {page_number}\n" + "\n".join(line for _ in range(45))
+        page.insert_textbox(page.rect + (36, 36, -36, -36), body, fontsize=9, fontname="helv")
+    doc.save(path)
+    doc.close()
+
+def measure(pdf_path: str, repeats: int) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        started = time.perf_counter()
+        TextExtractor.extract_text_with_metadata(pdf_path)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк параллельного извлечения текста из PDF")
+    parser.add_argument("--pages", type=int, default=2000)
+    parser.add_argument("--workers", default=",".join(str(n) for n in (1, 2, 4, 8) if n <= (os.cpu_count() or 1)))
+    parser.add_argument("--shard-pages", type=int, default=Config.PDF_PARALLEL_SHARD_PAGES)
+    parser.add_argument("--pdf", help="Готовый PDF вместо сгенерированного")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+    
+    pdf_path = args.pdf
+    if not pdf_path:
+        pdf_path = os.path.join(tempfile.mkdtemp(), "bench.pdf")
+        build_pdf(pdf_path, args.pages)
+    with fitz.open(pdf_path) as doc:
+        total_pages = len(doc)
+    print(f"📄 {pdf_path}: {total_pages} страниц, ядер: {os.cpu_count()}")
+    
+    Config.PDF_PARALLEL_MIN_PAGES = 0
+    sequential = measure(pdf_path, args.repeats)
+    
+    print()
+    print(f"{'режим':<14} {'время, с':>9} {'стр/с':>9} {'ускорение':>10}")
+    print(f"{'sequential':<14} {sequential:>9.2f} {total_pages / sequential:>9.0f} {1.0:>10.2f}")
+    
+    Config.PDF_PARALLEL_MIN_PAGES = 1
+    Config.PDF_PARALLEL_SHARD_PAGES = args.shard_pages
+    for workers in [int(n) for n in args.workers.split(",") if n]:
+        Config.PDF_PARALLEL_WORKERS = workers
+        shutdown_pdf_pool()
+        # Прогрев: запуск процессов пула не входит в замер
+        measure(pdf_path, 1)
+        elapsed = measure(pdf_path, args.repeats)
+        print(f"{f'processes={workers}':<14} {elapsed:>9.2f} {total_pages / elapsed:>9.0f} {sequential / elapsed:>10.2f}")
+    shutdown_pdf_pool()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Микробенчмарк сборки текста документа в TextExtractor.
+
+Сравнивает прежнюю сборку (text += page, копия текста каждой страницы в
+метаданных, несколько text.split() по всему документу) с текущей (join,
+статистика за один проход, смещения страниц вместо копий) на синтетическом
+документе из N страниц: время, пик памяти (tracemalloc) и размер метаданных.
+Затем то же измеряется на полном извлечении сгенерированного PDF.
+
+Запуск:
+    python benchmarks/bench_text_assembly.py [--pages 5000] [--skip-pdf]
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+from utils.text_extractor import TextExtractor
+
+def make_pages(pages: int):
+    line = "Clause {n}: the parties undertake to perform the terms and conditions of this agreement.\n"
+    return [
+        {"page_number": n, "text": "".join(line.format(n=n) for _ in range(40)), "tables": []}
+        for n in range(1, pages + 1)
+    ]
+
+def legacy_assembly(pages):
+    """Сборка текста PDF до рефакторинга"""
+    text = ""
+    pages_data = []
+    for page in pages:
+        page_text = page["text"]
+        pages_data.append({
+            "page_number": page["page_number"],
+            "text": page_text,
+            "word_count": len(page_text.split()),
+            "char_count": len(page_text),
+            "tables": []
+        })
+        text += page_text + "\n"
+    return {
+        "text": text.strip(),
+        "metadata": {
+            "total_pages": len(pages_data),
+            "total_words": len(text.split()),
+            "total_chars": len(text),
+            "pages": pages_data
+        }
+    }
+
+def current_assembly(pages):
+    """Сборка текста как в TextExtractor._extract_from_pdf_with_metadata"""
+    page_texts = []
+    pages_data = []
+    for page in pages:
+        page_text = page["text"]
+        page_texts.append(page_text)
+        pages_data.append({
+            "page_number": page["page_number"],
+            "word_count": len(page_text.split()),
+            "char_count": len(page_text),
+            "tables": []
+        })
+    text, offsets = TextExtractor._join_with_offsets(page_texts)
+    for page_data, (start, end) in zip(pages_data, offsets):
+        page_data["start"], page_data["end"] = start, end
+    return {
+        "text": text,
+        "metadata": {
+            "total_pages": len(pages_data),
+            "total_words": sum(page_data["word_count"] for page_data in pages_data),
+            "total_chars": len(text),
+            "pages": pages_data
+        }
+    }
+
+def measure(func, *args):
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+def report(name, result, elapsed, peak):
+    metadata_size = len(json.dumps(result["metadata"], ensure_ascii=False))
+    print(f"{name:<10} {elapsed * 1000:>10.1f} {peak / 2**20:>11.1f} {metadata_size / 2**20:>14.2f}")
+
+def build_pdf(path: str, pages):
+    import fitz  # PyMuPDF
+    doc = fitz.open()
+    for page in pages:
+        doc.new_page().insert_textbox(fitz.Rect(36, 36, 576, 806), page["text"], fontsize=8, fontname="helv")
+    doc.save(path)
+    doc.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Микробенчмарк сборки текста TextExtractor")
+    parser.add_argument("--pages", type=int, default=5000)
+    parser.add_argument("--skip-pdf", action="store_true", help="Не измерять полное извлечение PDF")
+    args = parser.parse_args()
+    
+    pages = make_pages(args.pages)
+    print(f"📄 Синтетический документ: {args.pages} страниц, {sum(len(p['text']) for p in pages) / 2**20:.1f} МБ текста")
+    print()
+    print(f"{'сборка':<10} {'время, мс':>10} {'пик, МБ':>11} {'метаданные, МБ':>14}")
+    legacy = measure(legacy_assembly, pages)
+    current = measure(current_assembly, pages)
+    report("legacy", *legacy)
+    report("current", *current)
+    assert legacy[0]["text"] == current[0]["text"]
+    assert legacy[0]["metadata"]["total_words"] == current[0]["metadata"]["total_words"]
+    
+    if args.skip_pdf:
+        return
+    
+    pdf_path = os.path.join(tempfile.mkdtemp(), "bench.pdf")
+    build_pdf(pdf_path, pages)
+    Config.PDF_PARALLEL_MIN_PAGES = 0
+    print()
+    print("Полное извлечение PDF (extract_text_with_metadata, последовательно):")
+    report("current", *measure(TextExtractor.extract_text_with_metadata, pdf_path))
+
+if __name__ == "__main__":
+    main()
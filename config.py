@@ -8,13 +8,113 @@ class Config:
     OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
     API_TOKEN = os.getenv("API_TOKEN")
     UPLOAD_DIR = os.getenv("UPLOAD_DIR", "uploads")
+    DATA_DIR = os.getenv("DATA_DIR", "data")  # служебные базы SQLite (кэши, реестры)
+    UPLOAD_READ_CHUNK_SIZE = int(os.getenv("UPLOAD_READ_CHUNK_SIZE", str(1024 * 1024)))  # блок потоковой записи загрузки, байт
+    MAX_UPLOAD_SIZE = int(os.getenv("MAX_UPLOAD_SIZE", str(100 * 1024 * 1024)))  # как client_max_body_size в nginx; 0 — без ограничения
+    TEXT_COMPRESSION = os.getenv("TEXT_COMPRESSION", "none")  # сжатие txt-версий: "none", "gzip" или "zstd" (пакет zstandard)
+    TEXT_COMPRESSION_LEVEL = int(os.getenv("TEXT_COMPRESSION_LEVEL", "0"))  # 0 — уровень по умолчанию (gzip 6, zstd 3)
+    UPLOAD_ORIGINALS = os.getenv("UPLOAD_ORIGINALS", "keep")  # оригинал после загрузки: "keep", "drop" или "archive"
+    ORIGINALS_ARCHIVE_DIR = os.getenv("ORIGINALS_ARCHIVE_DIR", os.path.join(os.getenv("DATA_DIR", "data"), "originals"))
     CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "1000"))
     CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "200"))
+    CHUNKING_STRATEGY = os.getenv("CHUNKING_STRATEGY", "chars")  # "chars", "tokens", "sentences" или "pages"
+    CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", "256"))  # размер чанка для стратегий в токенах
+    CHUNK_TOKEN_OVERLAP = int(os.getenv("CHUNK_TOKEN_OVERLAP", "32"))
     TOP_K = int(os.getenv("TOP_K", "1"))
     
     # Настройки для эмбедингов
-    EMBEDDING_TYPE = os.getenv("EMBEDDING_TYPE", "openai")  # "openai" или "local"
+    EMBEDDING_TYPE = os.getenv("EMBEDDING_TYPE", "openai")  # "openai", "local", "local_int8" или "local_onnx"
     LOCAL_MODEL_NAME = os.getenv("LOCAL_MODEL_NAME", "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2")
+    LOCAL_EMBEDDING_BACKEND = os.getenv("LOCAL_EMBEDDING_BACKEND", "torch")  # бэкенд для типа "local": "torch", "int8" или "onnx"
+    LOCAL_BACKEND_VERIFY = os.getenv("LOCAL_BACKEND_VERIFY", "true").lower() == "true"
+    LOCAL_BACKEND_MIN_COSINE = float(os.getenv("LOCAL_BACKEND_MIN_COSINE", "0.98"))
+    ONNX_CACHE_DIR = os.getenv("ONNX_CACHE_DIR", os.path.join(os.getenv("DATA_DIR", "data"), "onnx"))
+    ONNX_INTRA_OP_THREADS = int(os.getenv("ONNX_INTRA_OP_THREADS", "0"))  # 0 — по числу ядер
+    
+    # Пулы исполнения блокирующих операций
+    PARSING_WORKERS = int(os.getenv("PARSING_WORKERS", "2"))
+    PARSING_POOL_TYPE = os.getenv("PARSING_POOL_TYPE", "thread")  # "thread" или "process"
+    EMBEDDING_WORKERS = int(os.getenv("EMBEDDING_WORKERS", "8"))
+    IO_WORKERS = int(os.getenv("IO_WORKERS", "16"))
+    PIPELINE_WORKERS = int(os.getenv("PIPELINE_WORKERS", "4"))  # одновременных синхронных загрузок и обновлений
+    EXECUTOR_MAX_QUEUE = int(os.getenv("EXECUTOR_MAX_QUEUE", "100"))  # 0 — без ограничения
+
+    # Настройки HTTP-клиента OpenRouter
+    OPENROUTER_BASE_URL = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1/chat/completions")
+    LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "200"))
+    LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "50"))
+    LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "60"))
+    LLM_HTTP2 = os.getenv("LLM_HTTP2", "true").lower() == "true"  # используется, если установлен пакет h2
+    LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "30"))
+    LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "10"))
+    LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+    LLM_RETRY_BACKOFF = float(os.getenv("LLM_RETRY_BACKOFF", "0.5"))
+    LLM_MAX_RETRY_DELAY = float(os.getenv("LLM_MAX_RETRY_DELAY", "10"))
+    
+    # Путь к базе ChromaDB
+    CHROMA_DB_PATH = os.getenv("CHROMA_DB_PATH", "./chroma_db")
+    CHROMA_WRITE_BATCH_SIZE = int(os.getenv("CHROMA_WRITE_BATCH_SIZE", "5000"))  # записей в одном collection.add
+    
+    # Кэш эмбедингов поисковых запросов
+    QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "1024"))
+    QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", "3600"))  # 0 — без ограничения
+    QUERY_CACHE_DISK_PATH = os.getenv("QUERY_CACHE_DISK_PATH", "")  # пусто — только в памяти
+    QUERY_CACHE_DISK_SIZE = int(os.getenv("QUERY_CACHE_DISK_SIZE", "100000"))  # записей на диске, сверх — LRU
+    
+    # Хранилище эмбедингов чанков (повторно загруженные чанки не эмбедятся заново)
+    CHUNK_CACHE_ENABLED = os.getenv("CHUNK_CACHE_ENABLED", "true").lower() == "true"
+    CHUNK_CACHE_PATH = os.getenv("CHUNK_CACHE_PATH", os.path.join(DATA_DIR, "chunk_embeddings.sqlite3"))
+    CHUNK_CACHE_MAX_SIZE = int(os.getenv("CHUNK_CACHE_MAX_SIZE", "200000"))  # эмбедингов, сверх — LRU
+    
+    # Батчинг запросов эмбедингов к OpenAI
+    EMBEDDING_BATCH_MAX_TOKENS = int(os.getenv("EMBEDDING_BATCH_MAX_TOKENS", "50000"))
+    EMBEDDING_BATCH_MAX_ITEMS = int(os.getenv("EMBEDDING_BATCH_MAX_ITEMS", "256"))
+    EMBEDDING_BATCH_CONCURRENCY = int(os.getenv("EMBEDDING_BATCH_CONCURRENCY", "4"))
+    EMBEDDING_BATCH_MAX_RETRIES = int(os.getenv("EMBEDDING_BATCH_MAX_RETRIES", "3"))
+    EMBEDDING_BATCH_RETRY_BACKOFF = float(os.getenv("EMBEDDING_BATCH_RETRY_BACKOFF", "1.0"))
+    EMBEDDING_MAX_INPUT_TOKENS = int(os.getenv("EMBEDDING_MAX_INPUT_TOKENS", "8191"))  # лимит модели на один текст
+    
+    # Микро-батчинг инференса локальной модели
+    MICRO_BATCH_ENABLED = os.getenv("MICRO_BATCH_ENABLED", "true").lower() == "true"
+    MICRO_BATCH_MAX_SIZE = int(os.getenv("MICRO_BATCH_MAX_SIZE", "32"))
+    MICRO_BATCH_MAX_WAIT_MS = float(os.getenv("MICRO_BATCH_MAX_WAIT_MS", "5"))
+    MICRO_BATCH_BUCKETS = [int(x) for x in os.getenv("MICRO_BATCH_BUCKETS", "128,512").split(",") if x.strip()]
+    
+    # Фоновая очередь заданий загрузки
+    UPLOAD_BACKGROUND = os.getenv("UPLOAD_BACKGROUND", "false").lower() == "true"  # значение по умолчанию для /upload?background=
+    INGESTION_WORKERS = int(os.getenv("INGESTION_WORKERS", "2"))
+    INGESTION_MAX_QUEUE = int(os.getenv("INGESTION_MAX_QUEUE", "100"))  # 0 — без ограничения
+    INGESTION_DB_PATH = os.getenv("INGESTION_DB_PATH", os.path.join(DATA_DIR, "ingestion_jobs.sqlite3"))
+    INGESTION_JOB_TTL = int(os.getenv("INGESTION_JOB_TTL", str(7 * 24 * 3600)))  # хранение завершенных заданий, сек
+    
+    # Реестр загруженных документов: повторная загрузка того же файла в коллекцию не обрабатывается заново
+    FILE_REGISTRY_PATH = os.getenv("FILE_REGISTRY_PATH", os.path.join(DATA_DIR, "file_registry.sqlite3"))
+    
+    # ИИ-распознавание страниц PDF без текстового слоя
+    AI_OCR_CONCURRENCY = int(os.getenv("AI_OCR_CONCURRENCY", "4"))  # страниц одного документа одновременно
+    AI_OCR_RATE_LIMIT = float(os.getenv("AI_OCR_RATE_LIMIT", "60"))  # запросов в минуту на процесс, 0 — без ограничения
+    AI_OCR_MAX_RETRIES = int(os.getenv("AI_OCR_MAX_RETRIES", "3"))
+    AI_OCR_RETRY_BACKOFF = float(os.getenv("AI_OCR_RETRY_BACKOFF", "2.0"))
+    AI_OCR_MAX_IMAGE_SIDE = int(os.getenv("AI_OCR_MAX_IMAGE_SIDE", "2000"))  # пикселей по длинной стороне страницы
+    AI_OCR_MAX_DPI = int(os.getenv("AI_OCR_MAX_DPI", "200"))
+    AI_OCR_JPEG_QUALITY = int(os.getenv("AI_OCR_JPEG_QUALITY", "80"))
+    # Классификация страниц PDF: меньше стольких символов текста — страница считается сканом
+    PDF_MIN_PAGE_CHARS = int(os.getenv("PDF_MIN_PAGE_CHARS", "20"))
+    # Доля площади страницы под изображениями вне текстового слоя, начиная с которой страница с текстом считается смешанной
+    PDF_MIXED_IMAGE_COVERAGE = float(os.getenv("PDF_MIXED_IMAGE_COVERAGE", "0.5"))
+    # Параллельное извлечение текста больших PDF: диапазоны страниц разбираются в пуле процессов
+    PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "300"))  # 0 — всегда последовательно
+    PDF_PARALLEL_WORKERS = int(os.getenv("PDF_PARALLEL_WORKERS", str(os.cpu_count() or 1)))
+    PDF_PARALLEL_SHARD_PAGES = int(os.getenv("PDF_PARALLEL_SHARD_PAGES", "50"))  # страниц в одной задаче пула
+    
+    # Пакетная загрузка (/upload/batch)
+    BATCH_UPLOAD_MAX_FILES = int(os.getenv("BATCH_UPLOAD_MAX_FILES", "5000"))  # документов в одном запросе
+    BATCH_EMBED_MAX_CHUNKS = int(os.getenv("BATCH_EMBED_MAX_CHUNKS", "2000"))  # чанков в одной порции эмбедингов и записи
+    
+    # Конвейер загрузки документа: извлечение → чанки → эмбединги → запись в ChromaDB
+    PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "8"))  # порций в очереди между этапами
+    PIPELINE_EMBED_BATCH = int(os.getenv("PIPELINE_EMBED_BATCH", "64"))  # чанков в одной порции эмбедингов
+    PIPELINE_WRITE_BATCH = int(os.getenv("PIPELINE_WRITE_BATCH", "256"))  # записей в одном collection.add
     
     # Создаем директорию для загрузок если её нет
     os.makedirs(UPLOAD_DIR, exist_ok=True) 
\ No newline at end of file
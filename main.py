@@ -1,7 +1,8 @@
-import os
+import json
+import asyncio
 from fastapi import FastAPI, File, UploadFile, HTTPException, Depends, Form, Query
-from fastapi.responses import JSONResponse
-from typing import List
+from fastapi.responses import JSONResponse, StreamingResponse
+from typing import List, Any, Callable, Dict, Optional
 
 from config import Config
 from auth import verify_token
@@ -9,13 +10,26 @@ from models import (
     QueryRequest, QueryResponse, UploadResponse, DeleteResponse, 
     ErrorResponse, ApiKeyRequest, ApiKeyResponse, 
     EmbeddingTypeRequest, EmbeddingTypeResponse,
-    CollectionRequest, CollectionResponse, ListCollectionsResponse
+    CollectionRequest, CollectionResponse, ListCollectionsResponse,
+    ExecutorsStatusResponse, EmbeddingCacheStatusResponse,
+    UploadJobResponse, JobStatusResponse,
+    BatchFileResult, BatchUploadResponse,
+    FileRecord, FilesListResponse
 )
-from utils.text_extractor import TextExtractor
+from utils.text_extractor import shutdown_pdf_pool
+from utils.chunking import chunk_document, chunking_settings
 from services.embeddings_factory import EmbeddingsFactory
+from services.model_registry import ModelRegistry
 from services.llm_service import LLMService
-from services.file_processor import FileProcessor
+from services.file_processor import FileProcessor, FileTooLargeError
 from services.collections_service import CollectionsService
+from services.executor_service import ExecutorService, ExecutorOverloadedError
+from services.ingestion_jobs import IngestionJobQueue, JobProgress, QueueFullError
+from services.ingestion_pipeline import IngestionPipeline
+from services.file_registry import FileRegistry
+from services.document_updater import DocumentUpdater
+from services.embedding_cache import get_query_embedding_cache
+from services.chunk_embedding_store import get_chunk_embedding_store
 
 app = FastAPI(
     title="RAG API",
@@ -23,58 +37,563 @@ app = FastAPI(
     version="1.0.0"
 )
 
-# Инициализируем сервисы
-embeddings_service = EmbeddingsFactory.create_embeddings_service()
+# Инициализируем сервисы (сервис эмбедингов загружается в фоне через реестр моделей)
+model_registry = ModelRegistry(EmbeddingsFactory.create_embeddings_service, Config.EMBEDDING_TYPE)
 llm_service = LLMService()
 file_processor = FileProcessor(Config.UPLOAD_DIR)
 collections_service = CollectionsService()
+executors = ExecutorService()
+file_registry = FileRegistry(Config.FILE_REGISTRY_PATH)
+
+def _build_file_metadata(file_data: Dict[str, Any], chunks: List[str]) -> Dict[str, Any]:
+    """Метаданные документа, сохраняемые вместе с чанками"""
+    return {
+        **_base_file_metadata(file_data),
+        "total_chunks": len(chunks),
+        "extraction_metadata": file_data['extraction_metadata']
+    }
+
+def _base_file_metadata(saved: Dict[str, Any]) -> Dict[str, Any]:
+    """Метаданные документа, известные до извлечения текста"""
+    return {
+        "filename": saved['original_filename'],
+        "file_size": saved['file_size'],
+        "content_hash": saved['content_hash'],
+        "file_type": saved['file_type'],
+        # Где оригинал будет храниться после загрузки (UPLOAD_ORIGINALS)
+        "original_path": file_processor.stored_original_path(saved['file_id'], saved['file_type']),
+        "txt_path": file_processor.txt_path(saved['file_id'])
+    }
+
+def _run_pipeline(
+    embeddings_service,
+    saved: Dict[str, Any],
+    collection: str,
+    chunking: Dict[str, Any],
+    on_page: Optional[Callable[[int, int], None]] = None,
+    on_chunks: Optional[Callable[[int], None]] = None,
+    embed: Optional[Callable[[List[str]], List[List[float]]]] = None
+) -> Dict[str, Any]:
+    """Загружает сохраненный файл конвейером: извлечение, разбивка, эмбединги и запись идут одновременно"""
+    return IngestionPipeline(embeddings_service, collection, chunking, embed=embed).run(
+        saved['file_id'],
+        file_processor.iter_saved_file(saved, on_page),
+        _base_file_metadata(saved),
+        on_chunks
+    )
+
+def _pooled_embed(embeddings_service) -> Callable[[List[str]], List[List[float]]]:
+    """Эмбединги для конвейера, работающего в пуле PIPELINE: каждая порция считается
+    в пуле эмбедингов, поэтому загрузки делят его с поиском, а не занимают целиком"""
+    embedding_pool = executors.get_pool(ExecutorService.EMBEDDING)
+    return lambda chunks: embedding_pool.submit(embeddings_service.embed_chunks, chunks).result()
+
+def _register_document(embeddings_service, collection: str, saved: Dict[str, Any], chunks_count: int):
+    """Отмечает документ загруженным в реестре; прежние копии того же файла (загрузка с force) удаляются.
+    Оригинал после успешной загрузки оставляется, удаляется или архивируется (UPLOAD_ORIGINALS)"""
+    saved = {**saved, "original_path": file_processor.store_original(saved)}
+    for replaced in file_registry.complete(collection, saved, chunks_count):
+        embeddings_service.delete_document(replaced["file_id"], collection)
+        file_processor.delete_file_versions(replaced["file_id"], replaced)
+
+def _remove_collection_files(collection: str):
+    """Снимает с учета документы коллекции и удаляет их файлы (при удалении или очистке коллекции)"""
+    for record in file_registry.remove_collection(collection):
+        file_processor.delete_file_versions(record["file_id"], record)
+
+def _remove_unregistered_legacy_files():
+    """Удаляет файлы в корне uploads (загрузки до разбиения по каталогам), которых нет в реестре:
+    их коллекция неизвестна, поэтому, как и до появления реестра, они удаляются при очистке"""
+    for file_id in file_processor.legacy_file_ids():
+        if file_registry.get(file_id) is None:
+            file_processor.delete_file_versions(file_id)
+
+def _abandon_uploads(collection: str, saved_files: List[Dict[str, Any]], embeddings_service=None):
+    """Снимает с учета загрузки, обработка которых не состоялась, и удаляет их файлы.
+    С сервисом эмбедингов удаляются и чанки, которые уже могли быть записаны в коллекцию"""
+    for saved in saved_files:
+        if embeddings_service is None:
+            file_processor.discard_upload(saved)
+        else:
+            embeddings_service.delete_document(saved['file_id'], collection)
+            file_processor.delete_file_versions(saved['file_id'], saved)
+        file_registry.release(saved['file_id'])
+
+def _claim_upload(collection: str, saved: Dict[str, Any], force: bool) -> Optional[Dict[str, Any]]:
+    """Регистрирует загрузку; если такой файл уже есть в коллекции, удаляет новую копию
+    и возвращает запись существующего документа"""
+    if force:
+        return None
+    existing = file_registry.claim(collection, saved)
+    if existing is not None:
+        file_processor.discard_upload(saved)
+    return existing
+
+def _document_exists(embeddings_service, collection: str, file_id: str) -> bool:
+    return bool(embeddings_service.get_collection(collection).get(where={"file_id": file_id}, limit=1, include=[])["ids"])
+
+def _run_update(
+    embeddings_service,
+    saved: Dict[str, Any],
+    file_id: str,
+    collection: str,
+    chunking: Dict[str, Any],
+    embed: Optional[Callable[[List[str]], List[List[float]]]] = None
+) -> Dict[str, Any]:
+    """Обновляет документ file_id новой редакцией (сохраненным файлом): эмбединги
+    и записи в ChromaDB только для изменившихся чанков"""
+    file_data = file_processor.process_saved_file(saved)
+    chunks = chunk_document(*_chunk_document_args(file_data, chunking, embeddings_service.tokenizer))
+    
+    # Метаданные ссылаются на файлы документа, под которые новая редакция переносится после записи
+    target = {**file_data, "file_id": file_id}
+    changes = DocumentUpdater(embeddings_service, collection, embed).update(file_id, chunks, _build_file_metadata(target, chunks))
+    
+    file_data = file_processor.replace_file_versions(file_id, file_data, file_registry.get(file_id))
+    _register_document(embeddings_service, collection, file_data, len(chunks))
+    return {"file_data": file_data, "chunks_count": len(chunks), "changes": changes}
+
+def _chunk_document_args(file_data: Dict[str, Any], chunking: Dict[str, Any], tokenizer: str) -> tuple:
+    """Аргументы chunk_document для документа (передаются в пул разбора как есть)"""
+    return (
+        file_data['text'],
+        file_data['extraction_metadata'],
+        chunking['chunk_size'],
+        chunking['chunk_overlap'],
+        chunking['chunking_strategy'],
+        tokenizer
+    )
+
+async def _resolve_chunking(
+    collection: str,
+    chunking_strategy: Optional[str],
+    chunk_size: Optional[int],
+    chunk_overlap: Optional[int]
+) -> Dict[str, Any]:
+    """Параметры разбивки: параметры загрузки, затем настройки коллекции, затем Config"""
+    collection_chunking = await executors.run(ExecutorService.IO, collections_service.get_chunking, collection)
+    return chunking_settings(
+        {"chunking_strategy": chunking_strategy, "chunk_size": chunk_size, "chunk_overlap": chunk_overlap},
+        collection_chunking
+    )
+
+def _run_ingestion_job(payload: Dict[str, Any], progress: JobProgress) -> Dict[str, Any]:
+    """Выполняет задание фоновой загрузки: извлечение текста → чанки → эмбединги конвейером"""
+    saved = payload["saved"]
+    try:
+        # Тип эмбедингов зафиксирован при постановке задания
+        embeddings_service = model_registry.load(payload["embedding_type"]).result()
+        
+        with progress.stage("pipeline"):
+            result = _run_pipeline(
+                embeddings_service,
+                saved,
+                payload["collection"],
+                payload.get("chunking") or chunking_settings(),
+                on_page=lambda done, total: progress.update(pages_done=done, pages_total=total),
+                on_chunks=lambda done: progress.update(chunks_done=done)
+            )
+            progress.update(chunks_done=result["chunks_count"], chunks_total=result["chunks_count"])
+        # Этапы конвейера идут одновременно: их время работы без ожидания друг друга
+        progress.timings.update(result["timings"])
+        _register_document(embeddings_service, payload["collection"], saved, result["chunks_count"])
+    except Exception:
+        file_registry.release(saved['file_id'])
+        file_processor.delete_file_versions(saved['file_id'], saved)
+        raise
+    
+    return {"file_id": saved['file_id'], "filename": saved['original_filename'], "chunks_count": result["chunks_count"]}
+
+ingestion_queue = IngestionJobQueue(
+    Config.INGESTION_DB_PATH,
+    _run_ingestion_job,
+    workers=Config.INGESTION_WORKERS,
+    max_queue=Config.INGESTION_MAX_QUEUE,
+    job_ttl=Config.INGESTION_JOB_TTL
+)
+
+@app.on_event("startup")
+async def preload_embeddings_service():
+    # Модель начинает загружаться сразу, но старт приложения ее не ждет
+    model_registry.load()
+
+def _release_stale_uploads():
+    """Снимает с учета загрузки, прерванные остановкой процесса (синхронные загрузки
+    и задания, которых больше нет в очереди), и удаляет их частично записанные чанки и файлы"""
+    active = {payload["saved"]["file_id"] for payload in ingestion_queue.pending_payloads()}
+    vector_store = collections_service.vector_store
+    for record in file_registry.release_stale(active):
+        collection = vector_store.get_collection(record["collection"])
+        ids = collection.get(where={"file_id": record["file_id"]}, include=[])["ids"]
+        if ids:
+            vector_store.delete(record["collection"], ids)
+        file_processor.delete_file_versions(record["file_id"], record)
+
+@app.on_event("startup")
+async def start_ingestion_queue():
+    # Записи заданий, оставшихся в очереди, сохраняются: задания выполнятся после запуска очереди
+    await executors.run(ExecutorService.IO, _release_stale_uploads)
+    ingestion_queue.start()
+
+@app.on_event("shutdown")
+async def shutdown_executors():
+    executors.shutdown(wait=False)
+    model_registry.shutdown()
+    ingestion_queue.shutdown()
+    shutdown_pdf_pool()
+
+@app.on_event("shutdown")
+async def shutdown_llm_client():
+    await llm_service.aclose()
 
 @app.post("/upload", response_model=UploadResponse)
 async def upload_file(
     file: UploadFile = File(...),
     collection: str = Query(..., description="Название коллекции"),
+    background: bool = Query(Config.UPLOAD_BACKGROUND, description="Обработать в фоновой очереди и сразу вернуть id задания"),
+    force: bool = Query(False, description="Обработать заново, даже если такой файл уже загружен в коллекцию"),
+    chunking_strategy: Optional[str] = Query(None, description="Стратегия разбивки: chars, tokens, sentences, pages"),
+    chunk_size: Optional[int] = Query(None, description="Размер чанка (символов для chars, иначе токенов)"),
+    chunk_overlap: Optional[int] = Query(None, description="Перекрытие чанков"),
     token: str = Depends(verify_token)
 ):
-    """Загружает файл, конвертирует в txt и сохраняет эмбединги"""
+    """Загружает файл, конвертирует в txt и сохраняет эмбединги.
+    С background=true файл только сохраняется, обработка ставится в очередь,
+    а ответ 202 содержит job_id для опроса через /jobs/{job_id}.
+    Файл, уже загруженный в коллекцию (по SHA-256 содержимого), не обрабатывается
+    повторно: возвращается file_id существующего документа (если не задан force)
+    """
     try:
         # Проверяем, что файл не пустой
         if not file.filename:
             raise HTTPException(status_code=400, detail="Имя файла не может быть пустым")
         
-        # Читаем содержимое файла
-        content = await file.read()
+        # Параметры загрузки переопределяют настройки разбивки коллекции
+        chunking = await _resolve_chunking(collection, chunking_strategy, chunk_size, chunk_overlap)
         
-        # Обрабатываем файл через FileProcessor
-        file_data = file_processor.process_uploaded_file(content, file.filename)
+        # Потоково копируем тело загрузки на диск блоками, попутно считая размер и хэш
+        saved = await executors.run(ExecutorService.IO, file_processor.save_upload, file.file, file.filename)
         
-        # Разбиваем текст на чанки
-        chunks = TextExtractor.chunk_text(
-            file_data['text'], 
-            Config.CHUNK_SIZE, 
-            Config.CHUNK_OVERLAP
-        )
+        # Тот же файл уже загружен в коллекцию: извлечение и эмбединги не повторяются
+        existing = await executors.run(ExecutorService.IO, _claim_upload, collection, saved, force)
+        if existing is not None:
+            return UploadResponse(
+                file_id=existing['file_id'],
+                filename=existing['filename'],
+                chunks_count=existing['chunks_count'],
+                message="Файл уже загружен в коллекцию, повторная обработка не выполнялась",
+                processing_info={"duplicate": True, "status": existing['status']}
+            )
         
-        # Подготавливаем метаданные для сохранения
-        file_metadata = {
-            "filename": file_data['original_filename'],
-            "file_size": file_data['file_size'],
-            "total_chunks": len(chunks),
-            "file_type": file_data['file_type'],
-            "original_path": file_data['original_path'],
-            "txt_path": file_data['txt_path'],
-            "extraction_metadata": file_data['extraction_metadata']
-        }
+        if background:
+            try:
+                job_id = await executors.run(ExecutorService.IO, ingestion_queue.submit, {
+                    "saved": saved,
+                    "collection": collection,
+                    "embedding_type": model_registry.active_type,
+                    "chunking": chunking
+                })
+            except (QueueFullError, ExecutorOverloadedError):
+                await executors.run(ExecutorService.IO, _abandon_uploads, collection, [saved])
+                raise
+            
+            return JSONResponse(
+                status_code=202,
+                content=UploadJobResponse(
+                    job_id=job_id,
+                    file_id=saved['file_id'],
+                    filename=saved['original_filename'],
+                    status=IngestionJobQueue.QUEUED,
+                    message="Файл сохранен, обработка поставлена в очередь"
+                ).dict()
+            )
         
-        # Сохраняем эмбединги
-        embeddings_service.store_document(file_data['file_id'], chunks, file_metadata, collection)
+        # Извлечение, разбивка, эмбединги и запись идут конвейером: эмбединги первых
+        # страниц считаются, пока разбираются следующие
+        embeddings_service = None
+        try:
+            # Сервис фиксируется на весь запрос, даже если тип переключат; его токенизатор нужен для разбивки
+            embeddings_service = await model_registry.get()
+            # Конвейер идет в пуле PIPELINE, в пул эмбедингов попадают только вызовы модели
+            result = await executors.run(
+                ExecutorService.PIPELINE, _run_pipeline, embeddings_service, saved, collection, chunking,
+                embed=_pooled_embed(embeddings_service)
+            )
+            await executors.run(
+                ExecutorService.IO, _register_document, embeddings_service, collection, saved, result["chunks_count"]
+            )
+        except ExecutorOverloadedError:
+            await executors.run(ExecutorService.IO, _abandon_uploads, collection, [saved])
+            raise
+        except Exception:
+            # Ошибка могла случиться при регистрации уже записанного документа: удаляются и чанки
+            await executors.run(ExecutorService.IO, _abandon_uploads, collection, [saved], embeddings_service)
+            raise
+        file_data = result["file_data"]
         
         return UploadResponse(
             file_id=file_data['file_id'],
             filename=file_data['original_filename'],
-            chunks_count=len(chunks),
-            message="Файл успешно загружен, конвертирован в txt и обработан"
+            chunks_count=result["chunks_count"],
+            message="Файл успешно загружен, конвертирован в txt и обработан",
+            processing_info={"chunking": chunking, "timings": result["timings"]}
+        )
+        
+    except ExecutorOverloadedError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
+    except FileTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/upload/batch", response_model=BatchUploadResponse)
+async def upload_batch(
+    files: List[UploadFile] = File(...),
+    collection: str = Query(..., description="Название коллекции"),
+    force: bool = Query(False, description="Обработать заново файлы, уже загруженные в коллекцию"),
+    chunking_strategy: Optional[str] = Query(None, description="Стратегия разбивки: chars, tokens, sentences, pages"),
+    chunk_size: Optional[int] = Query(None, description="Размер чанка (символов для chars, иначе токенов)"),
+    chunk_overlap: Optional[int] = Query(None, description="Перекрытие чанков"),
+    token: str = Depends(verify_token)
+):
+    """Загружает много документов за один запрос: отдельные файлы и/или zip/tar архивы.
+    Документы разбираются параллельно, чанки всех документов объединяются в крупные
+    порции эмбедингов и записи в ChromaDB. Возвращает результат по каждому файлу.
+    Файлы, уже загруженные в коллекцию, получают статус duplicate с file_id
+    существующего документа (если не задан force).
+    """
+    results: List[Dict[str, Any]] = []
+    saved_files: List[tuple] = []
+    
+    try:
+        chunking = await _resolve_chunking(collection, chunking_strategy, chunk_size, chunk_overlap)
+        
+        # Сохраняем файлы на диск (архивы распаковываются потоково)
+        for upload in files:
+            if not upload.filename:
+                raise HTTPException(status_code=400, detail="Имя файла не может быть пустым")
+            
+            remaining = Config.BATCH_UPLOAD_MAX_FILES - len(saved_files)
+            if remaining <= 0:
+                raise ValueError(f"В одном запросе можно загрузить не больше {Config.BATCH_UPLOAD_MAX_FILES} документов")
+            
+            if FileProcessor.is_archive(upload.filename):
+                entries = await executors.run(
+                    ExecutorService.IO, file_processor.save_archive, upload.file, upload.filename, remaining
+                )
+            else:
+                try:
+                    entries = [await executors.run(ExecutorService.IO, file_processor.save_upload, upload.file, upload.filename)]
+                except ValueError as e:
+                    entries = [{"original_filename": upload.filename, "error": str(e)}]
+            
+            for entry in entries:
+                result = {"filename": entry["original_filename"], "status": "error", "error": entry.get("error")}
+                existing = None
+                if "file_id" in entry:
+                    existing = await executors.run(ExecutorService.IO, _claim_upload, collection, entry, force)
+                if existing is not None:
+                    result.update(status="duplicate", file_id=existing['file_id'], chunks_count=existing['chunks_count'])
+                elif "file_id" in entry:
+                    saved_files.append((len(results), entry))
+                elif entry.get("skipped"):
+                    result["status"] = "skipped"
+                results.append(result)
+    except Exception as e:
+        await executors.run(ExecutorService.IO, _abandon_uploads, collection, [saved for _, saved in saved_files])
+        if isinstance(e, HTTPException):
+            raise
+        if isinstance(e, ExecutorOverloadedError):
+            raise HTTPException(status_code=503, detail=str(e))
+        if isinstance(e, ValueError):
+            raise HTTPException(status_code=400, detail=str(e))
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    embeddings_service = None
+    # Документы, обработка которых завершена (успешно или со снятием с учета)
+    finished = set()
+    # Ограничиваем число одновременно отправленных задач, чтобы не переполнить очередь пула разбора
+    parse_slots = asyncio.Semaphore(max(1, Config.PARSING_WORKERS) * 2)
+    
+    async def parse(index: int, saved: Dict[str, Any]):
+        async with parse_slots:
+            try:
+                file_data = await executors.run(ExecutorService.PARSING, file_processor.process_saved_file, saved)
+                chunks = await executors.run(
+                    ExecutorService.PARSING,
+                    chunk_document,
+                    *_chunk_document_args(file_data, chunking, embeddings_service.tokenizer)
+                )
+                return index, file_data, chunks, None
+            except Exception as e:
+                await executors.run(ExecutorService.IO, _abandon_uploads, collection, [saved])
+                finished.add(index)
+                return index, None, None, str(e)
+    
+    pending: List[tuple] = []
+    
+    async def flush():
+        # Одна порция: общий запрос эмбедингов и крупные записи в ChromaDB
+        documents = [
+            (file_data['file_id'], chunks, _build_file_metadata(file_data, chunks))
+            for _, file_data, chunks in pending
+        ]
+        try:
+            await executors.run(ExecutorService.EMBEDDING, embeddings_service.store_documents, documents, collection)
+        except Exception as e:
+            # Часть порции могла быть записана до ошибки: чанки документов удаляются вместе с файлами
+            await executors.run(
+                ExecutorService.IO, _abandon_uploads, collection,
+                [file_data for _, file_data, _ in pending], embeddings_service
+            )
+            for index, _, _ in pending:
+                results[index]["error"] = str(e)
+                finished.add(index)
+        else:
+            for index, file_data, chunks in pending:
+                try:
+                    await executors.run(
+                        ExecutorService.IO, _register_document, embeddings_service, collection, file_data, len(chunks)
+                    )
+                except Exception as e:
+                    await executors.run(ExecutorService.IO, _abandon_uploads, collection, [file_data], embeddings_service)
+                    results[index]["error"] = str(e)
+                else:
+                    results[index].update(status="success", file_id=file_data['file_id'], chunks_count=len(chunks))
+                finished.add(index)
+        pending.clear()
+    
+    parsing: List[asyncio.Future] = []
+    try:
+        embeddings_service = await model_registry.get()
+        
+        # Разбор идет параллельно с сохранением уже готовых порций
+        parsing = [asyncio.ensure_future(parse(index, saved)) for index, saved in saved_files]
+        pending_chunks = 0
+        for next_parsed in asyncio.as_completed(parsing):
+            index, file_data, chunks, error = await next_parsed
+            if error:
+                results[index]["error"] = error
+                continue
+            pending.append((index, file_data, chunks))
+            pending_chunks += len(chunks)
+            if pending_chunks >= Config.BATCH_EMBED_MAX_CHUNKS:
+                await flush()
+                pending_chunks = 0
+        if pending:
+            await flush()
+    except Exception as e:
+        # Загрузка прервана (модель не загрузилась, пул перегружен): необработанные документы снимаются с учета
+        for task in parsing:
+            task.cancel()
+        await executors.run(
+            ExecutorService.IO, _abandon_uploads, collection,
+            [saved for index, saved in saved_files if index not in finished], embeddings_service
+        )
+        if isinstance(e, ExecutorOverloadedError):
+            raise HTTPException(status_code=503, detail=str(e))
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    succeeded = sum(1 for result in results if result["status"] == "success")
+    failed = sum(1 for result in results if result["status"] == "error")
+    duplicates = sum(1 for result in results if result["status"] == "duplicate")
+    return BatchUploadResponse(
+        collection=collection,
+        files=[BatchFileResult(**result) for result in results],
+        total_files=len(results),
+        succeeded=succeeded,
+        failed=failed,
+        chunks_count=sum(result.get("chunks_count", 0) for result in results if result["status"] == "success"),
+        chunking=chunking,
+        message=f"Обработано документов: {succeeded}, уже загружено ранее: {duplicates}, с ошибками: {failed}"
+    )
+
+@app.get("/files", response_model=FilesListResponse)
+async def list_files(
+    collection: Optional[str] = Query(None, description="Только документы коллекции"),
+    limit: int = Query(100, ge=1, le=1000, description="Размер страницы"),
+    offset: int = Query(0, ge=0, description="Сколько записей пропустить"),
+    token: str = Depends(verify_token)
+):
+    """Постраничный список загруженных документов из реестра (новые первыми)"""
+    try:
+        files, total = await executors.run(ExecutorService.IO, file_registry.list_files, collection, limit, offset)
+        return FilesListResponse(
+            files=[FileRecord(**record) for record in files],
+            total=total,
+            limit=limit,
+            offset=offset
         )
+    except ExecutorOverloadedError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.put("/file/{file_id}", response_model=UploadResponse)
+async def update_file(
+    file_id: str,
+    file: UploadFile = File(...),
+    collection: str = Query(..., description="Название коллекции"),
+    chunking_strategy: Optional[str] = Query(None, description="Стратегия разбивки: chars, tokens, sentences, pages"),
+    chunk_size: Optional[int] = Query(None, description="Размер чанка (символов для chars, иначе токенов)"),
+    chunk_overlap: Optional[int] = Query(None, description="Перекрытие чанков"),
+    token: str = Depends(verify_token)
+):
+    """Заменяет загруженный документ новой редакцией, сохраняя file_id.
+    Чанки новой редакции сравниваются с сохраненными по содержимому: эмбединги
+    запрашиваются и записи в ChromaDB меняются только для изменившихся чанков
+    """
+    try:
+        if not file.filename:
+            raise HTTPException(status_code=400, detail="Имя файла не может быть пустым")
+        
+        chunking = await _resolve_chunking(collection, chunking_strategy, chunk_size, chunk_overlap)
+        embeddings_service = await model_registry.get()
+        if not await executors.run(ExecutorService.IO, _document_exists, embeddings_service, collection, file_id):
+            raise HTTPException(status_code=404, detail="Файл не найден")
+        
+        saved = await executors.run(ExecutorService.IO, file_processor.save_upload, file.file, file.filename)
         
+        # Новая редакция совпадает с другим документом коллекции: два документа с одним содержимым не храним
+        existing = await executors.run(ExecutorService.IO, file_registry.find, collection, saved['content_hash'])
+        if existing is not None and existing['file_id'] != file_id:
+            await executors.run(ExecutorService.IO, file_processor.discard_upload, saved)
+            raise HTTPException(
+                status_code=409,
+                detail=f"Такой файл уже загружен в коллекцию: {existing['file_id']}"
+            )
+        
+        try:
+            result = await executors.run(
+                ExecutorService.PIPELINE, _run_update, embeddings_service, saved, file_id, collection, chunking,
+                _pooled_embed(embeddings_service)
+            )
+        except Exception:
+            await executors.run(ExecutorService.IO, file_processor.discard_upload, saved)
+            raise
+        
+        changes = result["changes"]
+        return UploadResponse(
+            file_id=file_id,
+            filename=result["file_data"]['original_filename'],
+            chunks_count=result["chunks_count"],
+            message=(
+                f"Документ обновлен: новых чанков {changes['embedded']}, перезаписано {changes['written']}, "
+                f"удалено {changes['deleted']}"
+            ),
+            processing_info={"chunking": chunking, "changes": changes}
+        )
+        
+    except HTTPException:
+        raise
+    except ExecutorOverloadedError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except FileTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
@@ -89,10 +608,13 @@ async def delete_file(
     """Удаляет файл и его эмбединги"""
     try:
         # Удаляем из ChromaDB
-        embeddings_service.delete_document(file_id, collection)
+        embeddings_service = await model_registry.get()
+        await executors.run(ExecutorService.IO, embeddings_service.delete_document, file_id, collection)
         
-        # Удаляем файлы с диска
-        deleted = file_processor.delete_file_versions(file_id)
+        # Удаляем файлы с диска (по путям из реестра; файлы без записи ищутся по file_id)
+        record = await executors.run(ExecutorService.IO, file_registry.get, file_id)
+        deleted = await executors.run(ExecutorService.IO, file_processor.delete_file_versions, file_id, record)
+        await executors.run(ExecutorService.IO, file_registry.remove, file_id)
         
         if not deleted:
             raise HTTPException(status_code=404, detail="Файл не найден")
@@ -104,6 +626,8 @@ async def delete_file(
         
     except HTTPException:
         raise
+    except ExecutorOverloadedError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -111,25 +635,20 @@ async def delete_file(
 async def clear_all_data(
     token: str = Depends(verify_token)
 ):
-    """Удаляет все файлы и данные из системы"""
+    """Удаляет все файлы и данные дефолтной коллекции documents"""
     try:
         # Очищаем ChromaDB
-        embeddings_service.clear_all("documents")  # Очищаем только дефолтную коллекцию
-        
-        # Очищаем папку uploads
-        import shutil
-        import os
+        embeddings_service = await model_registry.get()
+        await executors.run(ExecutorService.IO, embeddings_service.clear_all, "documents")  # Очищаем только дефолтную коллекцию
         
-        upload_dir = Config.UPLOAD_DIR
-        if os.path.exists(upload_dir):
-            for filename in os.listdir(upload_dir):
-                file_path = os.path.join(upload_dir, filename)
-                if os.path.isfile(file_path) and filename != '.gitkeep':
-                    os.remove(file_path)
+        # Удаляем файлы документов этой коллекции (файлы других коллекций остаются)
+        # и файлы старой раскладки без записи в реестре
+        await executors.run(ExecutorService.IO, _remove_collection_files, "documents")
+        await executors.run(ExecutorService.IO, _remove_unregistered_legacy_files)
         
         return DeleteResponse(
             file_id="all",
-            message="Все файлы и данные успешно удалены из системы"
+            message="Все файлы и данные коллекции documents успешно удалены"
         )
         
     except Exception as e:
@@ -144,14 +663,17 @@ async def query_documents(
     """Выполняет поиск по документам и генерирует ответ"""
     try:
         # Ищем похожие документы
-        similar_docs = embeddings_service.search_similar(
+        embeddings_service = await model_registry.get()
+        similar_docs = await executors.run(
+            ExecutorService.EMBEDDING,
+            embeddings_service.search_similar,
             request.question, 
             top_k=Config.TOP_K,
             collection_name=collection
         )
         
         # Генерируем ответ
-        response_data = llm_service.generate_response(request.question, similar_docs)
+        response_data = await llm_service.generate_response(request.question, similar_docs)
         answer = response_data["answer"]
         tokens = response_data["tokens"]
         
@@ -171,8 +693,63 @@ async def query_documents(
                 tokens=tokens
             )
         
+    except ExecutorOverloadedError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+def _sse_event(event: str, data: Any) -> str:
+    """Форматирует событие Server-Sent Events"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.post("/query/stream")
+async def query_documents_stream(
+    request: QueryRequest,
+    collection: str = Query(..., description="Название коллекции"),
+    token: str = Depends(verify_token)
+):
+    """Выполняет поиск по документам и передает ответ потоком Server-Sent Events:
+    сначала событие context с найденными документами, затем события token
+    с фрагментами ответа и в конце событие done с информацией о токенах
+    """
+    try:
+        # Ищем похожие документы до начала потока, чтобы ошибки поиска вернулись обычным HTTP-ответом
+        embeddings_service = await model_registry.get()
+        similar_docs = await executors.run(
+            ExecutorService.EMBEDDING,
+            embeddings_service.search_similar,
+            request.question,
+            top_k=Config.TOP_K,
+            collection_name=collection
+        )
+    except ExecutorOverloadedError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    
+    async def event_stream():
+        yield _sse_event("context", {
+            "question": request.question,
+            "context_documents": similar_docs if request.include_context else None
+        })
+        
+        try:
+            async for event in llm_service.stream_response(request.question, similar_docs):
+                if event["type"] == "token":
+                    yield _sse_event("token", {"content": event["content"]})
+                else:
+                    yield _sse_event("done", {"answer": event["answer"], "tokens": event["tokens"]})
+        except Exception as e:
+            yield _sse_event("error", ErrorResponse(error="Ошибка при генерации ответа", detail=str(e)).dict())
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"  # отключаем буферизацию ответа в nginx
+        }
+    )
 
 @app.post("/set-openrouter-key", response_model=ApiKeyResponse)
 async def set_openrouter_api_key(
@@ -240,18 +817,19 @@ async def set_embedding_type(
                 detail=f"Неподдерживаемый тип эмбедингов: {embedding_type}. Доступные типы: {EmbeddingsFactory.get_available_types()}"
             )
         
+        # Загружаем сервис в фоне (или берем из кэша) и атомарно делаем его активным;
+        # запросы, начатые до переключения, завершаются на прежнем сервисе
+        await model_registry.activate(embedding_type)
+        
         # Обновляем конфигурацию
         Config.EMBEDDING_TYPE = embedding_type
         
-        # Пересоздаем сервис эмбедингов
-        global embeddings_service
-        embeddings_service = EmbeddingsFactory.create_embeddings_service()
-        
         return EmbeddingTypeResponse(
             message=f"Тип эмбедингов успешно изменен на {embedding_type}",
             status="success",
             current_type=embedding_type,
-            available_types=EmbeddingsFactory.get_available_types()
+            available_types=EmbeddingsFactory.get_available_types(),
+            models=model_registry.status()
         )
         
     except HTTPException:
@@ -271,7 +849,8 @@ async def get_embedding_type_status(
             message=f"Текущий тип эмбедингов: {current_type}",
             status="success",
             current_type=current_type,
-            available_types=EmbeddingsFactory.get_available_types()
+            available_types=EmbeddingsFactory.get_available_types(),
+            models=model_registry.status()
         )
         
     except Exception as e:
@@ -283,8 +862,22 @@ async def create_collection(
     token: str = Depends(verify_token)
 ):
     try:
-        collections_service.create_collection(request.collection_name)
-        return CollectionResponse(message="Коллекция успешно создана", status="success")
+        # Заданные параметры разбивки сохраняются в коллекции и применяются к загрузкам в нее
+        chunking = {
+            "chunking_strategy": request.chunking_strategy,
+            "chunk_size": request.chunk_size,
+            "chunk_overlap": request.chunk_overlap
+        }
+        chunking_settings(chunking)
+        await executors.run(ExecutorService.IO, collections_service.create_collection, request.collection_name, chunking)
+        collection_chunking = await executors.run(ExecutorService.IO, collections_service.get_chunking, request.collection_name)
+        return CollectionResponse(
+            message="Коллекция успешно создана",
+            status="success",
+            chunking=chunking_settings(collection_chunking)
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -294,7 +887,8 @@ async def delete_collection(
     token: str = Depends(verify_token)
 ):
     try:
-        collections_service.delete_collection(request.collection_name)
+        await executors.run(ExecutorService.IO, collections_service.delete_collection, request.collection_name)
+        await executors.run(ExecutorService.IO, _remove_collection_files, request.collection_name)
         return CollectionResponse(message="Коллекция успешно удалена", status="success")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -302,11 +896,45 @@ async def delete_collection(
 @app.get("/list-collections", response_model=ListCollectionsResponse)
 async def list_collections(token: str = Depends(verify_token)):
     try:
-        collections = collections_service.list_collections()
+        collections = await executors.run(ExecutorService.IO, collections_service.list_collections)
         return ListCollectionsResponse(collections=collections, status="success")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/jobs/{job_id}", response_model=JobStatusResponse)
+async def get_job_status(job_id: str, token: str = Depends(verify_token)):
+    """Возвращает этап, прогресс и длительность этапов задания загрузки"""
+    try:
+        job = await executors.run(ExecutorService.IO, ingestion_queue.get, job_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Задание {job_id} не найдено")
+    return JobStatusResponse(**job)
+
+@app.get("/executors-status", response_model=ExecutorsStatusResponse)
+async def get_executors_status(token: str = Depends(verify_token)):
+    """Возвращает размеры пулов исполнения и глубину их очередей"""
+    try:
+        pools = executors.stats()
+        pools["ingestion"] = await executors.run(ExecutorService.IO, ingestion_queue.stats)
+        return ExecutorsStatusResponse(pools=pools, status="success")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/embedding-cache-status", response_model=EmbeddingCacheStatusResponse)
+async def get_embedding_cache_status(token: str = Depends(verify_token)):
+    """Возвращает размер кэшей эмбедингов запросов и чанков и долю попаданий"""
+    try:
+        return EmbeddingCacheStatusResponse(
+            cache=get_query_embedding_cache().stats(),
+            chunk_cache=await executors.run(ExecutorService.IO, get_chunk_embedding_store().stats),
+            status="success"
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.get("/health")
 async def health_check():
     """Проверка состояния API"""
@@ -316,7 +944,8 @@ async def health_check():
 async def http_exception_handler(request, exc):
     return JSONResponse(
         status_code=exc.status_code,
-        content=ErrorResponse(error=exc.detail).dict()
+        content=ErrorResponse(error=exc.detail).dict(),
+        headers=getattr(exc, "headers", None)
     )
 
 @app.exception_handler(Exception)
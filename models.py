@@ -18,6 +18,63 @@ class UploadResponse(BaseModel):
     message: str
     processing_info: Dict[str, Any] = {}  # Информация о обработке
 
+class UploadJobResponse(BaseModel):
+    job_id: str
+    file_id: str
+    filename: str
+    status: str
+    message: str
+
+class BatchFileResult(BaseModel):
+    filename: str
+    status: str  # success, duplicate, error, skipped
+    file_id: Optional[str] = None
+    chunks_count: int = 0
+    error: Optional[str] = None
+
+class BatchUploadResponse(BaseModel):
+    collection: str
+    files: List[BatchFileResult]
+    total_files: int
+    succeeded: int
+    failed: int
+    chunks_count: int
+    message: str
+    chunking: Dict[str, Any] = {}
+
+class JobStatusResponse(BaseModel):
+    job_id: str
+    status: str  # queued, running, done, failed
+    stage: Optional[str] = None  # pipeline (этапы конвейера идут одновременно)
+    progress: Dict[str, Any] = {}  # pages_done/pages_total, chunks_done/chunks_total
+    timings: Dict[str, float] = {}  # время работы этапов (extract, chunk, embed, write), сек
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    queue_position: Optional[int] = None
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+class FileRecord(BaseModel):
+    file_id: str
+    collection: str
+    filename: str
+    file_size: int
+    file_type: str
+    content_hash: str
+    original_path: Optional[str] = None
+    txt_path: Optional[str] = None
+    chunks_count: int = 0
+    status: str  # processing, ready
+    created_at: float
+    updated_at: float
+
+class FilesListResponse(BaseModel):
+    files: List[FileRecord]
+    total: int
+    limit: int
+    offset: int
+
 class DeleteResponse(BaseModel):
     file_id: str
     message: str
@@ -37,6 +94,7 @@ class EmbeddingTypeResponse(BaseModel):
     status: str
     current_type: str
     available_types: List[str]
+    models: Dict[str, Dict[str, Any]] = {}
 
 class ErrorResponse(BaseModel):
     error: str
@@ -44,11 +102,25 @@ class ErrorResponse(BaseModel):
 
 class CollectionRequest(BaseModel):
     collection_name: str
+    # Настройки разбивки на чанки для коллекции (учитываются при создании)
+    chunking_strategy: Optional[str] = None  # chars, tokens, sentences, pages
+    chunk_size: Optional[int] = None
+    chunk_overlap: Optional[int] = None
 
 class CollectionResponse(BaseModel):
     message: str
     status: str
+    chunking: Dict[str, Any] = {}
 
 class ListCollectionsResponse(BaseModel):
     collections: List[str]
-    status: str 
\ No newline at end of file
+    status: str 
+
+class ExecutorsStatusResponse(BaseModel):
+    pools: Dict[str, Dict[str, Any]]
+    status: str
+
+class EmbeddingCacheStatusResponse(BaseModel):
+    cache: Dict[str, Any]
+    chunk_cache: Dict[str, Any] = {}
+    status: str
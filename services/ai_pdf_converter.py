@@ -1,18 +1,18 @@
-import os
 import io
 import base64
 import logging
-from typing import List, Dict, Any, Optional
-from pathlib import Path
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from typing import List, Dict, Any, Callable, Iterable, Iterator, Optional, Tuple
 
+import fitz  # PyMuPDF
 import requests
-from PyPDF2 import PdfReader
-from PyPDF2.errors import PdfReadError
-from pdf2image import convert_from_path
-from pdf2image.exceptions import PDFInfoNotInstalledError, PDFPageCountError
+from requests.adapters import HTTPAdapter
 from PIL import Image
 
 from config import Config
+from utils.text_extractor import TextExtractor
 
 # Настройка логирования
 logging.basicConfig(
@@ -21,22 +21,57 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Коды ответа, при которых запрос страницы повторяется
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+class RateLimiter:
+    """Ограничитель частоты запросов (равномерный интервал между запросами), общий для потоков"""
+    
+    def __init__(self, requests_per_minute: float):
+        self.interval = 60.0 / requests_per_minute if requests_per_minute > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+    
+    def acquire(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+# Лимит частоты действует на ключ API, поэтому он общий для всех конвертаций процесса
+_rate_limiter = RateLimiter(Config.AI_OCR_RATE_LIMIT)
+
 class AIPDFConverter:
     """Сервис для конвертации PDF в текст с помощью ИИ"""
     
-    def __init__(self, api_key: str = None, model: str = "google/gemini-2.5-flash"):
+    INSTRUCTION = (
+        "Структурированно перепиши текст с этой страницы PDF. "
+        "Если там таблицы — выпиши их в виде обычного текстового представления таблицы. "
+        "Присылай только текст, без лишних пояснений."
+    )
+    
+    def __init__(self, api_key: str = None, model: str = "google/gemini-2.5-flash", concurrency: int = None):
         self.api_key = api_key or Config.OPENROUTER_API_KEY
         self.model = model
-        self.poppler_path = None  # Можно настроить путь к poppler
+        self.max_image_side = Config.AI_OCR_MAX_IMAGE_SIDE
+        self.max_dpi = Config.AI_OCR_MAX_DPI
+        self.jpeg_quality = Config.AI_OCR_JPEG_QUALITY
+        self.concurrency = max(1, concurrency or Config.AI_OCR_CONCURRENCY)
+        self.max_retries = Config.AI_OCR_MAX_RETRIES
+        self.retry_backoff = Config.AI_OCR_RETRY_BACKOFF
+        self.rate_limiter = _rate_limiter
+        # Одна сессия с пулом соединений на все параллельные запросы страниц
+        self.session = requests.Session()
+        self.session.mount("https://", HTTPAdapter(pool_maxsize=self.concurrency))
         
-    def encode_image_to_base64(self, pil_image: Image.Image) -> str:
-        """Кодирует PIL.Image в base64 JPEG."""
-        buffer = io.BytesIO()
-        pil_image.save(buffer, format="JPEG", quality=85)
-        return base64.b64encode(buffer.getvalue()).decode("utf-8")
-    
     def send_page_to_llm(self, base64_image: str, instruction: str) -> str:
-        """Отправляет страницу в LLM и возвращает распознанный текст."""
+        """Отправляет страницу в LLM и возвращает распознанный текст.
+        Ошибки 429/5xx и сетевые ошибки повторяются с экспоненциальной задержкой.
+        """
         data_url = f"data:image/jpeg;base64,{base64_image}"
         messages = [
             {"role": "user", "content": [
@@ -54,127 +89,134 @@ class AIPDFConverter:
             "Content-Type": "application/json"
         }
         
-        try:
-            resp = requests.post(
-                "https://openrouter.ai/api/v1/chat/completions",
-                headers=headers,
-                json=payload,
-                timeout=120
-            )
-            resp.raise_for_status()
-            data = resp.json()
-            return data["choices"][0]["message"]["content"]
-        except requests.RequestException as e:
-            logger.error(f"Ошибка при запросе к LLM: {e}")
-            raise Exception(f"Ошибка ИИ-конвертации: {str(e)}")
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.acquire()
+            delay = self.retry_backoff * (2 ** attempt)
+            try:
+                resp = self.session.post(
+                    "https://openrouter.ai/api/v1/chat/completions",
+                    headers=headers,
+                    json=payload,
+                    timeout=120
+                )
+                if resp.status_code in RETRYABLE_STATUS_CODES and attempt < self.max_retries:
+                    retry_after = resp.headers.get("Retry-After", "")
+                    if retry_after.replace(".", "", 1).isdigit():
+                        delay = max(delay, float(retry_after))
+                    logger.warning(f"LLM вернул {resp.status_code}, повтор через {delay:.1f}с")
+                    time.sleep(delay)
+                    continue
+                resp.raise_for_status()
+                data = resp.json()
+                return data["choices"][0]["message"]["content"]
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt < self.max_retries:
+                    logger.warning(f"Ошибка соединения с LLM ({e}), повтор через {delay:.1f}с")
+                    time.sleep(delay)
+                    continue
+                logger.error(f"Ошибка при запросе к LLM: {e}")
+                raise Exception(f"Ошибка ИИ-конвертации: {str(e)}")
+            except requests.RequestException as e:
+                logger.error(f"Ошибка при запросе к LLM: {e}")
+                raise Exception(f"Ошибка ИИ-конвертации: {str(e)}")
+    
+    def render_zoom(self, rect: fitz.Rect) -> float:
+        """Масштаб рендеринга: не больше max_dpi и не больше max_image_side пикселей по длинной стороне"""
+        # Масштаб 1.0 соответствует 72 dpi (1 пункт = 1/72 дюйма)
+        longest_side = max(rect.width, rect.height) or 1
+        return min(self.max_dpi / 72, self.max_image_side / longest_side)
+    
+    def render_pages(self, doc: fitz.Document, page_numbers: Iterable[int]) -> Iterator[Tuple[int, Optional[bytes], Optional[Exception]]]:
+        """
+        Рендерит страницы открытого документа сразу в JPEG (генератор: в памяти одна страница)
+        
+        Yields:
+            (номер страницы, JPEG или None, ошибка рендеринга или None)
+        """
+        for page_number in page_numbers:
+            try:
+                page = doc[page_number - 1]
+                zoom = self.render_zoom(page.rect)
+                pixmap = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+                # Кодер JPEG из Pillow заметно быстрее встроенного в MuPDF
+                buffer = io.BytesIO()
+                Image.frombytes("RGB", (pixmap.width, pixmap.height), pixmap.samples_mv).save(
+                    buffer, format="JPEG", quality=self.jpeg_quality
+                )
+                image = buffer.getvalue()
+                pixmap = None
+            except Exception as e:
+                yield page_number, None, e
+                continue
+            yield page_number, image, None
+    
+    def _recognize_page(self, page_number: int, image: bytes, instruction: str) -> str:
+        """Распознает отрендеренную страницу через LLM"""
+        logger.info(f"Страница {page_number}: распознаю через ИИ ({len(image)} байт JPEG)")
+        return self.send_page_to_llm(base64.b64encode(image).decode("utf-8"), instruction)
+    
+    def _submit_rendered_pages(
+        self,
+        executor: ThreadPoolExecutor,
+        doc: fitz.Document,
+        page_numbers: List[int],
+        instruction: str
+    ) -> Dict[Future, int]:
+        """Рендерит страницы по очереди и отправляет их на распознавание по мере готовности.
+        Число отрендеренных, но еще не распознанных страниц ограничено, чтобы не держать
+        в памяти изображения всего документа.
+        """
+        in_flight = threading.BoundedSemaphore(self.concurrency * 2)
+        futures: Dict[Future, int] = {}
+        
+        for page_number, image, error in self.render_pages(doc, page_numbers):
+            if error is not None:
+                future: Future = Future()
+                future.set_exception(error)
+            else:
+                in_flight.acquire()
+                future = executor.submit(self._recognize_page, page_number, image, instruction)
+                future.add_done_callback(lambda _: in_flight.release())
+            futures[future] = page_number
+        
+        return futures
+    
+    def recognize_pages(self, doc: fitz.Document, page_numbers: List[int]) -> Iterator[Tuple[int, Optional[str], Optional[Exception]]]:
+        """
+        Распознает страницы уже открытого документа параллельно (не больше
+        concurrency одновременно)
+        
+        Yields:
+            (номер страницы, распознанный текст или None, ошибка или None) по мере готовности
+        """
+        if not self.api_key:
+            raise ValueError("OPENROUTER_API_KEY не задан, распознавание страниц недоступно")
+        logger.info(f"Страниц для распознавания: {len(page_numbers)}, распознаю через ИИ в {self.concurrency} потоков")
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="ai-ocr") as executor:
+            futures = self._submit_rendered_pages(executor, doc, page_numbers, self.INSTRUCTION)
+            for future in as_completed(futures):
+                page_number = futures[future]
+                try:
+                    yield page_number, future.result(), None
+                except Exception as e:
+                    logger.error(f"Ошибка обработки страницы {page_number}: {str(e)}")
+                    yield page_number, None, e
     
-    def extract_text_with_ai_fallback(self, pdf_path: str) -> Dict[str, Any]:
+    def extract_text_with_ai_fallback(self, pdf_path: str, on_page: Optional[Callable[[int, int], None]] = None) -> Dict[str, Any]:
         """
-        Извлекает текст из PDF с fallback на ИИ-конвертацию
+        Извлекает текст из PDF с fallback на ИИ-конвертацию: текстовые страницы
+        берутся из текстового слоя, сканы и смешанные страницы распознаются
+        этим конвертером
         
         Args:
             pdf_path: Путь к PDF файлу
+            on_page: Вызывается после каждой страницы с (обработано, всего)
             
         Returns:
             Dict с текстом и метаданными
         """
         logger.info(f"Начинаем обработку PDF: {pdf_path}")
-        
-        try:
-            reader = PdfReader(pdf_path)
-        except (PdfReadError, FileNotFoundError) as e:
-            raise Exception(f"Не удалось открыть PDF: {str(e)}")
-        
-        instruction = (
-            "Структурированно перепиши текст с этой страницы PDF. "
-            "Если там таблицы — выпиши их в виде обычного текстового представления таблицы. "
-            "Присылай только текст, без лишних пояснений."
-        )
-        
-        output_lines = []
-        pages_data = []
-        total_pages = len(reader.pages)
-        ai_converted_pages = 0
-        
-        for i, page in enumerate(reader.pages, start=1):
-            logger.info(f"Обрабатываем страницу {i}/{total_pages}")
-            
-            page_data = {
-                "page_number": i,
-                "text": "",
-                "conversion_method": "unknown",
-                "word_count": 0,
-                "char_count": 0,
-                "error": None
-            }
-            
-            try:
-                # Пытаемся извлечь текст стандартным способом
-                text = page.extract_text() or ""
-                
-                if text.strip():
-                    logger.info(f"Страница {i}: извлечён текст ({len(text)} символов)")
-                    page_data.update({
-                        "text": text,
-                        "conversion_method": "standard",
-                        "word_count": len(text.split()),
-                        "char_count": len(text)
-                    })
-                    output_lines.append(f"\n\n=== Страница {i} (текст) ===\n\n{text}")
-                else:
-                    logger.info(f"Страница {i}: текст не извлечён — конвертирую через ИИ")
-                    
-                    # Конвертируем страницу в изображение
-                    images = convert_from_path(
-                        pdf_path, 
-                        dpi=300,
-                        first_page=i, 
-                        last_page=i,
-                        poppler_path=self.poppler_path
-                    )
-                    
-                    if not images:
-                        raise ValueError("Пустой список изображений")
-                    
-                    # Отправляем в LLM
-                    b64_image = self.encode_image_to_base64(images[0])
-                    llm_text = self.send_page_to_llm(b64_image, instruction)
-                    
-                    page_data.update({
-                        "text": llm_text,
-                        "conversion_method": "ai",
-                        "word_count": len(llm_text.split()),
-                        "char_count": len(llm_text)
-                    })
-                    
-                    output_lines.append(f"\n\n=== Страница {i} (распознано ИИ) ===\n\n{llm_text}")
-                    ai_converted_pages += 1
-                    
-            except Exception as e:
-                error_msg = f"Ошибка обработки страницы {i}: {str(e)}"
-                logger.error(error_msg)
-                page_data.update({
-                    "error": str(e),
-                    "conversion_method": "error"
-                })
-                output_lines.append(f"\n\n=== Страница {i} (ошибка) ===\n\nОшибка: {str(e)}\n")
-            
-            pages_data.append(page_data)
-        
-        full_text = "".join(output_lines)
-        
-        return {
-            "text": full_text,
-            "metadata": {
-                "total_pages": total_pages,
-                "ai_converted_pages": ai_converted_pages,
-                "standard_converted_pages": total_pages - ai_converted_pages,
-                "total_words": len(full_text.split()),
-                "total_chars": len(full_text),
-                "pages": pages_data,
-                "conversion_method": "hybrid" if ai_converted_pages > 0 else "standard"
-            }
-        }
+        return TextExtractor._extract_from_pdf_with_metadata(pdf_path, on_page, ai_converter=self)
     
     def is_pdf_scanned(self, pdf_path: str) -> bool:
         """
@@ -187,12 +229,8 @@ class AIPDFConverter:
             True если PDF отсканированный
         """
         try:
-            reader = PdfReader(pdf_path)
-            total_text_length = 0
-            
-            for page in reader.pages:
-                text = page.extract_text() or ""
-                total_text_length += len(text.strip())
+            with fitz.open(pdf_path) as doc:
+                total_text_length = sum(len(page.get_text().strip()) for page in doc)
             
             # Если общая длина текста меньше 50 символов, считаем PDF отсканированным
             return total_text_length < 50
@@ -0,0 +1,200 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from typing import Any, Callable, Dict, List, Optional
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Ограничение SQLite на число параметров в одном запросе
+SQLITE_MAX_PARAMS = 500
+
+class ChunkEmbeddingStore:
+    """Постоянное хранилище эмбедингов чанков с адресацией по содержимому.
+
+    Ключ — SHA-256 от имени модели и текста чанка, вектор хранится как float32.
+    При повторной загрузке документа (или его новой редакции) эмбединги
+    запрашиваются только для чанков, которых еще нет в хранилище.
+    
+    Эмбединги не удаляются вместе с документом: документ часто удаляют, чтобы
+    загрузить его новую редакцию. Размер хранилища ограничен max_size записей,
+    сверх него вытесняются давно не использованные.
+    """
+    
+    def __init__(self, path: str, enabled: bool = True, max_size: int = 200000):
+        self.path = path
+        self.enabled = enabled
+        self.max_size = max(1, max_size)
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._size = 0
+        self._conn: Optional[sqlite3.Connection] = None
+        
+        if self.enabled:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS chunk_embeddings ("
+                "key TEXT PRIMARY KEY, model TEXT NOT NULL, dim INTEGER NOT NULL, vector BLOB NOT NULL, "
+                "used_at REAL NOT NULL DEFAULT 0)"
+            )
+            # Таблица первой версии хранилища дополняется временем последнего обращения (для LRU)
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(chunk_embeddings)")}
+            if "used_at" not in columns:
+                self._conn.execute("ALTER TABLE chunk_embeddings ADD COLUMN used_at REAL NOT NULL DEFAULT 0")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS chunk_embeddings_used_at ON chunk_embeddings (used_at)")
+            # Связи чанков с документами больше не ведутся
+            self._conn.execute("DROP TABLE IF EXISTS chunk_documents")
+            self._conn.commit()
+            with self._lock:
+                self._size = self._conn.execute("SELECT COUNT(*) FROM chunk_embeddings").fetchone()[0]
+                self._evict()
+    
+    @staticmethod
+    def chunk_key(text: str, model_name: str) -> str:
+        return hashlib.sha256(f"{model_name}\0{text}".encode("utf-8")).hexdigest()
+    
+    def get_many(self, texts: List[str], model_name: str) -> List[Optional[List[float]]]:
+        """Возвращает сохраненные эмбединги (None для отсутствующих чанков)"""
+        if not self.enabled:
+            return [None] * len(texts)
+        
+        keys = [self.chunk_key(text, model_name) for text in texts]
+        found: Dict[str, List[float]] = {}
+        unique_keys = list(dict.fromkeys(keys))
+        
+        with self._lock:
+            for start in range(0, len(unique_keys), SQLITE_MAX_PARAMS):
+                batch = unique_keys[start:start + SQLITE_MAX_PARAMS]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM chunk_embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, vector in rows:
+                    found[key] = array("f", vector).tolist()
+            if found:
+                self._touch(list(found))
+                self._conn.commit()
+        
+        return [found.get(key) for key in keys]
+    
+    def put_many(self, texts: List[str], model_name: str, embeddings: List[List[float]]):
+        """Сохраняет эмбединги чанков"""
+        if not self.enabled or not texts:
+            return
+        
+        now = time.time()
+        rows = [
+            (self.chunk_key(text, model_name), model_name, len(embedding), array("f", embedding).tobytes(), now)
+            for text, embedding in zip(texts, embeddings)
+        ]
+        with self._lock:
+            # Уже сохраненные чанки не перезаписываются, только отмечаются использованными
+            for row in rows:
+                self._size += self._conn.execute(
+                    "INSERT OR IGNORE INTO chunk_embeddings (key, model, dim, vector, used_at) VALUES (?, ?, ?, ?, ?)",
+                    row
+                ).rowcount
+            self._touch([row[0] for row in rows])
+            self._evict()
+            self._conn.commit()
+    
+    def _touch(self, keys: List[str]):
+        """Отмечает эмбединги использованными сейчас"""
+        now = time.time()
+        for start in range(0, len(keys), SQLITE_MAX_PARAMS):
+            batch = keys[start:start + SQLITE_MAX_PARAMS]
+            placeholders = ",".join("?" * len(batch))
+            self._conn.execute(
+                f"UPDATE chunk_embeddings SET used_at = ? WHERE key IN ({placeholders})", (now, *batch)
+            )
+    
+    def _evict(self):
+        """Вытесняет давно не использованные эмбединги сверх max_size"""
+        excess = self._size - self.max_size
+        if excess <= 0:
+            return
+        evicted = self._conn.execute(
+            "DELETE FROM chunk_embeddings WHERE key IN ("
+            "SELECT key FROM chunk_embeddings ORDER BY used_at LIMIT ?)",
+            (excess,)
+        ).rowcount
+        self._size -= evicted
+        self._evictions += evicted
+        logger.info(f"Вытеснено эмбедингов чанков: {evicted}")
+    
+    def get_or_embed(
+        self,
+        texts: List[str],
+        model_name: str,
+        embed: Callable[[List[str]], List[List[float]]]
+    ) -> List[List[float]]:
+        """Возвращает эмбединги чанков, вычисляя через embed только отсутствующие"""
+        if not self.enabled:
+            return embed(texts)
+        
+        embeddings = self.get_many(texts, model_name)
+        
+        # Одинаковые чанки внутри документа эмбедим один раз
+        missing_texts = list(dict.fromkeys(
+            text for text, embedding in zip(texts, embeddings) if embedding is None
+        ))
+        hits = len(texts) - sum(1 for embedding in embeddings if embedding is None)
+        
+        if missing_texts:
+            new_embeddings = embed(missing_texts)
+            self.put_many(missing_texts, model_name, new_embeddings)
+            computed = dict(zip(missing_texts, new_embeddings))
+            embeddings = [
+                embedding if embedding is not None else computed[text]
+                for text, embedding in zip(texts, embeddings)
+            ]
+        
+        with self._lock:
+            self._hits += hits
+            self._misses += len(missing_texts)
+        
+        if texts:
+            logger.info(f"Эмбединги чанков: {hits} из хранилища, {len(missing_texts)} вычислено заново")
+        return embeddings
+    
+    def stats(self) -> Dict[str, Any]:
+        """Возвращает размер хранилища и счетчики попаданий"""
+        if not self.enabled:
+            return {"enabled": False}
+        
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "enabled": True,
+                "path": self.path,
+                "size": self._size,
+                "max_size": self.max_size,
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+                "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0
+            }
+
+_chunk_store: Optional[ChunkEmbeddingStore] = None
+_chunk_store_lock = threading.Lock()
+
+def get_chunk_embedding_store() -> ChunkEmbeddingStore:
+    """Возвращает общее для процесса хранилище эмбедингов чанков"""
+    global _chunk_store
+    if _chunk_store is None:
+        with _chunk_store_lock:
+            if _chunk_store is None:
+                _chunk_store = ChunkEmbeddingStore(
+                    Config.CHUNK_CACHE_PATH,
+                    enabled=Config.CHUNK_CACHE_ENABLED,
+                    max_size=Config.CHUNK_CACHE_MAX_SIZE
+                )
+    return _chunk_store
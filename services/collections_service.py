@@ -1,19 +1,30 @@
-import chromadb
-from chromadb.config import Settings
-from config import Config
+from typing import Any, Dict, Optional
+from services.vector_store import get_vector_store
+
+# Ключи метаданных коллекции с настройками разбивки на чанки
+CHUNKING_KEYS = ("chunking_strategy", "chunk_size", "chunk_overlap")
 
 class CollectionsService:
     def __init__(self):
-        self.chroma_client = chromadb.PersistentClient(
-            path="./chroma_db",
-            settings=Settings(anonymized_telemetry=False)
-        )
+        self.vector_store = get_vector_store()
 
-    def create_collection(self, name: str):
-        self.chroma_client.get_or_create_collection(name=name)
+    def create_collection(self, name: str, chunking: Optional[Dict[str, Any]] = None):
+        self.vector_store.create_collection(name)
+        if chunking:
+            self.set_chunking(name, chunking)
 
     def delete_collection(self, name: str):
-        self.chroma_client.delete_collection(name=name)
+        self.vector_store.delete_collection(name)
 
     def list_collections(self):
-        return [col.name for col in self.chroma_client.list_collections()] 
\ No newline at end of file
+        return self.vector_store.list_collections()
+
+    def get_chunking(self, name: str) -> Dict[str, Any]:
+        """Настройки разбивки, сохраненные для коллекции (только заданные)"""
+        metadata = self.vector_store.get_collection_metadata(name)
+        return {key: metadata[key] for key in CHUNKING_KEYS if metadata.get(key) is not None}
+
+    def set_chunking(self, name: str, chunking: Dict[str, Any]):
+        self.vector_store.update_collection_metadata(
+            name, {key: chunking[key] for key in CHUNKING_KEYS if chunking.get(key) is not None}
+        )
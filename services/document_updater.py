@@ -0,0 +1,132 @@
+import hashlib
+import logging
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from utils.chunking import Chunk
+
+logger = logging.getLogger(__name__)
+
+class DocumentUpdater:
+    """Обновление загруженного документа новой редакцией с сохранением file_id.
+
+    Чанки новой редакции сравниваются с записями документа в ChromaDB по
+    содержимому: записи с тем же текстом и метаданными не трогаются, у записей
+    с тем же текстом обновляются только метаданные, эмбединги запрашиваются
+    только для текстов, которых не было в прежней редакции, лишние записи
+    удаляются. Поля документа (имя, хэш, размер, число чанков и т.п.) меняются
+    с каждой редакцией: у записей, где изменились только они, эти поля
+    дописываются одним обновлением метаданных. ID записей позиционные
+    ({file_id}_{номер чанка}), поэтому вставка в начало документа сдвигает
+    следующие чанки: они перезаписываются, но с прежними эмбедингами.
+    """
+
+    def __init__(
+        self,
+        embeddings_service,
+        collection_name: str,
+        embed: Optional[Callable[[List[str]], List[List[float]]]] = None
+    ):
+        self.embeddings_service = embeddings_service
+        self.collection_name = collection_name
+        self.embed = embed or embeddings_service.embed_chunks
+
+    @staticmethod
+    def chunk_hash(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _chunk_fields(chunk_metadata: Dict[str, Any], document_fields: Set[str]) -> Dict[str, Any]:
+        """Метаданные записи без полей документа"""
+        return {key: value for key, value in chunk_metadata.items() if key not in document_fields}
+
+    def update(self, file_id: str, chunks: List[Chunk], metadata: Dict[str, Any]) -> Dict[str, int]:
+        """
+        Приводит записи документа в коллекции к новой редакции. Обновление не
+        атомарно: при ошибке часть записей может остаться от прежней редакции.
+
+        Args:
+            file_id: ID документа
+            chunks: чанки новой редакции
+            metadata: метаданные документа для каждого чанка
+
+        Returns:
+            Dict с числом чанков: unchanged (без изменений), refreshed (только
+            поля документа), updated (метаданные чанка), written (записаны
+            заново), embedded (эмбединги запрошены заново), deleted (удалены)
+        """
+        vector_store = self.embeddings_service.vector_store
+        stored = vector_store.get_collection(self.collection_name).get(
+            where={"file_id": file_id}, include=["documents", "metadatas", "embeddings"]
+        )
+        previous = {
+            chunk_id: (document, chunk_metadata)
+            for chunk_id, document, chunk_metadata in zip(stored["ids"], stored["documents"], stored["metadatas"])
+        }
+        # Эмбединги прежней редакции по хэшу текста: сдвинутые и повторяющиеся чанки их переиспользуют
+        known = {
+            self.chunk_hash(document): embedding
+            for document, embedding in zip(stored["documents"], stored["embeddings"])
+        }
+
+        ids, metadatas = self.embeddings_service.chunk_records(file_id, chunks, metadata)
+        document_fields = set(metadata)
+        stats = {"unchanged": 0, "refreshed": 0, "updated": 0, "written": 0, "embedded": 0, "deleted": 0}
+        updated_ids: List[str] = []
+        updated_metadatas: List[Dict[str, Any]] = []
+        written: List[int] = []
+        # Upsert в ChromaDB дополняет метаданные, а не заменяет: записи, из метаданных
+        # которых пропадают поля, удаляются перед записью
+        replaced_ids: List[str] = []
+
+        for i, (chunk_id, chunk, chunk_metadata) in enumerate(zip(ids, chunks, metadatas)):
+            old = previous.get(chunk_id)
+            if old is None:
+                written.append(i)
+                continue
+            old_document, old_metadata = old
+            if set(old_metadata) - set(chunk_metadata):
+                replaced_ids.append(chunk_id)
+                written.append(i)
+            elif old_document != chunk:
+                written.append(i)
+            elif old_metadata == chunk_metadata:
+                stats["unchanged"] += 1
+            elif self._chunk_fields(old_metadata, document_fields) != self._chunk_fields(chunk_metadata, document_fields):
+                stats["updated"] += 1
+                updated_ids.append(chunk_id)
+                updated_metadatas.append(chunk_metadata)
+            else:
+                # Изменились только поля документа: записываются только они
+                stats["refreshed"] += 1
+                updated_ids.append(chunk_id)
+                updated_metadatas.append({
+                    key: value for key, value in chunk_metadata.items() if old_metadata.get(key) != value
+                })
+
+        missing = list(dict.fromkeys(
+            str(chunks[i]) for i in written if self.chunk_hash(chunks[i]) not in known
+        ))
+        if missing:
+            known.update(zip(map(self.chunk_hash, missing), self.embed(missing)))
+
+        if replaced_ids:
+            vector_store.delete(self.collection_name, replaced_ids)
+        if written:
+            vector_store.upsert(
+                self.collection_name,
+                ids=[ids[i] for i in written],
+                embeddings=[known[self.chunk_hash(chunks[i])] for i in written],
+                documents=[str(chunks[i]) for i in written],
+                metadatas=[metadatas[i] for i in written]
+            )
+        if updated_ids:
+            vector_store.update_metadatas(self.collection_name, updated_ids, updated_metadatas)
+
+        new_ids = set(ids)
+        stale_ids = [chunk_id for chunk_id in previous if chunk_id not in new_ids]
+        if stale_ids:
+            vector_store.delete(self.collection_name, stale_ids)
+
+        stats.update(written=len(written), embedded=len(missing), deleted=len(stale_ids))
+        logger.info(f"Документ {file_id} обновлен в коллекции {self.collection_name}: {stats}")
+        return stats
@@ -0,0 +1,135 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+def is_retryable_error(error: Exception) -> bool:
+    """Повторять ли батч после ошибки: 429/5xx (по status_code ошибки клиента API)
+    и сетевые ошибки; остальные (400, 401/403, слишком длинный текст) повтор не исправит"""
+    status_code = getattr(error, "status_code", None)
+    if status_code is not None:
+        return status_code == 429 or status_code >= 500
+    return isinstance(error, (ConnectionError, TimeoutError))
+
+def _load_token_counter() -> Callable[[str], int]:
+    """Возвращает счетчик токенов: tiktoken, если установлен, иначе консервативная оценка"""
+    try:
+        import tiktoken
+        encoding = tiktoken.get_encoding("cl100k_base")
+        return lambda text: len(encoding.encode(text, disallowed_special=()))
+    except Exception as e:
+        logger.warning(f"tiktoken недоступен, токены батчей оцениваются по байтам: {e}")
+        # Оценка сверху: не меньше токена на каждые 3 байта UTF-8 (для кириллицы — 1.5 символа)
+        return lambda text: len(text.encode("utf-8")) // 3 + 1
+
+class EmbeddingBatcher:
+    """Делит входные тексты на батчи по бюджету токенов и числу элементов,
+    выполняет батчи параллельно, повторяет упавшие батчи по отдельности
+    (только при временных ошибках, см. is_retryable_error) и собирает векторы
+    в исходном порядке. Текст длиннее max_input_tokens отклоняется до отправки
+    """
+    
+    def __init__(
+        self,
+        max_tokens: int = 50000,
+        max_items: int = 256,
+        concurrency: int = 4,
+        max_retries: int = 3,
+        retry_backoff: float = 1.0,
+        count_tokens: Optional[Callable[[str], int]] = None,
+        max_input_tokens: int = 0,
+        is_retryable: Callable[[Exception], bool] = is_retryable_error
+    ):
+        self.max_tokens = max(1, max_tokens)
+        self.max_items = max(1, max_items)
+        self.concurrency = max(1, concurrency)
+        self.max_retries = max(0, max_retries)
+        self.retry_backoff = retry_backoff
+        self.count_tokens = count_tokens or _load_token_counter()
+        self.max_input_tokens = max_input_tokens  # 0 — без ограничения
+        self.is_retryable = is_retryable
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+    
+    def split(self, texts: List[str]) -> List[List[int]]:
+        """Разбивает тексты на батчи (списки индексов) с учетом лимитов.
+        Текст длиннее max_input_tokens модель не примет ни в каком батче: ValueError"""
+        batches: List[List[int]] = []
+        current: List[int] = []
+        current_tokens = 0
+        
+        for index, text in enumerate(texts):
+            tokens = self.count_tokens(text)
+            if self.max_input_tokens and tokens > self.max_input_tokens:
+                raise ValueError(
+                    f"Текст {index + 1} из {len(texts)} длиннее лимита модели: "
+                    f"{tokens} токенов при максимуме {self.max_input_tokens}"
+                )
+            if current and (current_tokens + tokens > self.max_tokens or len(current) >= self.max_items):
+                batches.append(current)
+                current = []
+                current_tokens = 0
+            current.append(index)
+            current_tokens += tokens
+        
+        if current:
+            batches.append(current)
+        return batches
+    
+    def run(self, texts: List[str], embed_batch: Callable[[List[str]], List[List[float]]]) -> List[List[float]]:
+        """Получает эмбединги для всех текстов через embed_batch"""
+        if not texts:
+            return []
+        
+        batches = self.split(texts)
+        if len(batches) == 1:
+            return self._run_batch(texts, embed_batch, 1, 1)
+        
+        logger.info(f"Эмбединги для {len(texts)} текстов разбиты на {len(batches)} батчей")
+        executor = self._get_executor()
+        futures = [
+            executor.submit(self._run_batch, [texts[i] for i in batch], embed_batch, number, len(batches))
+            for number, batch in enumerate(batches, 1)
+        ]
+        
+        embeddings: List[Optional[List[float]]] = [None] * len(texts)
+        for batch, future in zip(batches, futures):
+            for index, embedding in zip(batch, future.result()):
+                embeddings[index] = embedding
+        return embeddings
+    
+    def _run_batch(
+        self,
+        batch_texts: List[str],
+        embed_batch: Callable[[List[str]], List[List[float]]],
+        number: int,
+        total: int
+    ) -> List[List[float]]:
+        """Выполняет один батч с повторами временных ошибок и экспоненциальной задержкой"""
+        for attempt in range(self.max_retries + 1):
+            try:
+                embeddings = embed_batch(batch_texts)
+                if len(embeddings) != len(batch_texts):
+                    raise Exception(f"получено {len(embeddings)} векторов вместо {len(batch_texts)}")
+                return embeddings
+            except Exception as e:
+                if not self.is_retryable(e):
+                    raise Exception(f"Батч {number}/{total} не обработан: {str(e)}")
+                if attempt >= self.max_retries:
+                    raise Exception(f"Батч {number}/{total} не обработан после {attempt + 1} попыток: {str(e)}")
+                delay = self.retry_backoff * (2 ** attempt)
+                logger.warning(f"Батч {number}/{total}: ошибка ({e}), повтор через {delay:.1f}с")
+                time.sleep(delay)
+    
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.concurrency,
+                        thread_name_prefix="embedding-batch"
+                    )
+        return self._executor
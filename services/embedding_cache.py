@@ -0,0 +1,186 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+class QueryEmbeddingCache:
+    """LRU-кэш эмбедингов поисковых запросов с TTL и опциональным хранением на диске"""
+    
+    def __init__(
+        self,
+        max_size: int = 1024,
+        ttl: float = 3600,
+        disk_path: Optional[str] = None,
+        disk_max_size: int = 100000
+    ):
+        self.max_size = max(1, max_size)
+        self.ttl = ttl  # 0 — записи не устаревают
+        self.disk_path = disk_path or None
+        self.disk_max_size = max(1, disk_max_size)
+        self._entries: "OrderedDict[str, Tuple[float, List[float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._disk_evictions = 0
+        
+        self._disk: Optional[sqlite3.Connection] = None
+        if self.disk_path:
+            os.makedirs(os.path.dirname(os.path.abspath(self.disk_path)), exist_ok=True)
+            self._disk = sqlite3.connect(self.disk_path, check_same_thread=False)
+            self._disk.execute(
+                "CREATE TABLE IF NOT EXISTS query_embeddings ("
+                "key TEXT PRIMARY KEY, model TEXT NOT NULL, created_at REAL NOT NULL, vector BLOB NOT NULL, "
+                "used_at REAL NOT NULL DEFAULT 0)"
+            )
+            # Таблица первой версии кэша дополняется временем последнего обращения (для LRU)
+            columns = {row[1] for row in self._disk.execute("PRAGMA table_info(query_embeddings)")}
+            if "used_at" not in columns:
+                self._disk.execute("ALTER TABLE query_embeddings ADD COLUMN used_at REAL NOT NULL DEFAULT 0")
+                self._disk.execute("UPDATE query_embeddings SET used_at = created_at")
+            self._disk.execute("CREATE INDEX IF NOT EXISTS query_embeddings_created_at ON query_embeddings (created_at)")
+            self._disk.execute("CREATE INDEX IF NOT EXISTS query_embeddings_used_at ON query_embeddings (used_at)")
+            self._disk.commit()
+            with self._lock:
+                self._prune_disk()
+    
+    @staticmethod
+    def normalize(text: str) -> str:
+        """Нормализует запрос: юникод NFKC и схлопывание пробельных символов"""
+        return " ".join(unicodedata.normalize("NFKC", text).split())
+    
+    def _key(self, text: str, model_name: str) -> str:
+        return hashlib.sha256(f"{model_name}\0{self.normalize(text)}".encode("utf-8")).hexdigest()
+    
+    def _is_expired(self, created_at: float) -> bool:
+        return bool(self.ttl) and time.time() - created_at > self.ttl
+    
+    def get(self, text: str, model_name: str) -> Optional[List[float]]:
+        """Возвращает эмбединг из кэша или None"""
+        key = self._key(text, model_name)
+        
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if not self._is_expired(entry[0]):
+                    self._entries.move_to_end(key)
+                    self._hits += 1
+                    return entry[1]
+                del self._entries[key]
+            
+            if self._disk is not None:
+                row = self._disk.execute(
+                    "SELECT created_at, vector FROM query_embeddings WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and not self._is_expired(row[0]):
+                    self._disk.execute("UPDATE query_embeddings SET used_at = ? WHERE key = ?", (time.time(), key))
+                    self._disk.commit()
+                    embedding = array("d", row[1]).tolist()
+                    self._store(key, row[0], embedding)
+                    self._disk_hits += 1
+                    return embedding
+            
+            self._misses += 1
+            return None
+    
+    def put(self, text: str, model_name: str, embedding: List[float]):
+        """Сохраняет эмбединг запроса в кэш"""
+        key = self._key(text, model_name)
+        created_at = time.time()
+        
+        with self._lock:
+            self._store(key, created_at, embedding)
+            if self._disk is not None:
+                self._disk.execute(
+                    "INSERT OR REPLACE INTO query_embeddings (key, model, created_at, vector, used_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (key, model_name, created_at, array("d", embedding).tobytes(), created_at)
+                )
+                self._prune_disk()
+    
+    def _prune_disk(self):
+        """Удаляет с диска устаревшие записи и давно не использованные сверх disk_max_size"""
+        removed = 0
+        if self.ttl:
+            removed += self._disk.execute(
+                "DELETE FROM query_embeddings WHERE created_at < ?", (time.time() - self.ttl,)
+            ).rowcount
+        removed += self._disk.execute(
+            "DELETE FROM query_embeddings WHERE key IN ("
+            "SELECT key FROM query_embeddings ORDER BY used_at DESC LIMIT -1 OFFSET ?)",
+            (self.disk_max_size,)
+        ).rowcount
+        self._disk.commit()
+        self._disk_evictions += removed
+    
+    def _store(self, key: str, created_at: float, embedding: List[float]):
+        self._entries[key] = (created_at, embedding)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self._evictions += 1
+    
+    def get_or_compute(self, text: str, model_name: str, compute: Callable[[str], List[float]]) -> List[float]:
+        """Возвращает эмбединг из кэша, при промахе вычисляет и сохраняет его"""
+        embedding = self.get(text, model_name)
+        if embedding is None:
+            embedding = compute(text)
+            self.put(text, model_name, embedding)
+        return embedding
+    
+    def clear(self):
+        """Очищает кэш в памяти и на диске"""
+        with self._lock:
+            self._entries.clear()
+            if self._disk is not None:
+                self._disk.execute("DELETE FROM query_embeddings")
+                self._disk.commit()
+    
+    def stats(self) -> Dict[str, Any]:
+        """Возвращает счетчики попаданий и промахов"""
+        with self._lock:
+            lookups = self._hits + self._disk_hits + self._misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl,
+                "disk_enabled": self._disk is not None,
+                "disk_max_size": self.disk_max_size,
+                "hits": self._hits,
+                "disk_hits": self._disk_hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+                "disk_evictions": self._disk_evictions,
+                "hit_rate": round((self._hits + self._disk_hits) / lookups, 4) if lookups else 0.0
+            }
+
+_query_cache: Optional[QueryEmbeddingCache] = None
+_query_cache_lock = threading.Lock()
+
+def get_query_embedding_cache() -> QueryEmbeddingCache:
+    """Возвращает общий для процесса кэш эмбедингов запросов"""
+    global _query_cache
+    if _query_cache is None:
+        with _query_cache_lock:
+            if _query_cache is None:
+                _query_cache = QueryEmbeddingCache(
+                    max_size=Config.QUERY_CACHE_SIZE,
+                    ttl=Config.QUERY_CACHE_TTL,
+                    disk_path=Config.QUERY_CACHE_DISK_PATH,
+                    disk_max_size=Config.QUERY_CACHE_DISK_SIZE
+                )
+                logger.info(
+                    f"Кэш эмбедингов запросов: размер {Config.QUERY_CACHE_SIZE}, TTL {Config.QUERY_CACHE_TTL}с, "
+                    f"диск: {Config.QUERY_CACHE_DISK_PATH or 'отключен'}"
+                )
+    return _query_cache
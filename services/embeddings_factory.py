@@ -7,21 +7,27 @@ class EmbeddingsFactory:
     """Фабрика для создания сервисов эмбедингов"""
     
     @staticmethod
-    def create_embeddings_service() -> Union[EmbeddingsService, LocalEmbeddingsService]:
-        """Создает сервис эмбедингов в зависимости от настроек"""
-        embedding_type = Config.EMBEDDING_TYPE.lower()
+    def create_embeddings_service(embedding_type: str = None) -> Union[EmbeddingsService, LocalEmbeddingsService]:
+        """Создает сервис эмбедингов указанного типа (по умолчанию — из настроек)"""
+        embedding_type = (embedding_type or Config.EMBEDDING_TYPE).lower()
         
         if embedding_type == "local":
             return LocalEmbeddingsService(Config.LOCAL_MODEL_NAME)
+        elif embedding_type == "local_int8":
+            # Та же модель с int8-квантизацией для CPU
+            return LocalEmbeddingsService(Config.LOCAL_MODEL_NAME, backend="int8")
+        elif embedding_type == "local_onnx":
+            # Та же модель, исполняемая через ONNX Runtime
+            return LocalEmbeddingsService(Config.LOCAL_MODEL_NAME, backend="onnx")
         elif embedding_type == "openai":
             return EmbeddingsService()
         else:
-            raise ValueError(f"Неизвестный тип эмбедингов: {embedding_type}. Поддерживаемые типы: 'openai', 'local'")
+            raise ValueError(f"Неизвестный тип эмбедингов: {embedding_type}. Поддерживаемые типы: {EmbeddingsFactory.get_available_types()}")
     
     @staticmethod
     def get_available_types() -> list:
         """Возвращает список доступных типов эмбедингов"""
-        return ["openai", "local"]
+        return ["openai", "local", "local_int8", "local_onnx"]
     
     @staticmethod
     def get_current_type() -> str:
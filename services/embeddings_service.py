@@ -1,96 +1,146 @@
 import openai
-import chromadb
-from chromadb.config import Settings
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple
 import uuid
 from config import Config
+from services.vector_store import get_vector_store
+from services.embedding_cache import get_query_embedding_cache
+from services.chunk_embedding_store import get_chunk_embedding_store
+from services.embedding_batcher import EmbeddingBatcher, is_retryable_error
+from utils.chunking import Chunk
 
 class EmbeddingsService:
     def __init__(self):
-        self.client = openai.OpenAI(api_key=Config.OPENAI_API_KEY)
-        self.chroma_client = chromadb.PersistentClient(
-            path="./chroma_db",
-            settings=Settings(anonymized_telemetry=False)
-        )
-        self.default_collection = self.chroma_client.get_or_create_collection(
-            name="documents",
-            metadata={"hnsw:space": "cosine"}
+        # Повторы выполняет EmbeddingBatcher для каждого батча отдельно
+        self.client = openai.OpenAI(api_key=Config.OPENAI_API_KEY, max_retries=0)
+        self.model_name = "text-embedding-ada-002"
+        # Токенизатор модели для разбивки на чанки по токенам (см. utils.chunking.get_token_counter)
+        self.tokenizer = "tiktoken:cl100k_base"
+        self.batcher = EmbeddingBatcher(
+            max_tokens=Config.EMBEDDING_BATCH_MAX_TOKENS,
+            max_items=Config.EMBEDDING_BATCH_MAX_ITEMS,
+            concurrency=Config.EMBEDDING_BATCH_CONCURRENCY,
+            max_retries=Config.EMBEDDING_BATCH_MAX_RETRIES,
+            retry_backoff=Config.EMBEDDING_BATCH_RETRY_BACKOFF,
+            max_input_tokens=Config.EMBEDDING_MAX_INPUT_TOKENS,
+            # Сетевые ошибки и таймауты клиента OpenAI не наследуют встроенные ConnectionError/TimeoutError
+            is_retryable=lambda error: isinstance(error, openai.APIConnectionError) or is_retryable_error(error)
         )
+        self.query_cache = get_query_embedding_cache()
+        self.chunk_store = get_chunk_embedding_store()
+        self.vector_store = get_vector_store()
+        self.default_collection = self.vector_store.get_collection("documents")
     
     def get_collection(self, collection_name: str):
-        """Получает или создает коллекцию по имени"""
-        return self.chroma_client.get_or_create_collection(
-            name=collection_name,
-            metadata={"hnsw:space": "cosine"}
-        )
+        """Получает или создает коллекцию по имени (дескриптор кэшируется в VectorStore)"""
+        return self.vector_store.get_collection(collection_name)
     
     def get_embeddings(self, texts: List[str]) -> List[List[float]]:
-        """Получает эмбединги для списка текстов через OpenAI API"""
+        """Получает эмбединги для списка текстов через OpenAI API (батчами по бюджету токенов)"""
         try:
-            response = self.client.embeddings.create(
-                model="text-embedding-ada-002",
-                input=texts
-            )
-            return [embedding.embedding for embedding in response.data]
+            return self.batcher.run(texts, self._embed_batch)
         except Exception as e:
             raise Exception(f"Ошибка при получении эмбедингов: {str(e)}")
     
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        """Выполняет один запрос эмбедингов к OpenAI API"""
+        response = self.client.embeddings.create(
+            model=self.model_name,
+            input=texts
+        )
+        return [embedding.embedding for embedding in sorted(response.data, key=lambda item: item.index)]
+    
     def store_document(self, file_id: str, chunks: List[str], metadata: Dict[str, Any] = None, collection_name: str = "documents"):
         """Сохраняет документ в ChromaDB"""
+        self.store_documents([(file_id, chunks, metadata)], collection_name)
+    
+    def store_documents(self, documents: List[Tuple[str, List[str], Dict[str, Any]]], collection_name: str = "documents"):
+        """Сохраняет несколько документов (file_id, чанки, метаданные): эмбединги всех чанков
+        запрашиваются общими батчами, запись в ChromaDB идет крупными порциями
+        """
         try:
-            # Получаем эмбединги для всех чанков
-            embeddings = self.get_embeddings(chunks)
+            all_chunks = [chunk for _, chunks, _ in documents for chunk in chunks]
             
-            # Создаем уникальные ID для каждого чанка
-            ids = [f"{file_id}_{i}" for i in range(len(chunks))]
+            # Получаем эмбединги для всех чанков (уже известные чанки берутся из хранилища)
+            embeddings = self.embed_chunks(all_chunks)
             
-            # Подготавливаем метаданные (упрощаем для ChromaDB)
+            ids = []
             metadatas = []
-            for i, chunk in enumerate(chunks):
-                chunk_metadata = {
-                    "file_id": file_id,
-                    "chunk_index": str(i),
-                    "chunk_size": str(len(chunk))
-                }
-                
-                # Добавляем только простые метаданные из исходного файла
-                if metadata:
-                    # Копируем только простые поля
-                    simple_fields = [
-                        "filename", "file_size", "total_chunks", 
-                        "file_type", "original_path", "txt_path", 
-                        "conversion_method"
-                    ]
-                    for field in simple_fields:
-                        if field in metadata:
-                            value = metadata[field]
-                            # Преобразуем в строку для ChromaDB
-                            if isinstance(value, (dict, list)):
-                                # Пропускаем сложные типы данных
-                                continue
-                            chunk_metadata[field] = str(value) if value is not None else ""
-                
-                metadatas.append(chunk_metadata)
-            
-            # Получаем нужную коллекцию
-            collection = self.get_collection(collection_name)
+            for file_id, chunks, metadata in documents:
+                chunk_ids, chunk_metadatas = self.chunk_records(file_id, chunks, metadata)
+                ids.extend(chunk_ids)
+                metadatas.extend(chunk_metadatas)
             
             # Добавляем в коллекцию
-            collection.add(
+            self.vector_store.add(
+                collection_name,
+                ids=ids,
                 embeddings=embeddings,
-                documents=chunks,
-                metadatas=metadatas,
-                ids=ids
+                documents=all_chunks,
+                metadatas=metadatas
             )
             
         except Exception as e:
             raise Exception(f"Ошибка при сохранении документа в ChromaDB: {str(e)}")
     
+    def embed_chunks(self, chunks: List[str]) -> List[List[float]]:
+        """Эмбединги чанков документа (уже известные чанки берутся из хранилища)"""
+        return self.chunk_store.get_or_embed(chunks, self.model_name, self.get_embeddings)
+    
+    def chunk_records(
+        self,
+        file_id: str,
+        chunks: List[str],
+        metadata: Dict[str, Any] = None,
+        start_index: int = 0
+    ) -> Tuple[List[str], List[Dict[str, Any]]]:
+        """ID и метаданные записей ChromaDB для чанков документа, начиная с чанка start_index"""
+        # Создаем уникальные ID для каждого чанка
+        ids = [f"{file_id}_{i}" for i in range(start_index, start_index + len(chunks))]
+        return ids, self._chunk_metadatas(file_id, chunks, metadata, start_index)
+    
+    @staticmethod
+    def _chunk_metadatas(file_id: str, chunks: List[str], metadata: Dict[str, Any] = None, start_index: int = 0) -> List[Dict[str, Any]]:
+        """Подготавливает метаданные чанков (упрощаем для ChromaDB)"""
+        metadatas = []
+        for i, chunk in enumerate(chunks, start_index):
+            chunk_metadata = {
+                "file_id": file_id,
+                "chunk_index": str(i),
+                "chunk_size": str(len(chunk))
+            }
+            # Положение чанка в документе (смещения и страницы) для ссылок на источник
+            if isinstance(chunk, Chunk):
+                chunk_metadata.update({key: str(value) for key, value in chunk.location().items()})
+            
+            # Добавляем только простые метаданные из исходного файла
+            if metadata:
+                # Копируем только простые поля
+                simple_fields = [
+                    "filename", "file_size", "total_chunks", 
+                    "file_type", "original_path", "txt_path", 
+                    "conversion_method", "content_hash"
+                ]
+                for field in simple_fields:
+                    if field in metadata:
+                        value = metadata[field]
+                        # Преобразуем в строку для ChromaDB
+                        if isinstance(value, (dict, list)):
+                            # Пропускаем сложные типы данных
+                            continue
+                        chunk_metadata[field] = str(value) if value is not None else ""
+            
+            metadatas.append(chunk_metadata)
+        return metadatas
+    
     def search_similar(self, query: str, top_k: int = 5, collection_name: str = "documents") -> List[Dict[str, Any]]:
         """Ищет похожие документы в ChromaDB"""
         try:
-            # Получаем эмбединг для запроса
-            query_embedding = self.get_embeddings([query])[0]
+            # Получаем эмбединг для запроса (повторные запросы берутся из кэша)
+            query_embedding = self.query_cache.get_or_compute(
+                query,
+                self.model_name,
+                lambda text: self.get_embeddings([text])[0]
+            )
             
             # Получаем нужную коллекцию
             collection = self.get_collection(collection_name)
@@ -139,14 +189,8 @@ class EmbeddingsService:
     def clear_all(self, collection_name: str = "documents"):
         """Очищает всю коллекцию ChromaDB"""
         try:
-            # Удаляем всю коллекцию
-            self.chroma_client.delete_collection(name=collection_name)
-            
-            # Создаем новую пустую коллекцию
-            self.collection = self.chroma_client.create_collection(
-                name=collection_name,
-                metadata={"hnsw:space": "cosine"}
-            )
+            # Удаляем всю коллекцию и создаем новую пустую
+            self.collection = self.vector_store.reset_collection(collection_name)
                 
         except Exception as e:
             raise Exception(f"Ошибка при очистке ChromaDB: {str(e)}") 
\ No newline at end of file
@@ -0,0 +1,170 @@
+import asyncio
+import functools
+import logging
+import threading
+import time
+from concurrent.futures import Executor, Future, ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Any, Callable, Dict
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class ExecutorOverloadedError(Exception):
+    """Очередь пула переполнена — задачу нужно повторить позже"""
+
+
+class ExecutorPool:
+    """Ограниченный пул потоков/процессов с метриками глубины очереди"""
+
+    def __init__(self, name: str, max_workers: int, kind: str = "thread", max_queue: int = 0):
+        self.name = name
+        self.kind = kind
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max(0, max_queue)  # 0 — очередь не ограничена
+
+        if kind == "process":
+            self._executor: Executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        elif kind == "thread":
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix=f"{name}-pool"
+            )
+        else:
+            raise ValueError(f"Неизвестный тип пула: {kind}. Поддерживаемые типы: 'thread', 'process'")
+
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._peak_queue_depth = 0
+        self._submitted = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._total_duration = 0.0
+
+    def _queue_depth(self) -> int:
+        return max(0, self._in_flight - self.max_workers)
+
+    def submit(self, func: Callable, *args, **kwargs) -> Future:
+        """Отправляет задачу в пул; при переполненной очереди бросает ExecutorOverloadedError"""
+        call = functools.partial(func, *args, **kwargs)
+
+        with self._lock:
+            if self.max_queue and self._queue_depth() >= self.max_queue:
+                self._rejected += 1
+                raise ExecutorOverloadedError(
+                    f"Пул '{self.name}' перегружен: в очереди {self._queue_depth()} задач"
+                )
+            self._in_flight += 1
+            self._submitted += 1
+            self._peak_queue_depth = max(self._peak_queue_depth, self._queue_depth())
+
+        started = time.monotonic()
+        try:
+            future = self._executor.submit(call)
+        except Exception:
+            with self._lock:
+                self._in_flight -= 1
+            raise
+
+        def _on_done(done: Future):
+            with self._lock:
+                self._in_flight -= 1
+                self._total_duration += time.monotonic() - started
+                if done.cancelled() or done.exception() is not None:
+                    self._failed += 1
+                else:
+                    self._completed += 1
+
+        future.add_done_callback(_on_done)
+        return future
+
+    async def run(self, func: Callable, *args, **kwargs) -> Any:
+        """Выполняет блокирующую функцию в пуле, не блокируя event loop"""
+        return await asyncio.wrap_future(self.submit(func, *args, **kwargs))
+
+    def stats(self) -> Dict[str, Any]:
+        """Возвращает метрики пула"""
+        with self._lock:
+            finished = self._completed + self._failed
+            return {
+                "kind": self.kind,
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "in_flight": self._in_flight,
+                "active": min(self._in_flight, self.max_workers),
+                "queue_depth": self._queue_depth(),
+                "peak_queue_depth": self._peak_queue_depth,
+                "submitted": self._submitted,
+                "completed": self._completed,
+                "failed": self._failed,
+                "rejected": self._rejected,
+                "avg_duration_ms": round(self._total_duration / finished * 1000, 2) if finished else 0.0
+            }
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
+
+
+class ExecutorService:
+    """Слой исполнения блокирующих операций для асинхронных обработчиков.
+
+    Держит отдельные пулы для разбора файлов (CPU), инференса эмбедингов,
+    блокирующего сетевого ввода-вывода и конвейеров загрузки документов,
+    чтобы долгая загрузка документа не останавливала поиск и /health.
+    """
+
+    PARSING = "parsing"
+    EMBEDDING = "embedding"
+    IO = "io"
+    PIPELINE = "pipeline"
+
+    def __init__(self):
+        self.pools: Dict[str, ExecutorPool] = {
+            self.PARSING: ExecutorPool(
+                self.PARSING,
+                Config.PARSING_WORKERS,
+                kind=Config.PARSING_POOL_TYPE,
+                max_queue=Config.EXECUTOR_MAX_QUEUE
+            ),
+            self.EMBEDDING: ExecutorPool(
+                self.EMBEDDING,
+                Config.EMBEDDING_WORKERS,
+                max_queue=Config.EXECUTOR_MAX_QUEUE
+            ),
+            self.IO: ExecutorPool(
+                self.IO,
+                Config.IO_WORKERS,
+                max_queue=Config.EXECUTOR_MAX_QUEUE
+            ),
+            # Конвейер загрузки управляет своими потоками и ждет их, поэтому пул
+            # всегда потоковый; эмбединги конвейер отправляет в пул EMBEDDING
+            self.PIPELINE: ExecutorPool(
+                self.PIPELINE,
+                Config.PIPELINE_WORKERS,
+                max_queue=Config.EXECUTOR_MAX_QUEUE
+            ),
+        }
+        logger.info(
+            "Пулы исполнения: " + ", ".join(
+                f"{name}={pool.kind}x{pool.max_workers}" for name, pool in self.pools.items()
+            )
+        )
+
+    def get_pool(self, name: str) -> ExecutorPool:
+        if name not in self.pools:
+            raise ValueError(f"Неизвестный пул: {name}")
+        return self.pools[name]
+
+    async def run(self, pool_name: str, func: Callable, *args, **kwargs) -> Any:
+        """Выполняет func в указанном пуле"""
+        return await self.get_pool(pool_name).run(func, *args, **kwargs)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Возвращает метрики всех пулов"""
+        return {name: pool.stats() for name, pool in self.pools.items()}
+
+    def shutdown(self, wait: bool = True):
+        for pool in self.pools.values():
+            pool.shutdown(wait=wait)
@@ -1,13 +1,56 @@
+import hashlib
+import io
 import os
+import re
+import tarfile
 import uuid
-from typing import Dict, Any, Tuple
-from utils.text_extractor import TextExtractor
+import zipfile
+from typing import Dict, Any, BinaryIO, Callable, Generator, Iterator, List, Optional, Tuple
+from config import Config
+from utils.chunking import TextSegment
+from utils.compression import compress_file, compression_of, compression_suffix, open_file
+from utils.text_extractor import TextExtractor, consume
+
+class FileTooLargeError(ValueError):
+    """Загружаемый файл превышает MAX_UPLOAD_SIZE"""
 
 class FileProcessor:
     """Сервис для обработки загруженных файлов"""
     
-    def __init__(self, upload_dir: str):
+    ALLOWED_EXTENSIONS = {'.pdf', '.docx', '.txt'}
+    ARCHIVE_SUFFIXES = ('.zip', '.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tar.xz')
+    # file_id становится частью пути: без точек и разделителей каталогов
+    FILE_ID_PATTERN = re.compile(r"[\w-]+")
+    # Файлы документов, загруженных до разбиения по каталогам (в корне uploads)
+    LEGACY_FILE_PATTERN = re.compile(r"([\w-]+?)(?:\.txt|_original\.\w+)")
+    # Что делать с оригиналом после успешной загрузки документа
+    ORIGINALS_POLICIES = ("keep", "drop", "archive")
+    
+    def __init__(
+        self,
+        upload_dir: str,
+        read_chunk_size: int = None,
+        max_file_size: int = None,
+        text_compression: str = None,
+        originals: str = None,
+        archive_dir: str = None
+    ):
         self.upload_dir = upload_dir
+        self.read_chunk_size = read_chunk_size or Config.UPLOAD_READ_CHUNK_SIZE
+        self.max_file_size = Config.MAX_UPLOAD_SIZE if max_file_size is None else max_file_size
+        # txt-версии (и архивные оригиналы) пишутся сжатыми; читаются по расширению в любом режиме
+        self.text_compression = text_compression or Config.TEXT_COMPRESSION
+        self.compression_level = Config.TEXT_COMPRESSION_LEVEL
+        self.text_suffix = compression_suffix(self.text_compression)
+        if self.text_compression == "zstd":
+            import zstandard  # noqa: F401 — без пакета ошибка сразу при старте, а не на первой загрузке
+        self.originals = originals or Config.UPLOAD_ORIGINALS
+        if self.originals not in self.ORIGINALS_POLICIES:
+            raise ValueError(
+                f"Неподдерживаемая политика хранения оригиналов: {self.originals}. "
+                f"Доступны: {', '.join(self.ORIGINALS_POLICIES)}"
+            )
+        self.archive_dir = archive_dir or Config.ORIGINALS_ARCHIVE_DIR
     
     def process_uploaded_file(self, file_content: bytes, original_filename: str) -> Dict[str, Any]:
         """
@@ -19,43 +62,108 @@ class FileProcessor:
         Returns:
             Dict с file_id, путями к файлам, текстом и метаданными
         """
+        saved = self.save_upload(io.BytesIO(file_content), original_filename)
+        return self.process_saved_file(saved)
+    
+    def save_upload(self, source: BinaryIO, original_filename: str) -> Dict[str, Any]:
+        """
+        Потоково сохраняет оригинал на диск блоками по read_chunk_size байт,
+        попутно считая размер и SHA-256. Память на загрузку ограничена размером блока.
+        
+        Returns:
+            Dict с file_id, путем к оригиналу, размером и хэшем содержимого
+        """
         # Проверяем формат файла
         file_extension = os.path.splitext(original_filename)[1].lower()
-        allowed_extensions = {'.pdf', '.docx', '.txt'}
         
-        if file_extension not in allowed_extensions:
+        if file_extension not in self.ALLOWED_EXTENSIONS:
             raise ValueError(f"Неподдерживаемый формат файла: {file_extension}")
         
         # Генерируем уникальный ID
         file_id = str(uuid.uuid4())
+        original_path = self.original_path(file_id, file_extension)
+        os.makedirs(self.file_dir(file_id), exist_ok=True)
         
-        # Формируем пути к файлам
-        original_path = os.path.join(self.upload_dir, f"{file_id}_original{file_extension}")
-        txt_path = os.path.join(self.upload_dir, f"{file_id}.txt")
-        
+        hasher = hashlib.sha256()
+        file_size = 0
         try:
-            # Сохраняем оригинал
             with open(original_path, "wb") as buffer:
-                buffer.write(file_content)
-            
-            # Извлекаем текст и сохраняем как txt
-            text_data = TextExtractor.extract_text_with_metadata(original_path)
-            text = text_data['text']
-            metadata = text_data['metadata']
+                while True:
+                    block = source.read(self.read_chunk_size)
+                    if not block:
+                        break
+                    file_size += len(block)
+                    if self.max_file_size and file_size > self.max_file_size:
+                        raise FileTooLargeError(
+                            f"Файл превышает допустимый размер {self.max_file_size} байт"
+                        )
+                    hasher.update(block)
+                    buffer.write(block)
+        except Exception:
+            self._cleanup_files(original_path)
+            raise
+        
+        return {
+            "file_id": file_id,
+            "original_filename": original_filename,
+            "original_path": original_path,
+            "txt_path": self.txt_path(file_id),
+            "file_size": file_size,
+            "content_hash": hasher.hexdigest(),
+            "file_type": file_extension
+        }
+    
+    def process_saved_file(self, saved: Dict[str, Any], on_page: Optional[Callable[[int, int], None]] = None) -> Dict[str, Any]:
+        """
+        Извлекает текст из сохраненного оригинала и сохраняет txt-версию
+        
+        Args:
+            saved: результат save_upload
+            on_page: вызывается после каждой страницы PDF с (обработано, всего)
             
-            with open(txt_path, "w", encoding="utf-8") as txt_file:
-                txt_file.write(text)
+        Returns:
+            Dict с file_id, путями к файлам, текстом и метаданными
+        """
+        return consume(self.iter_saved_file(saved, on_page))
+    
+    def iter_saved_file(
+        self,
+        saved: Dict[str, Any],
+        on_page: Optional[Callable[[int, int], None]] = None
+    ) -> Generator[TextSegment, None, Dict[str, Any]]:
+        """
+        Потоковый вариант process_saved_file: отдает фрагменты текста (номер
+        страницы, текст) по мере извлечения, попутно дописывая их в txt-версию,
+        и возвращает тот же результат, что process_saved_file
+        """
+        file_id = saved["file_id"]
+        original_path = saved["original_path"]
+        txt_path = self.txt_path(file_id)
+        
+        try:
+            # Извлекаем текст и сохраняем как txt (сжатым, если задано TEXT_COMPRESSION)
+            with open_file(txt_path, "wt", self.compression_level) as txt_file:
+                stream = TextExtractor.iter_text_with_metadata(original_path, on_page)
+                while True:
+                    try:
+                        segment = next(stream)
+                    except StopIteration as stop:
+                        text_data = stop.value
+                        break
+                    txt_file.write(segment[1])
+                    yield segment
             
             # Формируем результат
             result = {
                 "file_id": file_id,
-                "original_filename": original_filename,
+                "original_filename": saved["original_filename"],
                 "original_path": original_path,
                 "txt_path": txt_path,
-                "text": text,
-                "file_size": len(file_content),
-                "file_type": file_extension,
-                "extraction_metadata": metadata
+                "text": text_data['text'],
+                "file_size": saved["file_size"],
+                "content_hash": saved["content_hash"],
+                "file_type": saved["file_type"],
+                "extraction_metadata": text_data['metadata']
             }
             
             return result
@@ -65,33 +173,228 @@ class FileProcessor:
             self._cleanup_files(original_path, txt_path)
             raise Exception(f"Ошибка при обработке файла: {str(e)}")
     
-    def delete_file_versions(self, file_id: str) -> bool:
+    def file_dir(self, file_id: str) -> str:
+        """Каталог файлов документа: uploads/<2 символа id>/<следующие 2 символа id>,
+        чтобы в одном каталоге не копились сотни тысяч файлов"""
+        return os.path.join(self.upload_dir, file_id[:2], file_id[2:4])
+    
+    def txt_path(self, file_id: str) -> str:
+        """Путь к txt-версии документа"""
+        return os.path.join(self.file_dir(file_id), f"{file_id}.txt{self.text_suffix}")
+    
+    def original_path(self, file_id: str, file_extension: str) -> str:
+        """Путь к оригиналу документа"""
+        return os.path.join(self.file_dir(file_id), f"{file_id}_original{file_extension}")
+    
+    def archived_original_path(self, file_id: str, file_extension: str) -> str:
+        """Путь к оригиналу в архиве (ORIGINALS_ARCHIVE_DIR, с тем же сжатием, что txt-версии)"""
+        return os.path.join(
+            self.archive_dir, file_id[:2], file_id[2:4], f"{file_id}_original{file_extension}{self.text_suffix}"
+        )
+    
+    def stored_original_path(self, file_id: str, file_extension: str) -> Optional[str]:
+        """Где будет храниться оригинал после загрузки (None, если оригиналы не хранятся)"""
+        if self.originals == "drop":
+            return None
+        if self.originals == "archive":
+            return self.archived_original_path(file_id, file_extension)
+        return self.original_path(file_id, file_extension)
+    
+    def store_original(self, saved: Dict[str, Any]) -> Optional[str]:
+        """
+        Применяет UPLOAD_ORIGINALS к оригиналу успешно загруженного документа:
+        оставляет, удаляет или переносит в архив
+        
+        Returns:
+            Путь к оригиналу после этого (None, если оригинал удален)
+        """
+        original_path = saved["original_path"]
+        if self.originals == "keep" or not original_path or not os.path.exists(original_path):
+            return original_path
+        
+        target_path = self.stored_original_path(saved["file_id"], saved["file_type"])
+        if target_path:
+            os.makedirs(os.path.dirname(target_path), exist_ok=True)
+            try:
+                compress_file(original_path, target_path, self.compression_level, self.read_chunk_size)
+            except Exception:
+                self._cleanup_files(target_path)
+                raise
+        os.remove(original_path)
+        return target_path
+    
+    def _version_paths(self, file_id: str, stored: Optional[Dict[str, Any]] = None) -> List[Tuple[str, str]]:
+        """
+        Пути файлов документа (вид, путь). Для документа из реестра (stored — его
+        запись или результат save_upload) берутся сохраненные пути; без записи —
+        пути по текущим настройкам и в корне uploads (загрузки до разбиения по каталогам)
+        """
+        if not self.FILE_ID_PATTERN.fullmatch(file_id):
+            return []
+        
+        if stored is not None:
+            paths = [("txt_path", stored.get("txt_path")), ("original_path", stored.get("original_path"))]
+            # Оригинал мог быть перенесен по UPLOAD_ORIGINALS уже после записи пути
+            if stored.get("file_type"):
+                paths.append(("original_path", self.stored_original_path(file_id, stored["file_type"])))
+            return [(kind, path) for kind, path in paths if path]
+        
+        paths = [
+            ("txt_path", self.txt_path(file_id)),
+            ("txt_path", os.path.join(self.upload_dir, f"{file_id}.txt"))
+        ]
+        for extension in sorted(self.ALLOWED_EXTENSIONS):
+            paths.append(("original_path", self.original_path(file_id, extension)))
+            if self.originals == "archive":
+                paths.append(("original_path", self.archived_original_path(file_id, extension)))
+            paths.append(("original_path", os.path.join(self.upload_dir, f"{file_id}_original{extension}")))
+        return paths
+    
+    def legacy_file_ids(self) -> List[str]:
+        """file_id документов, файлы которых лежат в корне uploads (загрузки до разбиения по каталогам)"""
+        if not os.path.isdir(self.upload_dir):
+            return []
+        file_ids = set()
+        with os.scandir(self.upload_dir) as entries:
+            for entry in entries:
+                match = self.LEGACY_FILE_PATTERN.fullmatch(entry.name)
+                if match and entry.is_file():
+                    file_ids.add(match.group(1))
+        return sorted(file_ids)
+    
+    def replace_file_versions(
+        self,
+        file_id: str,
+        file_data: Dict[str, Any],
+        stored: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """
+        Переносит файлы новой редакции документа (результат process_saved_file)
+        под file_id существующего документа, удаляя прежние версии (по пути
+        из записи реестра stored, если она есть)
+        
+        Returns:
+            file_data с file_id и путями существующего документа
+        """
+        original_path = self.original_path(file_id, file_data["file_type"])
+        txt_path = self.txt_path(file_id)
+        self.delete_file_versions(file_id, stored)
+        os.makedirs(self.file_dir(file_id), exist_ok=True)
+        os.replace(file_data["original_path"], original_path)
+        os.replace(file_data["txt_path"], txt_path)
+        return {**file_data, "file_id": file_id, "original_path": original_path, "txt_path": txt_path}
+    
+    @classmethod
+    def is_archive(cls, filename: str) -> bool:
+        return filename.lower().endswith(cls.ARCHIVE_SUFFIXES)
+    
+    def save_archive(self, source: BinaryIO, archive_name: str, max_files: int = 0) -> List[Dict[str, Any]]:
+        """
+        Потоково сохраняет документы из zip/tar архива (каждый — через save_upload)
+        
+        Args:
+            source: файловый объект архива (с поддержкой seek для zip)
+            archive_name: имя архива, используется как префикс имен файлов
+            max_files: максимум документов в архиве (0 — без ограничения)
+            
+        Returns:
+            Список результатов save_upload; для пропущенных и несохраненных
+            файлов — словари с original_filename и error
+        """
+        entries: List[Dict[str, Any]] = []
+        saved_count = 0
+        try:
+            for member_name, open_member in self._iter_archive(source, archive_name):
+                original_filename = f"{archive_name}/{member_name}"
+                extension = os.path.splitext(member_name)[1].lower()
+                if extension not in self.ALLOWED_EXTENSIONS:
+                    entries.append({
+                        "original_filename": original_filename,
+                        "skipped": True,
+                        "error": f"Неподдерживаемый формат файла: {extension}"
+                    })
+                    continue
+                
+                if max_files and saved_count >= max_files:
+                    raise ValueError(f"Архив {archive_name} содержит больше {max_files} документов")
+                
+                try:
+                    with open_member() as member:
+                        entries.append(self.save_upload(member, original_filename))
+                    saved_count += 1
+                except ValueError as e:
+                    entries.append({"original_filename": original_filename, "error": str(e)})
+        except Exception:
+            for entry in entries:
+                if "file_id" in entry:
+                    self.discard_upload(entry)
+            raise
+        
+        return entries
+    
+    @staticmethod
+    def _iter_archive(source: BinaryIO, archive_name: str) -> Iterator[Tuple[str, Callable[[], BinaryIO]]]:
+        """Перечисляет файлы архива: (имя, функция открытия потока содержимого)"""
+        def is_hidden(name: str) -> bool:
+            # Служебные файлы macOS и скрытые файлы
+            return name.startswith("__MACOSX/") or os.path.basename(name).startswith(".")
+        
+        if archive_name.lower().endswith(".zip"):
+            try:
+                archive = zipfile.ZipFile(source)
+            except zipfile.BadZipFile as e:
+                raise ValueError(f"Поврежденный архив {archive_name}: {str(e)}")
+            with archive:
+                for info in archive.infolist():
+                    if not info.is_dir() and not is_hidden(info.filename):
+                        yield info.filename, lambda info=info: archive.open(info)
+        else:
+            try:
+                archive = tarfile.open(fileobj=source, mode="r:*")
+            except tarfile.TarError as e:
+                raise ValueError(f"Поврежденный архив {archive_name}: {str(e)}")
+            with archive:
+                for member in archive:
+                    if member.isfile() and not is_hidden(member.name):
+                        yield member.name, lambda member=member: archive.extractfile(member)
+    
+    def discard_upload(self, saved: Dict[str, Any]):
+        """Удаляет файлы загрузки (оригинал и txt, если он уже создан), если ее обработка не состоялась"""
+        self._cleanup_files(saved["original_path"], saved.get("txt_path"))
+    
+    def delete_file_versions(self, file_id: str, stored: Optional[Dict[str, Any]] = None) -> bool:
         """
         Удаляет все версии файла (оригинал и txt)
         
         Args:
             file_id: ID файла для удаления
+            stored: запись документа в реестре (пути файлов берутся из нее)
             
         Returns:
             True если файлы удалены, False если не найдены
         """
         deleted = False
         
-        for filename in os.listdir(self.upload_dir):
-            if filename.startswith(file_id):
-                file_path = os.path.join(self.upload_dir, filename)
-                if os.path.exists(file_path):
-                    os.remove(file_path)
-                    deleted = True
+        for _, file_path in self._version_paths(file_id, stored):
+            if os.path.exists(file_path):
+                os.remove(file_path)
+                deleted = True
         
         return deleted
     
-    def get_file_info(self, file_id: str) -> Dict[str, Any]:
+    def get_file_info(
+        self,
+        file_id: str,
+        include_text: bool = False,
+        stored: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
         """
         Получает информацию о файле
         
         Args:
             file_id: ID файла
+            stored: запись документа в реестре (пути файлов берутся из нее)
+            include_text: добавить извлеченный текст (сжатая txt-версия распаковывается)
             
         Returns:
             Dict с информацией о файле
@@ -103,19 +406,29 @@ class FileProcessor:
             "exists": False
         }
         
-        for filename in os.listdir(self.upload_dir):
-            if filename.startswith(file_id):
-                file_path = os.path.join(self.upload_dir, filename)
-                if os.path.exists(file_path):
-                    file_info["exists"] = True
-                    
-                    if filename.endswith('.txt'):
-                        file_info["txt_path"] = file_path
-                    else:
-                        file_info["original_path"] = file_path
+        for kind, file_path in self._version_paths(file_id, stored):
+            if os.path.exists(file_path) and file_info[kind] is None:
+                file_info["exists"] = True
+                file_info[kind] = file_path
+        
+        if file_info["txt_path"]:
+            file_info["text_compression"] = compression_of(file_info["txt_path"])
+            if include_text:
+                file_info["text"] = self._read_txt(file_info["txt_path"])
         
         return file_info
     
+    def read_text(self, file_id: str, stored: Optional[Dict[str, Any]] = None) -> Optional[str]:
+        """Извлеченный текст документа (None, если txt-версии нет)"""
+        txt_path = self.get_file_info(file_id, stored=stored)["txt_path"]
+        return self._read_txt(txt_path) if txt_path else None
+    
+    @staticmethod
+    def _read_txt(txt_path: str) -> str:
+        """Читает txt-версию, распаковывая ее по расширению"""
+        with open_file(txt_path, "rt") as f:
+            return f.read()
+    
     def _cleanup_files(self, *file_paths):
         """Удаляет файлы в случае ошибки"""
         for file_path in file_paths:
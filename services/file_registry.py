@@ -0,0 +1,211 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+class FileRegistry:
+    """Реестр загруженных документов с адресацией по содержимому.
+
+    Документ в коллекции определяется SHA-256 байтов файла: повторная загрузка
+    того же файла в ту же коллекцию находит уже обработанный документ, и
+    извлечение, OCR и эмбединги не выполняются повторно. Запись создается при
+    приеме файла (статус processing), поэтому одновременные загрузки одного
+    файла тоже обрабатываются один раз.
+
+    Запись хранит пути к файлам документа, размер и время загрузки: сведения о
+    файлах и их список берутся из реестра, а не из просмотра каталога uploads.
+    """
+
+    PROCESSING = "processing"
+    READY = "ready"
+
+    COLUMNS = (
+        "file_id", "collection", "content_hash", "filename", "file_size", "file_type",
+        "original_path", "txt_path", "chunks_count", "status", "created_at", "updated_at"
+    )
+    # Колонки, добавленные после первой версии реестра (существующая таблица дополняется)
+    ADDED_COLUMNS = {"original_path": "TEXT", "txt_path": "TEXT"}
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            "file_id TEXT PRIMARY KEY, collection TEXT NOT NULL, content_hash TEXT NOT NULL, "
+            "filename TEXT NOT NULL, file_size INTEGER NOT NULL, file_type TEXT NOT NULL, "
+            "original_path TEXT, txt_path TEXT, "
+            "chunks_count INTEGER NOT NULL DEFAULT 0, status TEXT NOT NULL, "
+            "created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        existing = {row[1] for row in self._conn.execute("PRAGMA table_info(files)")}
+        for column, column_type in self.ADDED_COLUMNS.items():
+            if column not in existing:
+                self._conn.execute(f"ALTER TABLE files ADD COLUMN {column} {column_type}")
+        self._conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS files_content ON files (collection, content_hash)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS files_created ON files (collection, created_at)")
+        self._conn.commit()
+
+    def claim(self, collection: str, saved: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Регистрирует сохраненный файл (результат save_upload) в коллекции.
+
+        Returns:
+            None, если такого содержимого в коллекции еще нет и файл нужно
+            обработать; иначе запись уже загруженного (или загружаемого) документа
+        """
+        now = time.time()
+        with self._lock:
+            try:
+                self._conn.execute(
+                    "INSERT INTO files (file_id, collection, content_hash, filename, file_size, file_type, "
+                    "original_path, txt_path, status, created_at, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        saved["file_id"], collection, saved["content_hash"], saved["original_filename"],
+                        saved["file_size"], saved["file_type"], saved["original_path"], saved.get("txt_path"),
+                        self.PROCESSING, now, now
+                    )
+                )
+                self._conn.commit()
+                return None
+            except sqlite3.IntegrityError:
+                self._conn.rollback()
+                return self._find(collection, saved["content_hash"])
+
+    def complete(self, collection: str, saved: Dict[str, Any], chunks_count: int) -> List[Dict[str, Any]]:
+        """
+        Отмечает документ обработанным (или обновленным новой редакцией). Прежние
+        документы с тем же содержимым в коллекции (загрузка с force) снимаются с учета.
+
+        Returns:
+            записи замененных документов — их чанки и файлы нужно удалить
+        """
+        now = time.time()
+        with self._lock:
+            replaced = [
+                dict(zip(self.COLUMNS, row)) for row in self._conn.execute(
+                    f"SELECT {', '.join(self.COLUMNS)} FROM files "
+                    "WHERE collection = ? AND content_hash = ? AND file_id != ?",
+                    (collection, saved["content_hash"], saved["file_id"])
+                ).fetchall()
+            ]
+            self._conn.execute(
+                "DELETE FROM files WHERE collection = ? AND content_hash = ? AND file_id != ?",
+                (collection, saved["content_hash"], saved["file_id"])
+            )
+            self._conn.execute(
+                "INSERT INTO files (file_id, collection, content_hash, filename, file_size, file_type, "
+                "original_path, txt_path, chunks_count, status, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (file_id) DO UPDATE SET content_hash = excluded.content_hash, filename = excluded.filename, "
+                "file_size = excluded.file_size, file_type = excluded.file_type, original_path = excluded.original_path, "
+                "txt_path = excluded.txt_path, chunks_count = excluded.chunks_count, "
+                "status = excluded.status, updated_at = excluded.updated_at",
+                (
+                    saved["file_id"], collection, saved["content_hash"], saved["original_filename"],
+                    saved["file_size"], saved["file_type"], saved["original_path"], saved.get("txt_path"),
+                    chunks_count, self.READY, now, now
+                )
+            )
+            self._conn.commit()
+
+        if replaced:
+            logger.info(f"Документ {saved['file_id']} заменил прежние копии в коллекции {collection}: {replaced}")
+        return replaced
+
+    def release(self, file_id: str):
+        """Снимает с учета документ, обработка которого не удалась"""
+        with self._lock:
+            self._conn.execute("DELETE FROM files WHERE file_id = ? AND status = ?", (file_id, self.PROCESSING))
+            self._conn.commit()
+
+    def release_stale(self, active_file_ids: Iterable[str]) -> List[Dict[str, Any]]:
+        """
+        Снимает с учета документы, обработка которых прервана остановкой процесса:
+        записи processing, кроме active_file_ids (документов, которые еще обрабатываются
+        фоновыми заданиями). Иначе повторная загрузка такого файла навсегда получала бы
+        ответ «уже загружен» с нулем чанков.
+
+        Returns:
+            записи снятых документов — их частично записанные чанки и файлы нужно удалить
+        """
+        active = set(active_file_ids)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(self.COLUMNS)} FROM files WHERE status = ?", (self.PROCESSING,)
+            ).fetchall()
+            stale = [dict(zip(self.COLUMNS, row)) for row in rows if row[0] not in active]
+            self._conn.executemany(
+                "DELETE FROM files WHERE file_id = ? AND status = ?",
+                [(record["file_id"], self.PROCESSING) for record in stale]
+            )
+            self._conn.commit()
+
+        if stale:
+            logger.info(f"Сняты с учета прерванные загрузки: {[record['file_id'] for record in stale]}")
+        return stale
+
+    def get(self, file_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(self.COLUMNS)} FROM files WHERE file_id = ?", (file_id,)
+            ).fetchone()
+        return dict(zip(self.COLUMNS, row)) if row else None
+
+    def find(self, collection: str, content_hash: str) -> Optional[Dict[str, Any]]:
+        """Документ коллекции с таким содержимым"""
+        with self._lock:
+            return self._find(collection, content_hash)
+
+    def list_files(self, collection: Optional[str] = None, limit: int = 100, offset: int = 0) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        Страница записей (новые первыми) и общее число записей
+
+        Args:
+            collection: только документы коллекции (по умолчанию все)
+        """
+        where, params = ("WHERE collection = ?", (collection,)) if collection else ("", ())
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(self.COLUMNS)} FROM files {where} "
+                "ORDER BY created_at DESC, file_id LIMIT ? OFFSET ?",
+                (*params, limit, offset)
+            ).fetchall()
+            total = self._conn.execute(f"SELECT COUNT(*) FROM files {where}", params).fetchone()[0]
+        return [dict(zip(self.COLUMNS, row)) for row in rows], total
+
+    def remove(self, file_id: str):
+        """Удаляет запись документа (при удалении файла)"""
+        with self._lock:
+            self._conn.execute("DELETE FROM files WHERE file_id = ?", (file_id,))
+            self._conn.commit()
+
+    def remove_collection(self, collection: str) -> List[Dict[str, Any]]:
+        """
+        Удаляет записи всех документов коллекции (при удалении или очистке коллекции)
+
+        Returns:
+            удаленные записи — файлы этих документов нужно удалить
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(self.COLUMNS)} FROM files WHERE collection = ?", (collection,)
+            ).fetchall()
+            self._conn.execute("DELETE FROM files WHERE collection = ?", (collection,))
+            self._conn.commit()
+        return [dict(zip(self.COLUMNS, row)) for row in rows]
+
+    def _find(self, collection: str, content_hash: str) -> Optional[Dict[str, Any]]:
+        row = self._conn.execute(
+            f"SELECT {', '.join(self.COLUMNS)} FROM files WHERE collection = ? AND content_hash = ?",
+            (collection, content_hash)
+        ).fetchone()
+        return dict(zip(self.COLUMNS, row)) if row else None
@@ -0,0 +1,239 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+class QueueFullError(Exception):
+    """Очередь заданий загрузки заполнена"""
+
+class JobProgress:
+    """Передается обработчику задания: отмечает этапы, их длительность и счетчики прогресса"""
+
+    # Промежуточные счетчики пишутся в базу не чаще этого интервала
+    FLUSH_INTERVAL = 0.5
+
+    def __init__(self, queue: "IngestionJobQueue", job_id: str):
+        self._queue = queue
+        self.job_id = job_id
+        self.stage_name: Optional[str] = None
+        self.progress: Dict[str, Any] = {}
+        self.timings: Dict[str, float] = {}
+        self._last_flush = 0.0
+
+    @contextmanager
+    def stage(self, name: str):
+        self.stage_name = name
+        self._flush()
+        started = time.monotonic()
+        try:
+            yield self
+        finally:
+            self.timings[name] = round(time.monotonic() - started, 3)
+            self._flush()
+
+    def update(self, **counters):
+        self.progress.update(counters)
+        if time.monotonic() - self._last_flush >= self.FLUSH_INTERVAL:
+            self._flush()
+
+    def _flush(self):
+        self._last_flush = time.monotonic()
+        self._queue._save_progress(self.job_id, self.stage_name, self.progress, self.timings)
+
+class IngestionJobQueue:
+    """Постоянная очередь заданий загрузки документов на SQLite.
+
+    submit сохраняет задание и сразу возвращает его id, рабочие потоки
+    забирают задания по порядку и выполняют обработчик. Задания, прерванные
+    перезапуском процесса, при старте возвращаются в очередь.
+    """
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+    def __init__(
+        self,
+        path: str,
+        handler: Callable[[Dict[str, Any], JobProgress], Dict[str, Any]],
+        workers: int = 2,
+        max_queue: int = 100,
+        job_ttl: int = 7 * 24 * 3600
+    ):
+        self.path = path
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.max_queue = max_queue
+        self.job_ttl = job_ttl
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._stopped = False
+        self._threads: List[threading.Thread] = []
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, status TEXT NOT NULL, stage TEXT, payload TEXT NOT NULL, "
+            "progress TEXT NOT NULL DEFAULT '{}', timings TEXT NOT NULL DEFAULT '{}', "
+            "result TEXT, error TEXT, created_at REAL NOT NULL, started_at REAL, finished_at REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)")
+        self._conn.commit()
+
+    def start(self):
+        """Возвращает прерванные задания в очередь и запускает рабочие потоки"""
+        with self._lock:
+            recovered = self._conn.execute(
+                "UPDATE jobs SET status = ?, stage = NULL WHERE status = ?", (self.QUEUED, self.RUNNING)
+            ).rowcount
+            if self.job_ttl:
+                self._conn.execute(
+                    "DELETE FROM jobs WHERE status IN (?, ?) AND finished_at < ?",
+                    (self.DONE, self.FAILED, time.time() - self.job_ttl)
+                )
+            self._conn.commit()
+        if recovered:
+            logger.info(f"Возвращено в очередь прерванных заданий: {recovered}")
+
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"ingestion-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, payload: Dict[str, Any]) -> str:
+        """Ставит задание в очередь; при заполненной очереди — QueueFullError"""
+        job_id = str(uuid.uuid4())
+        with self._lock:
+            if self.max_queue:
+                pending = self._conn.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE status IN (?, ?)", (self.QUEUED, self.RUNNING)
+                ).fetchone()[0]
+                if pending >= self.max_queue:
+                    raise QueueFullError(f"Очередь загрузки заполнена ({pending} заданий), повторите позже")
+            self._conn.execute(
+                "INSERT INTO jobs (id, status, payload, created_at) VALUES (?, ?, ?, ?)",
+                (job_id, self.QUEUED, json.dumps(payload, ensure_ascii=False), time.time())
+            )
+            self._conn.commit()
+            self._wakeup.notify()
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, status, stage, progress, timings, result, error, created_at, started_at, finished_at "
+                "FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            position = None
+            if row[1] == self.QUEUED:
+                position = self._conn.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE status = ? AND created_at < ?", (self.QUEUED, row[7])
+                ).fetchone()[0]
+
+        return {
+            "job_id": row[0],
+            "status": row[1],
+            "stage": row[2],
+            "progress": json.loads(row[3]),
+            "timings": json.loads(row[4]),
+            "result": json.loads(row[5]) if row[5] else None,
+            "error": row[6],
+            "queue_position": position,
+            "created_at": row[7],
+            "started_at": row[8],
+            "finished_at": row[9]
+        }
+
+    def pending_payloads(self) -> List[Dict[str, Any]]:
+        """Параметры заданий, которые еще будут выполнены (в очереди или выполняются)"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT payload FROM jobs WHERE status IN (?, ?)", (self.QUEUED, self.RUNNING)
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = dict(self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        return {
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            **{status: counts.get(status, 0) for status in (self.QUEUED, self.RUNNING, self.DONE, self.FAILED)}
+        }
+
+    def shutdown(self):
+        with self._lock:
+            self._stopped = True
+            self._wakeup.notify_all()
+
+    def _claim(self) -> Optional[tuple]:
+        row = self._conn.execute(
+            "SELECT id, payload FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1", (self.QUEUED,)
+        ).fetchone()
+        if row is None:
+            return None
+        self._conn.execute(
+            "UPDATE jobs SET status = ?, started_at = ? WHERE id = ?", (self.RUNNING, time.time(), row[0])
+        )
+        self._conn.commit()
+        return row
+
+    def _worker(self):
+        while True:
+            with self._lock:
+                job = None
+                while not self._stopped:
+                    job = self._claim()
+                    if job is not None:
+                        break
+                    # Таймаут страхует от пропущенного уведомления
+                    self._wakeup.wait(timeout=1.0)
+                if job is None:
+                    return
+
+            job_id, payload = job
+            progress = JobProgress(self, job_id)
+            try:
+                result = self.handler(json.loads(payload), progress)
+                self._finish(job_id, self.DONE, progress, result=result)
+            except Exception as e:
+                logger.error(f"Задание загрузки {job_id} завершилось ошибкой: {e}")
+                self._finish(job_id, self.FAILED, progress, error=str(e))
+
+    def _save_progress(self, job_id: str, stage: Optional[str], progress: Dict[str, Any], timings: Dict[str, float]):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET stage = ?, progress = ?, timings = ? WHERE id = ?",
+                (stage, json.dumps(progress), json.dumps(timings), job_id)
+            )
+            self._conn.commit()
+
+    def _finish(self, job_id: str, status: str, progress: JobProgress, result: Any = None, error: str = None):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, stage = ?, progress = ?, timings = ?, result = ?, error = ?, finished_at = ? "
+                "WHERE id = ?",
+                (
+                    status,
+                    progress.stage_name,
+                    json.dumps(progress.progress),
+                    json.dumps(progress.timings),
+                    json.dumps(result, ensure_ascii=False) if result is not None else None,
+                    error,
+                    time.time(),
+                    job_id
+                )
+            )
+            self._conn.commit()
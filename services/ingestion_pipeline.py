@@ -0,0 +1,295 @@
+import logging
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, Generator, Iterable, Iterator, List, Optional
+
+from config import Config
+from utils.chunking import Chunk, TextSegment, chunk_document, iter_chunks
+
+logger = logging.getLogger(__name__)
+
+# Признак конца потока в очереди между этапами
+_END = object()
+
+class PipelineCancelled(Exception):
+    """Другой этап конвейера завершился ошибкой, текущий этап останавливается"""
+
+class _Channel:
+    """Ограниченная очередь между двумя этапами конвейера.
+
+    Ожидание в put/get прерывается, если любой этап упал, поэтому этапы не
+    зависают на заполненной или пустой очереди. Время ожидания копится
+    отдельно для производителя и потребителя (для расчета занятости этапов).
+    """
+
+    POLL_INTERVAL = 0.1
+
+    def __init__(self, maxsize: int, failed: threading.Event):
+        self._queue: queue.Queue = queue.Queue(maxsize=max(1, maxsize))
+        self._failed = failed
+        self.put_wait = 0.0
+        self.get_wait = 0.0
+
+    def put(self, item: Any):
+        started = time.monotonic()
+        while True:
+            if self._failed.is_set():
+                raise PipelineCancelled()
+            try:
+                self._queue.put(item, timeout=self.POLL_INTERVAL)
+                break
+            except queue.Full:
+                continue
+        self.put_wait += time.monotonic() - started
+
+    def get(self) -> Any:
+        started = time.monotonic()
+        while True:
+            if self._failed.is_set():
+                raise PipelineCancelled()
+            try:
+                item = self._queue.get(timeout=self.POLL_INTERVAL)
+                break
+            except queue.Empty:
+                continue
+        self.get_wait += time.monotonic() - started
+        return item
+
+    def __iter__(self) -> Iterator[Any]:
+        while True:
+            item = self.get()
+            if item is _END:
+                return
+            yield item
+
+class IngestionPipeline:
+    """Конвейерная загрузка документа: извлечение текста → разбивка на чанки →
+    эмбединги → запись в ChromaDB.
+
+    Этапы работают в отдельных потоках и связаны ограниченными очередями:
+    эмбединги первых страниц считаются, пока разбираются следующие, а запись
+    идет порциями по мере готовности эмбедингов. Время загрузки приближается
+    ко времени самого медленного этапа, а не к сумме всех этапов; в памяти
+    одновременно находится не больше queue_size порций на каждую очередь.
+    """
+
+    def __init__(
+        self,
+        embeddings_service,
+        collection_name: str,
+        chunking: Dict[str, Any],
+        queue_size: int = None,
+        embed_batch: int = None,
+        write_batch: int = None,
+        embed: Optional[Callable[[List[Chunk]], List[List[float]]]] = None
+    ):
+        self.embeddings_service = embeddings_service
+        # Вызов эмбедингов порции (например, через пул эмбедингов); по умолчанию сервис напрямую
+        self.embed = embed or embeddings_service.embed_chunks
+        self.collection_name = collection_name
+        self.chunking = chunking
+        self.queue_size = queue_size or Config.PIPELINE_QUEUE_SIZE
+        self.embed_batch = max(1, embed_batch or Config.PIPELINE_EMBED_BATCH)
+        self.write_batch = max(1, write_batch or Config.PIPELINE_WRITE_BATCH)
+
+    def run(
+        self,
+        file_id: str,
+        document: Generator[TextSegment, None, Dict[str, Any]],
+        metadata: Dict[str, Any],
+        on_chunks: Optional[Callable[[int], None]] = None
+    ) -> Dict[str, Any]:
+        """
+        Загружает документ конвейером. При ошибке любого этапа остальные
+        останавливаются, уже записанные чанки документа удаляются, ошибка
+        пробрасывается.
+
+        Args:
+            file_id: ID документа
+            document: генератор фрагментов текста, возвращающий результат
+                извлечения (FileProcessor.iter_saved_file)
+            metadata: метаданные документа для каждого чанка; total_chunks
+                проставляется записанным чанкам после окончания разбивки
+            on_chunks: вызывается с числом записанных чанков после каждой записи
+
+        Returns:
+            Dict с результатом извлечения (file_data), числом чанков и временем
+            работы каждого этапа без учета ожидания в очередях
+        """
+        started = time.monotonic()
+        failed = threading.Event()
+        segments = _Channel(self.queue_size, failed)
+        batches = _Channel(self.queue_size, failed)
+        embedded = _Channel(self.queue_size, failed)
+        extracted: Dict[str, Any] = {}
+        errors: List[Exception] = []
+        elapsed: Dict[str, float] = {}
+
+        def run_stage(name: str, work: Callable[[], None]) -> threading.Thread:
+            def target():
+                stage_started = time.monotonic()
+                try:
+                    work()
+                except PipelineCancelled:
+                    pass
+                except Exception as e:
+                    errors.append(e)
+                    failed.set()
+                finally:
+                    elapsed[name] = time.monotonic() - stage_started
+
+            thread = threading.Thread(target=target, name=f"pipeline-{name}", daemon=True)
+            thread.start()
+            return thread
+
+        def extract():
+            try:
+                while True:
+                    try:
+                        segment = next(document)
+                    except StopIteration as stop:
+                        extracted["file_data"] = stop.value
+                        break
+                    segments.put(segment)
+            finally:
+                # При остановке конвейера закрываем генератор: освобождаются открытые им файлы
+                document.close()
+            segments.put(_END)
+
+        def chunk():
+            batch: List[Chunk] = []
+            for item in self._chunks(segments, extracted):
+                batch.append(item)
+                if len(batch) >= self.embed_batch:
+                    batches.put(batch)
+                    batch = []
+            if batch:
+                batches.put(batch)
+            batches.put(_END)
+
+        def embed():
+            for batch in batches:
+                embedded.put((batch, self.embed(batch)))
+            embedded.put(_END)
+
+        threads = [run_stage("extract", extract), run_stage("chunk", chunk), run_stage("embed", embed)]
+
+        # Запись идет в вызывающем потоке
+        written_ids: List[str] = []
+        sample_total = None
+        write_started = time.monotonic()
+        try:
+            sample_total = self._write(file_id, embedded, metadata, written_ids, on_chunks)
+        except PipelineCancelled:
+            pass
+        except Exception as e:
+            errors.append(e)
+            failed.set()
+        elapsed["write"] = time.monotonic() - write_started
+
+        for thread in threads:
+            thread.join()
+
+        if not errors:
+            try:
+                self._set_total_chunks(written_ids, sample_total)
+            except Exception as e:
+                errors.append(e)
+
+        if errors:
+            if written_ids:
+                self._rollback(file_id)
+            raise errors[0]
+
+        # Время работы этапа без ожидания соседних этапов в очередях
+        waits = {
+            "extract": segments.put_wait,
+            "chunk": segments.get_wait + batches.put_wait,
+            "embed": batches.get_wait + embedded.put_wait,
+            "write": embedded.get_wait
+        }
+        timings = {name: round(max(0.0, elapsed[name] - waits[name]), 3) for name in waits}
+        timings["total"] = round(time.monotonic() - started, 3)
+        logger.info(f"Документ {file_id}: {len(written_ids)} чанков за {timings['total']}с, этапы: {timings}")
+
+        return {"file_data": extracted["file_data"], "chunks_count": len(written_ids), "timings": timings}
+
+    def _chunks(self, segments: Iterable[TextSegment], extracted: Dict[str, Any]) -> Iterator[Chunk]:
+        """Чанки документа по мере поступления фрагментов текста"""
+        strategy = self.chunking["chunking_strategy"]
+        if strategy == "chars":
+            return iter_chunks(segments, self.chunking["chunk_size"], self.chunking["chunk_overlap"])
+
+        # Разбивке по токенам и предложениям нужен весь текст (предложения переходят через
+        # границы страниц), поэтому она ждет конца извлечения; эмбединги и запись по-прежнему
+        # идут параллельно с разбивкой
+        for _ in segments:
+            pass
+        file_data = extracted["file_data"]
+        return iter(chunk_document(
+            file_data["text"],
+            file_data["extraction_metadata"],
+            self.chunking["chunk_size"],
+            self.chunking["chunk_overlap"],
+            strategy,
+            self.embeddings_service.tokenizer
+        ))
+
+    def _write(
+        self,
+        file_id: str,
+        embedded: _Channel,
+        metadata: Dict[str, Any],
+        written_ids: List[str],
+        on_chunks: Optional[Callable[[int], None]]
+    ) -> Any:
+        """Пишет чанки в ChromaDB порциями по write_batch; возвращает значение
+        total_chunks из метаданных записей (по нему виден формат поля у сервиса)"""
+        # Число чанков станет известно только в конце, пока пишем заглушку
+        metadata = {**metadata, "total_chunks": 0}
+        chunks: List[Chunk] = []
+        embeddings: List[List[float]] = []
+        sample_total = None
+
+        def flush():
+            nonlocal sample_total
+            ids, metadatas = self.embeddings_service.chunk_records(file_id, chunks, metadata, len(written_ids))
+            self.embeddings_service.vector_store.add(
+                self.collection_name,
+                ids=ids,
+                embeddings=embeddings,
+                documents=list(chunks),
+                metadatas=metadatas
+            )
+            written_ids.extend(ids)
+            sample_total = metadatas[0].get("total_chunks")
+            chunks.clear()
+            embeddings.clear()
+            if on_chunks:
+                on_chunks(len(written_ids))
+
+        for batch, batch_embeddings in embedded:
+            chunks.extend(batch)
+            embeddings.extend(batch_embeddings)
+            if len(chunks) >= self.write_batch:
+                flush()
+        if chunks:
+            flush()
+        return sample_total
+
+    def _set_total_chunks(self, ids: List[str], sample_total: Any):
+        """Проставляет total_chunks всем записям документа"""
+        if not ids or sample_total is None:
+            return
+        # Сервисы хранят простые поля по-разному (строкой или числом) — сохраняем формат заглушки
+        total = type(sample_total)(len(ids))
+        self.embeddings_service.vector_store.update_metadatas(
+            self.collection_name, ids, [{"total_chunks": total}] * len(ids)
+        )
+
+    def _rollback(self, file_id: str):
+        try:
+            self.embeddings_service.delete_document(file_id, self.collection_name)
+        except Exception as e:
+            logger.error(f"Не удалось удалить частично записанный документ {file_id}: {e}")
@@ -1,64 +1,109 @@
-import requests
+import asyncio
+import importlib.util
 import json
-from typing import List, Dict, Any
+import logging
+import httpx
+from typing import List, Dict, Any, Optional, AsyncIterator
 from config import Config
 
+logger = logging.getLogger(__name__)
+
+# Коды ответа, при которых запрос к OpenRouter имеет смысл повторить
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
 class LLMService:
-    def __init__(self):
+    def __init__(self, base_url: Optional[str] = None, transport: Optional[httpx.AsyncBaseTransport] = None):
         self.api_key = Config.OPENROUTER_API_KEY
-        self.base_url = "https://openrouter.ai/api/v1/chat/completions"
+        self.base_url = base_url or Config.OPENROUTER_BASE_URL
         self.model = "gpt-4o-mini"
+        self.max_retries = Config.LLM_MAX_RETRIES
+        self.retry_backoff = Config.LLM_RETRY_BACKOFF
+        self._transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+    
+    def _get_client(self) -> httpx.AsyncClient:
+        """Возвращает общий клиент с пулом keep-alive соединений (создается лениво)"""
+        if self._client is None or self._client.is_closed:
+            # HTTP/2 включаем только если установлен пакет h2
+            http2 = Config.LLM_HTTP2 and importlib.util.find_spec("h2") is not None
+            self._client = httpx.AsyncClient(
+                http2=http2,
+                limits=httpx.Limits(
+                    max_connections=Config.LLM_MAX_CONNECTIONS,
+                    max_keepalive_connections=Config.LLM_MAX_KEEPALIVE_CONNECTIONS,
+                    keepalive_expiry=Config.LLM_KEEPALIVE_EXPIRY
+                ),
+                timeout=httpx.Timeout(Config.LLM_TIMEOUT, connect=Config.LLM_CONNECT_TIMEOUT),
+                transport=self._transport
+            )
+            logger.info(f"Создан пул соединений к OpenRouter (http2={http2}, max_connections={Config.LLM_MAX_CONNECTIONS})")
+        return self._client
+    
+    async def aclose(self):
+        """Закрывает пул соединений"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+    
+    async def _post_with_retries(self, payload: Dict[str, Any], stream: bool = False) -> httpx.Response:
+        """Отправляет запрос к OpenRouter с повтором и экспоненциальной задержкой на 429/5xx.
+        
+        При stream=True тело ответа не читается — его нужно прочитать
+        через aiter_lines() и закрыть ответ вызовом aclose().
+        """
+        client = self._get_client()
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+        
+        for attempt in range(self.max_retries + 1):
+            try:
+                request = client.build_request("POST", self.base_url, headers=headers, json=payload)
+                response = await client.send(request, stream=stream)
+            except httpx.TransportError as e:
+                if attempt >= self.max_retries:
+                    raise Exception(f"Не удалось подключиться к OpenRouter: {str(e)}")
+                delay = self._retry_delay(attempt)
+                logger.warning(f"Ошибка соединения с OpenRouter ({e}), повтор через {delay:.1f}с")
+                await asyncio.sleep(delay)
+                continue
+            
+            if response.status_code in RETRYABLE_STATUS_CODES and attempt < self.max_retries:
+                await response.aclose()
+                delay = self._retry_delay(attempt, response.headers.get("Retry-After"))
+                logger.warning(f"OpenRouter вернул {response.status_code}, повтор через {delay:.1f}с")
+                await asyncio.sleep(delay)
+                continue
+            
+            return response
+    
+    def _retry_delay(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        """Вычисляет задержку перед повтором с учетом заголовка Retry-After"""
+        delay = self.retry_backoff * (2 ** attempt)
+        if retry_after:
+            try:
+                delay = max(delay, float(retry_after))
+            except ValueError:
+                pass
+        return min(delay, Config.LLM_MAX_RETRY_DELAY)
     
-    def generate_response(self, question: str, context_documents: List[Dict[str, Any]]) -> Dict[str, Any]:
+    async def generate_response(self, question: str, context_documents: List[Dict[str, Any]]) -> Dict[str, Any]:
         """Генерирует ответ на основе вопроса и контекстных документов"""
         try:
             # Проверяем наличие API ключа
             if not self.api_key or not self.api_key.strip():
                 raise Exception("OPENROUTER_API_KEY не установлен. Задайте ключ через эндпоинт /set-openrouter-key.")
             
-            # Формируем контекст из документов (ограничиваем размер)
-            context_text = self._format_context(context_documents)
-            
-            # Формируем промпт
-            prompt = f"""Используя следующие документы:
-
-{context_text}
-
-Ответь на вопрос: {question}
-
-Требования к ответу:
-- Отвечай кратко и по существу (не более 2-3 предложений)
-- Используй только информацию из предоставленных документов
-- Если в документах нет информации для ответа, так и скажи
-- Не добавляй лишних пояснений"""
-            
-            # Подготавливаем сообщения
-            messages = [
-                {
-                    "role": "system",
-                    "content": "Ты - полезный ассистент, который отвечает на вопросы на основе предоставленных документов. Отвечай кратко и по существу, используя только информацию из документов."
-                },
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ]
+            messages = self._build_messages(question, context_documents)
             
             # Отправляем запрос к OpenRouter
-            response = requests.post(
-                self.base_url,
-                headers={
-                    "Authorization": f"Bearer {self.api_key}",
-                    "Content-Type": "application/json"
-                },
-                json={
-                    "model": self.model,
-                    "messages": messages,
-                    "max_tokens": 500,  # Уменьшаем максимальное количество токенов
-                    "temperature": 0.3   # Уменьшаем креативность для более точных ответов
-                },
-                timeout=30
-            )
+            response = await self._post_with_retries({
+                "model": self.model,
+                "messages": messages,
+                "max_tokens": 500,  # Уменьшаем максимальное количество токенов
+                "temperature": 0.3   # Уменьшаем креативность для более точных ответов
+            })
             
             if response.status_code != 200:
                 raise Exception(f"Ошибка API OpenRouter: {response.status_code} - {response.text}")
@@ -69,26 +114,108 @@ class LLMService:
             if response_data.get("choices") and len(response_data["choices"]) > 0:
                 answer = response_data["choices"][0]["message"]["content"]
                 
-                # Получаем информацию о токенах
-                usage = response_data.get("usage", {})
-                prompt_tokens = usage.get("prompt_tokens", 0)
-                completion_tokens = usage.get("completion_tokens", 0)
-                total_tokens = usage.get("total_tokens", 0)
-                
                 return {
                     "answer": answer,
-                    "tokens": {
-                        "prompt_tokens": prompt_tokens,
-                        "completion_tokens": completion_tokens,
-                        "total_tokens": total_tokens
-                    }
+                    "tokens": self._extract_usage(response_data.get("usage"))
                 }
             else:
                 raise Exception("Не удалось получить ответ от модели")
-                
+        
         except Exception as e:
             raise Exception(f"Ошибка при генерации ответа: {str(e)}")
     
+    async def stream_response(self, question: str, context_documents: List[Dict[str, Any]]) -> AsyncIterator[Dict[str, Any]]:
+        """Генерирует ответ потоково.
+        
+        Отдает события {"type": "token", "content": ...} по мере поступления
+        токенов от OpenRouter и в конце {"type": "done", "answer": ..., "tokens": ...}.
+        """
+        if not self.api_key or not self.api_key.strip():
+            raise Exception("OPENROUTER_API_KEY не установлен. Задайте ключ через эндпоинт /set-openrouter-key.")
+        
+        response = await self._post_with_retries({
+            "model": self.model,
+            "messages": self._build_messages(question, context_documents),
+            "max_tokens": 500,
+            "temperature": 0.3,
+            "stream": True,
+            "stream_options": {"include_usage": True}
+        }, stream=True)
+        
+        try:
+            if response.status_code != 200:
+                body = (await response.aread()).decode("utf-8", errors="replace")
+                raise Exception(f"Ошибка API OpenRouter: {response.status_code} - {body}")
+            
+            answer_parts = []
+            usage = None
+            async for line in response.aiter_lines():
+                # OpenRouter присылает строки "data: {...}" и служебные комментарии ": ..."
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                
+                chunk = json.loads(data)
+                if chunk.get("error"):
+                    raise Exception(f"Ошибка API OpenRouter: {chunk['error']}")
+                if chunk.get("usage"):
+                    usage = chunk["usage"]
+                
+                for choice in chunk.get("choices") or []:
+                    content = (choice.get("delta") or {}).get("content")
+                    if content:
+                        answer_parts.append(content)
+                        yield {"type": "token", "content": content}
+            
+            yield {
+                "type": "done",
+                "answer": "".join(answer_parts),
+                "tokens": self._extract_usage(usage)
+            }
+        finally:
+            await response.aclose()
+    
+    def _build_messages(self, question: str, context_documents: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+        """Формирует сообщения для модели из вопроса и контекста"""
+        # Формируем контекст из документов (ограничиваем размер)
+        context_text = self._format_context(context_documents)
+        
+        # Формируем промпт
+        prompt = f"""Используя следующие документы:
+
+{context_text}
+
+Ответь на вопрос: {question}
+
+Требования к ответу:
+- Отвечай кратко и по существу (не более 2-3 предложений)
+- Используй только информацию из предоставленных документов
+- Если в документах нет информации для ответа, так и скажи
+- Не добавляй лишних пояснений"""
+        
+        return [
+            {
+                "role": "system",
+                "content": "Ты - полезный ассистент, который отвечает на вопросы на основе предоставленных документов. Отвечай кратко и по существу, используя только информацию из документов."
+            },
+            {
+                "role": "user",
+                "content": prompt
+            }
+        ]
+    
+    @staticmethod
+    def _extract_usage(usage: Optional[Dict[str, Any]]) -> Dict[str, int]:
+        """Приводит информацию о токенах к формату ответа API"""
+        usage = usage or {}
+        return {
+            "prompt_tokens": usage.get("prompt_tokens", 0),
+            "completion_tokens": usage.get("completion_tokens", 0),
+            "total_tokens": usage.get("total_tokens", 0)
+        }
+    
     def _format_context(self, documents: List[Dict[str, Any]]) -> str:
         """Форматирует контекстные документы для промпта (с ограничением размера)"""
         if not documents:
@@ -111,8 +238,8 @@ class LLMService:
             current_part = f"Документ {i} ({filename}):\n{content}\n"
             if total_length + len(current_part) > max_context_length:
                 break
-                
+            
             context_parts.append(current_part)
             total_length += len(current_part)
         
-        return "\n".join(context_parts) 
\ No newline at end of file
+        return "\n".join(context_parts)
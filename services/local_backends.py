@@ -0,0 +1,218 @@
+import logging
+import os
+import re
+from typing import List, Optional
+
+import numpy as np
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Фиксированный набор текстов для проверки совместимости векторов бэкендов
+COMPATIBILITY_PROBES = [
+    "Как приготовить борщ?",
+    "Сколько варить мясо до готовности",
+    "Требования к оформлению договора поставки",
+    "What is retrieval-augmented generation?",
+    "Срок действия доверенности составляет один год.",
+    "Налоговая ставка и порядок расчета НДС",
+]
+
+class TorchBackend:
+    """Исходный бэкенд: SentenceTransformer на PyTorch в fp32"""
+    
+    name = "torch"
+    
+    def __init__(self, model_name: str, model=None):
+        from sentence_transformers import SentenceTransformer
+        self.model_name = model_name
+        self.model = model if model is not None else SentenceTransformer(model_name)
+    
+    @property
+    def tokenizer(self):
+        return self.model.tokenizer
+    
+    def encode(self, texts: List[str]) -> np.ndarray:
+        return self.model.encode(texts, convert_to_numpy=True)
+
+class QuantizedTorchBackend(TorchBackend):
+    """SentenceTransformer с динамической int8-квантизацией линейных слоев (только CPU)"""
+    
+    name = "int8"
+    
+    def __init__(self, model_name: str):
+        import torch
+        super().__init__(model_name)
+        self.reference_model = self.model
+        self.model = torch.quantization.quantize_dynamic(
+            self.model.to("cpu"), {torch.nn.Linear}, dtype=torch.qint8, inplace=False
+        )
+
+class OnnxBackend:
+    """Трансформер модели, экспортированный в ONNX и исполняемый через ONNX Runtime.
+
+    Токенизация, пулинг и нормализация повторяют модули SentenceTransformer,
+    поэтому векторы совместимы с уже сохраненными коллекциями.
+    """
+    
+    name = "onnx"
+    
+    def __init__(self, model_name: str, batch_size: int = 32):
+        import onnxruntime as ort
+        from sentence_transformers import SentenceTransformer
+        
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.reference_model = SentenceTransformer(model_name, device="cpu")
+        
+        transformer = self.reference_model[0]
+        self.tokenizer = transformer.tokenizer
+        self.max_seq_length = transformer.max_seq_length
+        self.pooling_mode = self._detect_pooling(self.reference_model)
+        self.normalize = any(type(module).__name__ == "Normalize" for module in self.reference_model)
+        
+        model_path = self._export(transformer.auto_model)
+        options = ort.SessionOptions()
+        if Config.ONNX_INTRA_OP_THREADS:
+            options.intra_op_num_threads = Config.ONNX_INTRA_OP_THREADS
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = [model_input.name for model_input in self.session.get_inputs()]
+    
+    @staticmethod
+    def _detect_pooling(model) -> str:
+        pooling = model[1] if len(model) > 1 else None
+        if pooling is None or getattr(pooling, "pooling_mode_mean_tokens", False):
+            return "mean"
+        if getattr(pooling, "pooling_mode_cls_token", False):
+            return "cls"
+        if getattr(pooling, "pooling_mode_max_tokens", False):
+            return "max"
+        raise ValueError("Неподдерживаемый режим пулинга модели для ONNX-бэкенда")
+    
+    def _export(self, auto_model) -> str:
+        """Экспортирует трансформер в ONNX (один раз, результат кэшируется на диске)"""
+        import torch
+        
+        model_dir = os.path.join(Config.ONNX_CACHE_DIR, re.sub(r"[^\w.-]+", "_", self.model_name))
+        model_path = os.path.join(model_dir, "model.onnx")
+        if os.path.exists(model_path):
+            return model_path
+        
+        os.makedirs(model_dir, exist_ok=True)
+        logger.info(f"Экспорт модели {self.model_name} в ONNX: {model_path}")
+        
+        sample = self.tokenizer(["пример текста"], return_tensors="pt")
+        input_names = list(sample.keys())
+        
+        class Wrapper(torch.nn.Module):
+            def __init__(self, model):
+                super().__init__()
+                self.model = model
+            
+            def forward(self, *inputs):
+                return self.model(**dict(zip(input_names, inputs)))[0]
+        
+        dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+        dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+        export_kwargs = dict(
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=14
+        )
+        wrapper = Wrapper(auto_model.to("cpu").eval())
+        args = tuple(sample[name] for name in input_names)
+        with torch.no_grad():
+            try:
+                torch.onnx.export(wrapper, args, model_path, dynamo=False, **export_kwargs)
+            except TypeError:
+                # Старые версии torch не знают параметра dynamo
+                torch.onnx.export(wrapper, args, model_path, **export_kwargs)
+        return model_path
+    
+    def encode(self, texts: List[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        
+        # Сортируем по длине, чтобы минимизировать паддинг внутри батча
+        order = np.argsort([-len(text) for text in texts], kind="stable")
+        vectors: List[Optional[np.ndarray]] = [None] * len(texts)
+        
+        for start in range(0, len(texts), self.batch_size):
+            indices = order[start:start + self.batch_size]
+            encoded = self.tokenizer(
+                [texts[i] for i in indices],
+                padding=True,
+                truncation=True,
+                max_length=self.max_seq_length,
+                return_tensors="np"
+            )
+            feed = {name: encoded[name].astype(np.int64) for name in self.input_names}
+            token_embeddings = self.session.run(None, feed)[0]
+            pooled = self._pool(token_embeddings, encoded["attention_mask"])
+            for index, vector in zip(indices, pooled):
+                vectors[index] = vector
+        
+        result = np.stack(vectors)
+        if self.normalize:
+            result = result / np.clip(np.linalg.norm(result, axis=1, keepdims=True), 1e-12, None)
+        return result
+    
+    def _pool(self, token_embeddings: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+        if self.pooling_mode == "cls":
+            return token_embeddings[:, 0]
+        mask = attention_mask[..., None].astype(np.float32)
+        if self.pooling_mode == "max":
+            return np.where(mask > 0, token_embeddings, -1e9).max(axis=1)
+        return (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+BACKENDS = {
+    TorchBackend.name: TorchBackend,
+    QuantizedTorchBackend.name: QuantizedTorchBackend,
+    OnnxBackend.name: OnnxBackend,
+}
+
+def min_cosine_similarity(reference: np.ndarray, candidate: np.ndarray) -> float:
+    """Минимальное косинусное сходство между соответствующими векторами"""
+    reference = reference / np.clip(np.linalg.norm(reference, axis=1, keepdims=True), 1e-12, None)
+    candidate = candidate / np.clip(np.linalg.norm(candidate, axis=1, keepdims=True), 1e-12, None)
+    return float((reference * candidate).sum(axis=1).min())
+
+def check_compatibility(backend, reference_model, texts: List[str] = None) -> float:
+    """Сравнивает векторы бэкенда с эталонной fp32-моделью на контрольных текстах"""
+    texts = texts or COMPATIBILITY_PROBES
+    reference = reference_model.encode(texts, convert_to_numpy=True)
+    return min_cosine_similarity(reference, backend.encode(texts))
+
+def load_backend(backend_name: str, model_name: str):
+    """Загружает бэкенд инференса локальной модели.
+
+    Для ускоренных бэкендов векторы сверяются с fp32-моделью: если минимальное
+    косинусное сходство ниже LOCAL_BACKEND_MIN_COSINE, векторы несовместимы
+    с сохраненными коллекциями и используется исходный torch-бэкенд.
+    """
+    if backend_name not in BACKENDS:
+        raise ValueError(f"Неизвестный бэкенд локальной модели: {backend_name}. Доступные бэкенды: {list(BACKENDS)}")
+    
+    backend = BACKENDS[backend_name](model_name)
+    if backend_name == TorchBackend.name:
+        return backend
+    
+    # Эталонная fp32-модель нужна бэкенду только для проверки: забираем ее, чтобы
+    # после проверки (или без нее) вторая копия модели не оставалась в памяти
+    reference_model = backend.reference_model
+    del backend.reference_model
+    if not Config.LOCAL_BACKEND_VERIFY:
+        return backend
+    
+    similarity = check_compatibility(backend, reference_model)
+    if similarity < Config.LOCAL_BACKEND_MIN_COSINE:
+        logger.error(
+            f"Бэкенд {backend_name} несовместим с fp32-моделью (cos={similarity:.4f} < "
+            f"{Config.LOCAL_BACKEND_MIN_COSINE}), используется torch"
+        )
+        return TorchBackend(model_name, model=reference_model)
+    
+    logger.info(f"Бэкенд {backend_name} совместим с fp32-моделью (минимальный cos={similarity:.4f})")
+    return backend
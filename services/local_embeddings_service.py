@@ -1,10 +1,13 @@
-import chromadb
-from chromadb.config import Settings
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple
 import uuid
-import numpy as np
-from sentence_transformers import SentenceTransformer
 import logging
+from config import Config
+from services.vector_store import get_vector_store
+from services.embedding_cache import get_query_embedding_cache
+from services.chunk_embedding_store import get_chunk_embedding_store
+from services.micro_batcher import MicroBatcher
+from services.local_backends import TorchBackend, load_backend
+from utils.chunking import Chunk
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO)
@@ -13,34 +16,44 @@ logger = logging.getLogger(__name__)
 class LocalEmbeddingsService:
     """Сервис для генерации эмбедингов с помощью локальной модели"""
     
-    def __init__(self, model_name: str = "ai-forever/sbert_large_nlu_ru"):
+    def __init__(self, model_name: str = "ai-forever/sbert_large_nlu_ru", backend: str = None):
         self.model_name = model_name
+        self.tokenizer = f"hf:{model_name}"
+        self.backend_name = backend or Config.LOCAL_EMBEDDING_BACKEND
         self.model = None
-        self.chroma_client = chromadb.PersistentClient(
-            path="./chroma_db",
-            settings=Settings(anonymized_telemetry=False)
-        )
-        self.default_collection = self.chroma_client.get_or_create_collection(
-            name="documents",
-            metadata={"hnsw:space": "cosine"}
-        )
+        self.micro_batcher = None
+        self.vector_store = get_vector_store()
+        self.default_collection = self.vector_store.get_collection("documents")
+        self.query_cache = get_query_embedding_cache()
+        self.chunk_store = get_chunk_embedding_store()
         
         # Инициализируем модель при создании сервиса
         self._load_model()
+        
+        # Одновременные короткие запросы (поисковые вопросы) объединяются в общий батч
+        if Config.MICRO_BATCH_ENABLED:
+            self.micro_batcher = MicroBatcher(
+                self._encode,
+                max_batch_size=Config.MICRO_BATCH_MAX_SIZE,
+                max_wait_ms=Config.MICRO_BATCH_MAX_WAIT_MS,
+                bucket_boundaries=Config.MICRO_BATCH_BUCKETS
+            )
     
     def get_collection(self, collection_name: str):
-        """Получает или создает коллекцию по имени"""
-        return self.chroma_client.get_or_create_collection(
-            name=collection_name,
-            metadata={"hnsw:space": "cosine"}
-        )
+        """Получает или создает коллекцию по имени (дескриптор кэшируется в VectorStore)"""
+        return self.vector_store.get_collection(collection_name)
     
     def _load_model(self):
         """Загружает модель для генерации эмбедингов"""
         try:
-            logger.info(f"Загрузка модели {self.model_name}...")
-            self.model = SentenceTransformer(self.model_name)
-            logger.info(f"Модель {self.model_name} успешно загружена")
+            logger.info(f"Загрузка модели {self.model_name} (бэкенд {self.backend_name})...")
+            self.model = load_backend(self.backend_name, self.model_name)
+            # Векторы бэкендов немного различаются, поэтому кэши эмбедингов разделены по бэкенду
+            # (для исходного torch ключ — имя модели, как до появления бэкендов)
+            self.cache_model = (
+                self.model_name if self.model.name == TorchBackend.name else f"{self.model_name}@{self.model.name}"
+            )
+            logger.info(f"Модель {self.model_name} успешно загружена (бэкенд {self.model.name})")
         except Exception as e:
             logger.error(f"Ошибка загрузки модели {self.model_name}: {e}")
             raise Exception(f"Не удалось загрузить модель {self.model_name}: {str(e)}")
@@ -51,57 +64,100 @@ class LocalEmbeddingsService:
             if not self.model:
                 raise Exception("Модель не загружена")
             
-            # Генерируем эмбединги
-            embeddings = self.model.encode(texts, convert_to_numpy=True)
+            # Большие списки (чанки документа) уже являются батчем — кодируем напрямую
+            if self.micro_batcher is None or len(texts) >= Config.MICRO_BATCH_MAX_SIZE:
+                return self._encode(texts)
             
-            # Преобразуем в список списков float
-            return embeddings.tolist()
+            return self.micro_batcher.encode(texts)
             
         except Exception as e:
             raise Exception(f"Ошибка при получении эмбедингов: {str(e)}")
     
+    def _encode(self, texts: List[str]) -> List[List[float]]:
+        """Выполняет один батчевый проход модели"""
+        # Генерируем эмбединги и преобразуем в список списков float
+        return self.model.encode(texts).tolist()
+    
     def store_document(self, file_id: str, chunks: List[str], metadata: Dict[str, Any], collection_name: str = "documents"):
         """Сохраняет документ и его эмбединги в ChromaDB"""
+        self.store_documents([(file_id, chunks, metadata)], collection_name)
+    
+    def store_documents(self, documents: List[Tuple[str, List[str], Dict[str, Any]]], collection_name: str = "documents"):
+        """Сохраняет несколько документов (file_id, чанки, метаданные) одним проходом модели
+        и крупными порциями записи в ChromaDB
+        """
         try:
-            # Получаем эмбединги для всех чанков
-            embeddings = self.get_embeddings(chunks)
+            all_chunks = [chunk for _, chunks, _ in documents for chunk in chunks]
+            
+            # Получаем эмбединги для всех чанков (уже известные чанки берутся из хранилища)
+            embeddings = self.embed_chunks(all_chunks)
             
             # Подготавливаем метаданные для каждого чанка
             metadatas = []
             ids = []
             
-            for i, chunk in enumerate(chunks):
-                chunk_metadata = metadata.copy()
-                chunk_metadata.update({
-                    "chunk_index": i,
-                    "chunk_size": len(chunk),
-                    "embedding_model": self.model_name,
-                    "embedding_type": "local"
-                })
-                metadatas.append(chunk_metadata)
-                ids.append(f"{file_id}_chunk_{i}")
-            
-            # Получаем нужную коллекцию
-            collection = self.get_collection(collection_name)
+            for file_id, chunks, metadata in documents:
+                chunk_ids, chunk_metadatas = self.chunk_records(file_id, chunks, metadata)
+                ids.extend(chunk_ids)
+                metadatas.extend(chunk_metadatas)
             
             # Добавляем в ChromaDB
-            collection.add(
-                embeddings=embeddings,  # type: ignore
-                documents=chunks,
-                metadatas=metadatas,
-                ids=ids
+            self.vector_store.add(
+                collection_name,
+                ids=ids,
+                embeddings=embeddings,
+                documents=all_chunks,
+                metadatas=metadatas
             )
             
-            logger.info(f"Документ {file_id} сохранен с {len(chunks)} чанками в коллекции {collection_name}")
+            logger.info(f"Сохранено документов: {len(documents)}, чанков: {len(all_chunks)} в коллекции {collection_name}")
             
         except Exception as e:
             raise Exception(f"Ошибка при сохранении документа: {str(e)}")
     
+    def embed_chunks(self, chunks: List[str]) -> List[List[float]]:
+        """Эмбединги чанков документа (уже известные чанки берутся из хранилища)"""
+        return self.chunk_store.get_or_embed(chunks, self.cache_model, self.get_embeddings)
+    
+    def chunk_records(
+        self,
+        file_id: str,
+        chunks: List[str],
+        metadata: Dict[str, Any] = None,
+        start_index: int = 0
+    ) -> Tuple[List[str], List[Dict[str, Any]]]:
+        """ID и метаданные записей ChromaDB для чанков документа, начиная с чанка start_index"""
+        # ChromaDB принимает только простые значения метаданных
+        document_metadata = {
+            key: value for key, value in (metadata or {}).items()
+            if isinstance(value, (str, int, float, bool))
+        }
+        ids = []
+        metadatas = []
+        for i, chunk in enumerate(chunks, start_index):
+            chunk_metadata = document_metadata.copy()
+            chunk_metadata.update({
+                "file_id": file_id,
+                "chunk_index": i,
+                "chunk_size": len(chunk),
+                "embedding_model": self.model_name,
+                "embedding_type": "local"
+            })
+            if isinstance(chunk, Chunk):
+                chunk_metadata.update(chunk.location())
+            metadatas.append(chunk_metadata)
+            ids.append(f"{file_id}_chunk_{i}")
+        return ids, metadatas
+    
     def search_similar(self, query: str, top_k: int = 5, collection_name: str = "documents") -> List[Dict[str, Any]]:
         """Ищет похожие документы по запросу"""
         try:
-            # Получаем эмбединг для запроса
-            query_embedding = self.get_embeddings([query])[0]
+            # Получаем эмбединг для запроса (повторные запросы берутся из кэша)
+            query_embedding = self.query_cache.get_or_compute(
+                query,
+                self.cache_model,
+                lambda text: self.get_embeddings([text])[0]
+            )
             
             # Получаем нужную коллекцию
             collection = self.get_collection(collection_name)
@@ -150,11 +206,7 @@ class LocalEmbeddingsService:
     def clear_all(self, collection_name: str = "documents"):
         """Очищает все данные из ChromaDB"""
         try:
-            self.chroma_client.delete_collection(name=collection_name)
-            self.chroma_client.create_collection(
-                name=collection_name,
-                metadata={"hnsw:space": "cosine"}
-            )
+            self.vector_store.reset_collection(collection_name)
             logger.info(f"Коллекция {collection_name} очищена")
         except Exception as e:
             raise Exception(f"Ошибка при очистке ChromaDB: {str(e)}")
@@ -164,5 +216,7 @@ class LocalEmbeddingsService:
         return {
             "model_name": self.model_name,
             "model_loaded": self.model is not None,
-            "embedding_type": "local"
+            "backend": self.model.name if self.model else self.backend_name,
+            "embedding_type": "local",
+            "micro_batching": self.micro_batcher.stats() if self.micro_batcher else None
         } 
\ No newline at end of file
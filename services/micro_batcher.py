@@ -0,0 +1,124 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+class MicroBatcher:
+    """Динамический микро-батчинг инференса локальной модели.
+
+    Одновременные запросы копятся несколько миллисекунд (или до max_batch_size
+    текстов), затем выполняется один батчевый encode и результаты раздаются
+    вызывающим. Тексты группируются по длине, чтобы короткие запросы
+    не дополнялись паддингом до длины длинных.
+    """
+    
+    def __init__(
+        self,
+        encode: Callable[[List[str]], Sequence[Sequence[float]]],
+        max_batch_size: int = 32,
+        max_wait_ms: float = 5,
+        bucket_boundaries: Sequence[int] = (128, 512)
+    ):
+        self._encode = encode
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self.bucket_boundaries = sorted(bucket_boundaries)
+        self._queue: "queue.Queue[Tuple[List[str], Future]]" = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._requests = 0
+        self._texts = 0
+        self._closed = False
+        self._thread = threading.Thread(target=self._worker, name="micro-batcher", daemon=True)
+        self._thread.start()
+    
+    def submit(self, texts: List[str]) -> Future:
+        """Ставит тексты в очередь; Future вернет список векторов"""
+        if self._closed:
+            raise RuntimeError("MicroBatcher остановлен")
+        future: Future = Future()
+        self._queue.put((list(texts), future))
+        return future
+    
+    def encode(self, texts: List[str]) -> List[List[float]]:
+        """Синхронно получает эмбединги через общий батч"""
+        return self.submit(texts).result()
+    
+    def close(self):
+        self._closed = True
+        self._queue.put(None)
+    
+    def _worker(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            
+            pending = [item]
+            total = len(item[0])
+            deadline = time.monotonic() + self.max_wait
+            
+            # Собираем запросы до заполнения батча или истечения окна ожидания
+            while total < self.max_batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._process(pending)
+                    return
+                pending.append(item)
+                total += len(item[0])
+            
+            self._process(pending)
+    
+    def _bucket(self, text: str) -> int:
+        for index, boundary in enumerate(self.bucket_boundaries):
+            if len(text) <= boundary:
+                return index
+        return len(self.bucket_boundaries)
+    
+    def _process(self, pending: List[Tuple[List[str], Future]]):
+        # Раскладываем тексты всех запросов по корзинам длины
+        buckets: Dict[int, List[Tuple[int, int, str]]] = {}
+        for request_index, (texts, _) in enumerate(pending):
+            for position, text in enumerate(texts):
+                buckets.setdefault(self._bucket(text), []).append((request_index, position, text))
+        
+        results: List[List[Any]] = [[None] * len(texts) for texts, _ in pending]
+        try:
+            for bucket in buckets.values():
+                for start in range(0, len(bucket), self.max_batch_size):
+                    batch = bucket[start:start + self.max_batch_size]
+                    vectors = self._encode([text for _, _, text in batch])
+                    for (request_index, position, _), vector in zip(batch, vectors):
+                        results[request_index][position] = list(vector)
+        except Exception as e:
+            for _, future in pending:
+                future.set_exception(e)
+            return
+        
+        for (_, future), result in zip(pending, results):
+            future.set_result(result)
+        
+        with self._stats_lock:
+            self._batches += 1
+            self._requests += len(pending)
+            self._texts += sum(len(texts) for texts, _ in pending)
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            return {
+                "batches": self._batches,
+                "requests": self._requests,
+                "texts": self._texts,
+                "avg_requests_per_batch": round(self._requests / self._batches, 2) if self._batches else 0.0,
+                "queue_size": self._queue.qsize()
+            }
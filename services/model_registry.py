@@ -0,0 +1,101 @@
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+class ModelRegistry:
+    """Реестр сервисов эмбедингов.
+
+    Сервисы создаются лениво в фоновом потоке и кэшируются по типу эмбедингов,
+    поэтому загрузка модели не блокирует event loop и не повторяется при
+    обратном переключении. Активный тип меняется атомарно только после
+    готовности нового сервиса: запросы, уже получившие ссылку на старый
+    сервис, дорабатывают на нем.
+    """
+
+    def __init__(self, factory: Callable[[str], Any], active_type: str):
+        self._factory = factory
+        self._active_type = active_type.lower()
+        self._services: Dict[str, Any] = {}
+        self._loading: Dict[str, Future] = {}
+        self._errors: Dict[str, str] = {}
+        self._load_times: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        # Один поток: модели загружаются по очереди, без одновременного пика памяти
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="model-loader")
+
+    @property
+    def active_type(self) -> str:
+        return self._active_type
+
+    def load(self, embedding_type: Optional[str] = None) -> Future:
+        """Запускает загрузку сервиса в фоне (если он еще не загружен) и возвращает Future"""
+        embedding_type = (embedding_type or self._active_type).lower()
+        with self._lock:
+            service = self._services.get(embedding_type)
+            if service is not None:
+                future: Future = Future()
+                future.set_result(service)
+                return future
+
+            future = self._loading.get(embedding_type)
+            if future is None:
+                self._errors.pop(embedding_type, None)
+                future = self._executor.submit(self._load, embedding_type)
+                self._loading[embedding_type] = future
+            return future
+
+    def _load(self, embedding_type: str):
+        logger.info(f"Загрузка сервиса эмбедингов {embedding_type}...")
+        started = time.monotonic()
+        try:
+            service = self._factory(embedding_type)
+        except Exception as e:
+            logger.error(f"Ошибка загрузки сервиса эмбедингов {embedding_type}: {e}")
+            with self._lock:
+                self._loading.pop(embedding_type, None)
+                self._errors[embedding_type] = str(e)
+            raise
+
+        elapsed = time.monotonic() - started
+        with self._lock:
+            self._services[embedding_type] = service
+            self._loading.pop(embedding_type, None)
+            self._load_times[embedding_type] = round(elapsed, 3)
+        logger.info(f"Сервис эмбедингов {embedding_type} загружен за {elapsed:.2f}с")
+        return service
+
+    async def get(self, embedding_type: Optional[str] = None):
+        """Возвращает сервис (по умолчанию активный), дожидаясь окончания его загрузки"""
+        return await asyncio.wrap_future(self.load(embedding_type or self._active_type))
+
+    async def activate(self, embedding_type: str):
+        """Загружает сервис и делает его активным; до готовности работает прежний"""
+        embedding_type = embedding_type.lower()
+        service = await self.get(embedding_type)
+        with self._lock:
+            previous, self._active_type = self._active_type, embedding_type
+        if previous != embedding_type:
+            logger.info(f"Активный тип эмбедингов переключен: {previous} -> {embedding_type}")
+        return service
+
+    def status(self) -> Dict[str, Dict[str, Any]]:
+        """Состояние известных реестру сервисов"""
+        with self._lock:
+            result: Dict[str, Dict[str, Any]] = {}
+            for embedding_type in self._services:
+                result[embedding_type] = {"state": "ready", "load_time": self._load_times.get(embedding_type)}
+            for embedding_type in self._loading:
+                result[embedding_type] = {"state": "loading"}
+            for embedding_type, error in self._errors.items():
+                result.setdefault(embedding_type, {"state": "error", "error": error})
+            for embedding_type, info in result.items():
+                info["active"] = embedding_type == self._active_type
+            return result
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
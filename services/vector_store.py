@@ -0,0 +1,141 @@
+import threading
+import logging
+import chromadb
+from chromadb.config import Settings
+from typing import Any, Dict, List, Optional
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+class VectorStore:
+    """Единая точка доступа к ChromaDB: один клиент на процесс и кэш дескрипторов коллекций"""
+    
+    COLLECTION_METADATA = {"hnsw:space": "cosine"}
+    
+    def __init__(self, path: str):
+        self.path = path
+        self.client = chromadb.PersistentClient(
+            path=path,
+            settings=Settings(anonymized_telemetry=False)
+        )
+        self._collections: Dict[str, chromadb.Collection] = {}
+        self._lock = threading.RLock()
+    
+    def get_collection(self, name: str):
+        """Возвращает коллекцию из кэша, при первом обращении получает или создает ее"""
+        collection = self._collections.get(name)
+        if collection is not None:
+            return collection
+        
+        with self._lock:
+            collection = self._collections.get(name)
+            if collection is None:
+                try:
+                    # get_or_create_collection перезаписывает метаданные существующей коллекции,
+                    # поэтому сначала открываем ее как есть (сохраняются настройки коллекции)
+                    collection = self.client.get_collection(name=name)
+                except ValueError:
+                    collection = self.client.get_or_create_collection(
+                        name=name,
+                        metadata=self.COLLECTION_METADATA
+                    )
+                self._collections[name] = collection
+            return collection
+    
+    def get_collection_metadata(self, name: str) -> Dict[str, Any]:
+        return dict(self.get_collection(name).metadata or {})
+    
+    def update_collection_metadata(self, name: str, values: Dict[str, Any]):
+        """Дополняет метаданные коллекции (настройки коллекции хранятся в ChromaDB вместе с ней)"""
+        with self._lock:
+            collection = self.get_collection(name)
+            collection.modify(metadata={**(collection.metadata or {}), **values})
+    
+    def create_collection(self, name: str):
+        """Создает коллекцию (если ее нет) и обновляет кэш"""
+        with self._lock:
+            self._collections.pop(name, None)
+            return self.get_collection(name)
+    
+    def delete_collection(self, name: str):
+        """Удаляет коллекцию и ее дескриптор из кэша"""
+        with self._lock:
+            self._collections.pop(name, None)
+            self.client.delete_collection(name=name)
+    
+    def reset_collection(self, name: str):
+        """Удаляет все данные коллекции, пересоздавая ее с прежними настройками"""
+        with self._lock:
+            self._collections.pop(name, None)
+            metadata = self.COLLECTION_METADATA
+            if name in self.list_collections():
+                metadata = self.client.get_collection(name=name).metadata or metadata
+                self.client.delete_collection(name=name)
+            collection = self.client.get_or_create_collection(name=name, metadata=metadata)
+            self._collections[name] = collection
+            return collection
+    
+    def add(self, name: str, ids: List[str], embeddings: List[List[float]], documents: List[str], metadatas: List[Dict[str, Any]]):
+        """Добавляет записи в коллекцию порциями не больше CHROMA_WRITE_BATCH_SIZE"""
+        collection = self.get_collection(name)
+        batch_size = min(Config.CHROMA_WRITE_BATCH_SIZE, getattr(self.client, "max_batch_size", Config.CHROMA_WRITE_BATCH_SIZE))
+        for start in range(0, len(ids), batch_size):
+            end = start + batch_size
+            collection.add(
+                ids=ids[start:end],
+                embeddings=embeddings[start:end],
+                documents=documents[start:end],
+                metadatas=metadatas[start:end]
+            )
+    
+    def upsert(self, name: str, ids: List[str], embeddings: List[List[float]], documents: List[str], metadatas: List[Dict[str, Any]]):
+        """Добавляет или перезаписывает записи коллекции порциями (метаданные существующих записей дополняются)"""
+        collection = self.get_collection(name)
+        batch_size = min(Config.CHROMA_WRITE_BATCH_SIZE, getattr(self.client, "max_batch_size", Config.CHROMA_WRITE_BATCH_SIZE))
+        for start in range(0, len(ids), batch_size):
+            end = start + batch_size
+            collection.upsert(
+                ids=ids[start:end],
+                embeddings=embeddings[start:end],
+                documents=documents[start:end],
+                metadatas=metadatas[start:end]
+            )
+    
+    def delete(self, name: str, ids: List[str]):
+        """Удаляет записи коллекции по ID порциями"""
+        collection = self.get_collection(name)
+        batch_size = min(Config.CHROMA_WRITE_BATCH_SIZE, getattr(self.client, "max_batch_size", Config.CHROMA_WRITE_BATCH_SIZE))
+        for start in range(0, len(ids), batch_size):
+            collection.delete(ids=ids[start:start + batch_size])
+    
+    def update_metadatas(self, name: str, ids: List[str], metadatas: List[Dict[str, Any]]):
+        """Дополняет метаданные записей коллекции (поля сливаются с существующими) порциями"""
+        collection = self.get_collection(name)
+        batch_size = min(Config.CHROMA_WRITE_BATCH_SIZE, getattr(self.client, "max_batch_size", Config.CHROMA_WRITE_BATCH_SIZE))
+        for start in range(0, len(ids), batch_size):
+            end = start + batch_size
+            collection.update(ids=ids[start:end], metadatas=metadatas[start:end])
+    
+    def list_collections(self) -> List[str]:
+        return [col.name for col in self.client.list_collections()]
+    
+    def invalidate(self, name: Optional[str] = None):
+        """Сбрасывает кэш дескрипторов (одной коллекции или всех)"""
+        with self._lock:
+            if name is None:
+                self._collections.clear()
+            else:
+                self._collections.pop(name, None)
+
+_vector_store: Optional[VectorStore] = None
+_vector_store_lock = threading.Lock()
+
+def get_vector_store() -> VectorStore:
+    """Возвращает общий для процесса VectorStore"""
+    global _vector_store
+    if _vector_store is None:
+        with _vector_store_lock:
+            if _vector_store is None:
+                logger.info(f"Подключение к ChromaDB: {Config.CHROMA_DB_PATH}")
+                _vector_store = VectorStore(Config.CHROMA_DB_PATH)
+    return _vector_store
@@ -38,28 +38,28 @@ def test_ai_converter():
     print("2️⃣ Тест конфигурации:")
     print(f"   🔑 API ключ: {'✅ Установлен' if converter.api_key else '❌ Не установлен'}")
     print(f"   🤖 Модель: {converter.model}")
-    print(f"   📁 Poppler путь: {converter.poppler_path or 'По умолчанию'}")
+    print(f"   🖼 Рендеринг: до {converter.max_image_side} px, до {converter.max_dpi} dpi")
     
     print()
     
-    # Тест 3: Проверка кодирования изображений
-    print("3️⃣ Тест кодирования изображений:")
+    # Тест 3: Проверка рендеринга страниц в JPEG
+    print("3️⃣ Тест рендеринга страниц:")
     try:
-        from PIL import Image
-        import io
+        import fitz
         
-        # Создаем тестовое изображение
-        test_image = Image.new('RGB', (100, 100), color='white')
+        # Создаем тестовый документ из одной пустой страницы
+        doc = fitz.open()
+        doc.new_page()
         
-        # Кодируем в base64
-        b64_data = converter.encode_image_to_base64(test_image)
+        page_number, image, error = next(converter.render_pages(doc, [1]))
         
-        print(f"   ✅ Изображение закодировано успешно")
-        print(f"   📊 Размер base64: {len(b64_data)} символов")
-        print(f"   🔍 Начинается с: {b64_data[:20]}...")
+        print(f"   ✅ Страница {page_number} отрендерена успешно")
+        print(f"   📊 Размер JPEG: {len(image)} байт")
+        print(f"   🔍 Начинается с: {image[:3]!r}...")
+        assert error is None and image.startswith(b"\xff\xd8")
         
     except Exception as e:
-        print(f"   ❌ Ошибка при кодировании: {e}")
+        print(f"   ❌ Ошибка при рендеринге: {e}")
     
     print()
     
@@ -67,8 +67,7 @@ def test_ai_converter():
     print("4️⃣ Тест зависимостей:")
     
     dependencies = [
-        ("PyPDF2", "PyPDF2"),
-        ("pdf2image", "pdf2image"),
+        ("PyMuPDF", "fitz"),
         ("PIL", "PIL"),
         ("requests", "requests")
     ]
@@ -84,13 +83,148 @@ def test_ai_converter():
     print("✅ Тестирование ИИ-конвертации завершено!")
     print()
     print("💡 Для полного тестирования:")
-    print("   1. Установите зависимости: pip install PyPDF2 pdf2image Pillow requests")
+    print("   1. Установите зависимости: pip install PyMuPDF Pillow requests")
     print("   2. Создайте тестовый PDF файл")
     print("   3. Убедитесь, что OPENROUTER_API_KEY установлен в .env")
 
+def test_parallel_ocr():
+    """Тестирует параллельное распознавание страниц, порядок и повторы"""
+    print("🤖 Тестирование параллельной ИИ-конвертации")
+    print("=" * 50)
+    
+    import tempfile
+    import threading
+    import time
+    import fitz
+    
+    # PDF из 8 страниц: вторая с текстом, седьмая с текстом поверх скана,
+    # восьмая пустая, остальные — изображения без текста (сканы)
+    pdf_path = os.path.join(tempfile.mkdtemp(), "scanned.pdf")
+    scan = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 64, 64), False)
+    scan.clear_with(200)
+    doc = fitz.open()
+    for page_number in range(1, 9):
+        page = doc.new_page()
+        if page_number in (2, 7):
+            page.insert_text((72, 72), f"Text layer of page {page_number} long enough")
+        if page_number not in (2, 8):
+            page.insert_image(page.rect, pixmap=scan)
+    doc.save(pdf_path)
+    doc.close()
+    
+    converter = AIPDFConverter(api_key="test", concurrency=4)
+    active = []
+    peak = [0]
+    lock = threading.Lock()
+    
+    def fake_recognize(page_number, image, instruction):
+        assert image.startswith(b"\xff\xd8"), "Ожидалось изображение JPEG"
+        with lock:
+            active.append(page_number)
+            peak[0] = max(peak[0], len(active))
+        time.sleep(0.1)
+        with lock:
+            active.remove(page_number)
+        if page_number == 5:
+            raise Exception("страница не распознана")
+        return f"распознано {page_number}"
+    
+    converter._recognize_page = fake_recognize
+    
+    # Тест 1: страницы распознаются параллельно, текст собирается в порядке страниц
+    print("1️⃣ Тест параллельности и порядка:")
+    progress = []
+    started = time.monotonic()
+    result = converter.extract_text_with_ai_fallback(pdf_path, on_page=lambda done, total: progress.append((done, total)))
+    elapsed = time.monotonic() - started
+    print(f"   ⏱ 6 страниц по 0.1с: {elapsed:.2f}с, одновременно: {peak[0]}")
+    assert peak[0] == 4
+    assert elapsed < 0.7
+    pages = result["metadata"]["pages"]
+    assert [page["page_type"] for page in pages] == [
+        "scanned", "text", "scanned", "scanned", "scanned", "scanned", "mixed", "empty"
+    ]
+    # На распознавание уходят только сканы и смешанные страницы
+    assert [page["conversion_method"] for page in pages] == [
+        "ai", "standard", "ai", "ai", "error", "ai", "ai", "standard"
+    ]
+    assert result["metadata"]["ai_converted_pages"] == 5
+    markers = ["распознано 1", "Text layer of page 2", "распознано 3", "распознано 4", "распознано 6", "распознано 7"]
+    positions = [result["text"].index(marker) for marker in markers]
+    assert positions == sorted(positions)
+    assert progress[-1] == (8, 8) and len(progress) == 8
+    
+    # Тест 2: страница рендерится не больше max_image_side по длинной стороне
+    print("2️⃣ Тест рендеринга страниц:")
+    from PIL import Image
+    import io
+    doc = fitz.open(pdf_path)
+    rendered = list(converter.render_pages(doc, [1, 3]))
+    doc.close()
+    assert [page_number for page_number, _, _ in rendered] == [1, 3]
+    size = Image.open(io.BytesIO(rendered[0][1])).size
+    print(f"   🖼 Размер страницы A4: {size}, {len(rendered[0][1])} байт")
+    assert max(size) <= converter.max_image_side
+    
+    # Тест 3: повтор запроса на 429 и 5xx
+    print("3️⃣ Тест повторов запроса к LLM:")
+    
+    class FakeResponse:
+        def __init__(self, status_code, content=None):
+            self.status_code = status_code
+            self.headers = {"Retry-After": "0"} if status_code == 429 else {}
+            self._content = content
+        
+        def raise_for_status(self):
+            if self.status_code >= 400:
+                import requests
+                raise requests.HTTPError(f"{self.status_code} Error")
+        
+        def json(self):
+            return {"choices": [{"message": {"content": self._content}}]}
+    
+    class FakeSession:
+        def __init__(self, responses):
+            self.responses = list(responses)
+            self.calls = 0
+        
+        def post(self, *args, **kwargs):
+            self.calls += 1
+            return self.responses.pop(0)
+    
+    from services.ai_pdf_converter import RateLimiter
+    converter = AIPDFConverter(api_key="test")
+    converter.retry_backoff = 0.01
+    converter.rate_limiter = RateLimiter(0)
+    converter.session = FakeSession([FakeResponse(429), FakeResponse(503), FakeResponse(200, "готово")])
+    assert converter.send_page_to_llm("aGVsbG8=", "инструкция") == "готово"
+    assert converter.session.calls == 3
+    
+    converter.session = FakeSession([FakeResponse(400)])
+    try:
+        converter.send_page_to_llm("aGVsbG8=", "инструкция")
+        raise AssertionError("Ожидалась ошибка без повторов")
+    except Exception as e:
+        print(f"   ✅ Правильно обработана ошибка: {e}")
+    assert converter.session.calls == 1
+    
+    # Тест 4: ограничение частоты запросов
+    print("4️⃣ Тест ограничения частоты:")
+    limiter = RateLimiter(600)  # интервал 0.1с
+    started = time.monotonic()
+    for _ in range(4):
+        limiter.acquire()
+    elapsed = time.monotonic() - started
+    print(f"   ⏱ 4 запроса при 600/мин: {elapsed:.2f}с")
+    assert 0.25 < elapsed < 0.5
+    
+    print()
+    print("✅ Тестирование параллельной ИИ-конвертации завершено!")
+
 def main():
     """Основная функция"""
     test_ai_converter()
+    test_parallel_ocr()
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
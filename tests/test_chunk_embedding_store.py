@@ -0,0 +1,59 @@
+"""
+Тестовый скрипт для проверки хранилища эмбедингов чанков
+"""
+
+import os
+import tempfile
+import time
+from services.chunk_embedding_store import ChunkEmbeddingStore
+
+def test_chunk_embedding_store():
+    """Тестирует ChunkEmbeddingStore"""
+    print("🧪 Тестирование ChunkEmbeddingStore")
+    print("=" * 50)
+    
+    store = ChunkEmbeddingStore(os.path.join(tempfile.mkdtemp(), "chunks.sqlite3"))
+    calls = []
+    
+    def embed(texts):
+        calls.append(list(texts))
+        return [[float(len(text)), 0.5] for text in texts]
+    
+    chunks = ["Первый чанк договора.", "Второй чанк договора.", "Первый чанк договора."]
+    
+    # Тест 1: повторная загрузка документа берет эмбединги из хранилища
+    print("1️⃣ Тест повторной загрузки:")
+    first = store.get_or_embed(chunks, "model-a", embed)
+    second = store.get_or_embed(chunks, "model-a", embed)
+    stats = store.stats()
+    print(f"   📊 Вызовов модели: {len(calls)}, метрики: {stats}")
+    assert calls == [["Первый чанк договора.", "Второй чанк договора."]]
+    assert first == second == [embed([chunk])[0] for chunk in chunks]
+    calls.clear()
+    assert stats["size"] == 2 and stats["hits"] == 3 and stats["misses"] == 2
+    
+    # Тест 2: другая модель не получает чужие векторы
+    print("2️⃣ Тест другой модели:")
+    store.get_or_embed(chunks[:2], "model-b", embed)
+    assert calls == [chunks[:2]]
+    assert store.get_many(["Третий чанк договора."], "model-a") == [None]
+    
+    # Тест 3: сверх max_size вытесняются давно не использованные эмбединги, размер переживает перезапуск
+    print("3️⃣ Тест вытеснения:")
+    bounded = ChunkEmbeddingStore(store.path, max_size=4)
+    assert bounded.stats()["size"] == 4
+    time.sleep(0.01)
+    assert bounded.get_many(["Первый чанк договора."], "model-a")[0] is not None
+    time.sleep(0.01)
+    bounded.put_many(["Новый чанк."], "model-a", embed(["Новый чанк."]))
+    stats = bounded.stats()
+    print(f"   📊 Метрики: {stats}")
+    assert stats["size"] == 4 and stats["evictions"] == 1
+    assert bounded.get_many(["Первый чанк договора.", "Новый чанк."], "model-a") == embed(["Первый чанк договора.", "Новый чанк."])
+    evicted = bounded.get_many(chunks[:2], "model-b") + bounded.get_many(["Второй чанк договора."], "model-a")
+    assert evicted.count(None) == 1
+    
+    print("✅ Тестирование завершено успешно!")
+
+if __name__ == "__main__":
+    test_chunk_embedding_store()
@@ -0,0 +1,133 @@
+"""
+Тестовый скрипт для проверки потоковой разбивки на чанки
+"""
+
+import pickle
+from bisect import bisect_right
+from config import Config
+from utils.chunking import Chunk, chunk_document, chunking_settings, get_token_counter, iter_chunks, text_segments
+from utils.text_extractor import TextExtractor
+
+def test_chunking():
+    """Тестирует iter_chunks и chunk_document"""
+    print("🧪 Тестирование потоковой разбивки на чанки")
+    print("=" * 50)
+    
+    pages = [" ".join(f"стр{page} слово{i}" for i in range(60)) for page in range(1, 6)]
+    text = "\n".join(pages)
+    
+    # Тест 1: чанки совпадают с chunk_text, смещения указывают на текст чанка
+    print("1️⃣ Тест смещений:")
+    chunks = list(iter_chunks([(None, text)], chunk_size=200, overlap=50))
+    assert chunks == TextExtractor.chunk_text(text, chunk_size=200, overlap=50)
+    for chunk in chunks:
+        assert text[chunk.start:chunk.end] == chunk
+    # Последний чанк доходит до конца текста, лишнего хвоста из перекрытия нет
+    assert chunks[-1].end == len(text)
+    assert chunks[-1] not in chunks[-2]
+    print(f"   📦 Чанков: {len(chunks)}")
+    
+    # Тест 2: номера страниц берутся из смещений страниц в метаданных извлечения
+    print("2️⃣ Тест номеров страниц:")
+    metadata = {"pages": []}
+    position = 0
+    for page_number, page_text in enumerate(pages, start=1):
+        metadata["pages"].append({"page_number": page_number, "start": position, "end": position + len(page_text)})
+        position += len(page_text) + 1
+    chunks = chunk_document(text, metadata, chunk_size=200, overlap=50)
+    starts = [page["start"] for page in metadata["pages"]]
+    for chunk in chunks:
+        assert chunk.page_start == bisect_right(starts, chunk.start)
+        assert chunk.page_end == bisect_right(starts, chunk.end - 1)
+    assert chunks[-1].page_end == 5
+    assert "".join(segment for _, segment in text_segments(text, metadata["pages"])) == text
+    print(f"   📄 Первый чанк: страницы {chunks[0].location()}")
+    
+    # Тест 3: фрагменты читаются по мере надобности, а не все сразу
+    print("3️⃣ Тест потоковой обработки:")
+    pulled = []
+    
+    def stream():
+        for page_number, page_text in enumerate(pages, start=1):
+            pulled.append(page_number)
+            yield page_number, page_text + "\n"
+    
+    first = next(iter_chunks(stream(), chunk_size=200, overlap=50))
+    assert first.page_start == 1
+    assert pulled == [1], f"Прочитано страниц: {pulled}"
+    
+    # Тест 4: чанк остается строкой и переживает передачу между процессами
+    print("4️⃣ Тест сериализации:")
+    restored = pickle.loads(pickle.dumps(chunks[1]))
+    assert isinstance(restored, Chunk) and isinstance(restored, str)
+    assert restored.location() == chunks[1].location()
+    
+    print()
+    print("✅ Тестирование потоковой разбивки завершено!")
+
+def test_chunking_strategies():
+    """Тестирует стратегии tokens, sentences, pages и выбор параметров разбивки"""
+    print("🧪 Тестирование стратегий разбивки")
+    print("=" * 50)
+    
+    sentences = [f"Предложение номер {i} о приготовлении теста." for i in range(1, 41)]
+    pages = [" ".join(sentences[i:i + 10]) for i in range(0, 40, 10)]
+    text = "\n".join(pages)
+    metadata = {"pages": []}
+    position = 0
+    for page_number, page_text in enumerate(pages, start=1):
+        metadata["pages"].append({"page_number": page_number, "start": position, "end": position + len(page_text)})
+        position += len(page_text) + 1
+    # Без описания токенизатора используется консервативная оценка
+    count_tokens = get_token_counter(None)
+    
+    # Тест 1: tokens — чанки не длиннее бюджета токенов
+    print("1️⃣ Тест стратегии tokens:")
+    chunks = chunk_document(text, metadata, chunk_size=60, overlap=10, strategy="tokens")
+    sizes = count_tokens(chunks)
+    print(f"   📦 Чанков: {len(chunks)}, токенов в чанке: {min(sizes)}–{max(sizes)}")
+    assert max(sizes) <= 60
+    for chunk in chunks:
+        assert text[chunk.start:chunk.end] == chunk
+    
+    # Тест 2: sentences — чанки состоят из целых предложений
+    print("2️⃣ Тест стратегии sentences:")
+    chunks = chunk_document(text, metadata, chunk_size=60, overlap=30, strategy="sentences")
+    for chunk in chunks:
+        assert chunk.startswith("Предложение") and chunk.endswith("теста."), chunk
+    # Перекрытие — целые предложения из конца предыдущего чанка
+    assert chunks[1].split(".")[0] in chunks[0]
+    
+    # Тест 3: pages — страница целиком, если помещается
+    print("3️⃣ Тест стратегии pages:")
+    chunks = chunk_document(text, metadata, chunk_size=1000, overlap=0, strategy="pages")
+    assert chunks == pages
+    assert [(chunk.page_start, chunk.page_end) for chunk in chunks] == [(1, 1), (2, 2), (3, 3), (4, 4)]
+    chunks = chunk_document(text, metadata, chunk_size=60, overlap=0, strategy="pages")
+    assert all(chunk.page_start == chunk.page_end for chunk in chunks)
+    
+    # Тест 4: параметры загрузки важнее настроек коллекции, размеры другой стратегии не наследуются
+    print("4️⃣ Тест выбора параметров:")
+    collection = {"chunking_strategy": "sentences", "chunk_size": 128, "chunk_overlap": 16}
+    assert chunking_settings({}, collection) == collection
+    assert chunking_settings({"chunk_size": 64}, collection)["chunk_size"] == 64
+    assert chunking_settings({"chunking_strategy": "chars"}, collection) == {
+        "chunking_strategy": "chars", "chunk_size": Config.CHUNK_SIZE, "chunk_overlap": Config.CHUNK_OVERLAP
+    }
+    for bad in ({"chunking_strategy": "words"}, {"chunk_size": 10, "chunk_overlap": 10}):
+        try:
+            chunking_settings(bad)
+            raise AssertionError(f"Ожидалась ошибка для {bad}")
+        except ValueError as e:
+            print(f"   ✅ Правильно обработана ошибка: {e}")
+    
+    print()
+    print("✅ Тестирование стратегий разбивки завершено!")
+
+def main():
+    """Основная функция"""
+    test_chunking()
+    test_chunking_strategies()
+
+if __name__ == "__main__":
+    main()
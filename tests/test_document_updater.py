@@ -0,0 +1,123 @@
+"""
+Тестовый скрипт для проверки обновления документа новой редакцией
+"""
+
+import os
+import tempfile
+from services.document_updater import DocumentUpdater
+from services.vector_store import VectorStore
+from utils.chunking import Chunk
+
+class FakeEmbeddingsService:
+    """Сервис эмбедингов с предсказуемыми векторами и учетом запрошенных текстов"""
+
+    tokenizer = None
+
+    def __init__(self, vector_store):
+        self.vector_store = vector_store
+        self.embedded = []
+
+    def embed_chunks(self, chunks):
+        self.embedded.extend(chunks)
+        return [[float(len(chunk)), float(sum(map(ord, chunk)) % 97), 1.0] for chunk in chunks]
+
+    def chunk_records(self, file_id, chunks, metadata=None, start_index=0):
+        ids = [f"{file_id}_{i}" for i in range(start_index, start_index + len(chunks))]
+        metadatas = [
+            {**(metadata or {}), "file_id": file_id, "chunk_index": i, **chunk.location()}
+            for i, chunk in zip(range(start_index, start_index + len(chunks)), chunks)
+        ]
+        return ids, metadatas
+
+def paragraphs(count, changed=None):
+    """Чанки документа из count пунктов (по чанку на пункт) со смещениями в тексте"""
+    texts = [f"Пункт {i}. Сотрудник соблюдает правило номер {i}." for i in range(count)]
+    for index, text in (changed or {}).items():
+        texts[index] = text
+    chunks, offset = [], 0
+    for text in texts:
+        chunks.append(Chunk(text, offset, offset + len(text)))
+        offset += len(text) + 1
+    return chunks
+
+def test_document_updater():
+    """Тестирует DocumentUpdater"""
+    print("🧪 Тестирование DocumentUpdater")
+    print("=" * 50)
+
+    vector_store = VectorStore(os.path.join(tempfile.mkdtemp(), "chroma"))
+    service = FakeEmbeddingsService(vector_store)
+    updater = DocumentUpdater(service, "updater-test")
+
+    def stored():
+        records = vector_store.get_collection("updater-test").get(
+            where={"file_id": "doc"}, include=["documents", "metadatas", "embeddings"]
+        )
+        order = sorted(range(len(records["ids"])), key=lambda i: records["metadatas"][i]["chunk_index"])
+        return [records["documents"][i] for i in order], [records["embeddings"][i] for i in order], records["metadatas"]
+
+    # Тест 1: новый документ записывается целиком
+    print("1️⃣ Тест первой записи:")
+    first = paragraphs(20)
+    stats = updater.update("doc", first, {"content_hash": "v1"})
+    print(f"   📊 {stats}")
+    assert stats["written"] == stats["embedded"] == len(first)
+    assert stored()[0] == list(first)
+
+    # Тест 2: изменение одного пункта запрашивает эмбединг только для нового текста
+    print("2️⃣ Тест изменения одного пункта:")
+    service.embedded.clear()
+    second = paragraphs(20, {7: "Пункт 7 отменен."})
+    stats = updater.update("doc", second, {"content_hash": "v2"})
+    print(f"   📊 {stats}")
+    assert service.embedded == ["Пункт 7 отменен."]
+    # Следующие пункты сдвинулись в тексте: у них обновлены только смещения, у предыдущих — поля документа
+    assert stats["written"] == 1 and stats["updated"] == 12 and stats["refreshed"] == 7 and stats["unchanged"] == 0
+    documents, embeddings, metadatas = stored()
+    assert documents == list(second)
+    assert embeddings == service.embed_chunks(second)
+    assert sorted(metadata["char_start"] for metadata in metadatas) == [chunk.start for chunk in second]
+    assert all(metadata["content_hash"] == "v2" for metadata in metadatas)
+
+    # Тест 3: та же редакция ничего не меняет, укороченная удаляет лишние записи
+    print("3️⃣ Тест повтора и удаления чанков:")
+    service.embedded.clear()
+    stats = updater.update("doc", second, {"content_hash": "v2"})
+    assert stats == {"unchanged": len(second), "refreshed": 0, "updated": 0, "written": 0, "embedded": 0, "deleted": 0}
+    third = paragraphs(10, {7: "Пункт 7 отменен."})
+    stats = updater.update("doc", third, {"content_hash": "v3"})
+    print(f"   📊 {stats}")
+    assert service.embedded == []
+    assert stats["deleted"] == len(second) - len(third)
+    assert stored()[0] == list(third)
+
+    # Тест 4: вставка в начало сдвигает чанки, но их эмбединги переиспользуются
+    print("4️⃣ Тест вставки в начало:")
+    inserted = [Chunk("Преамбула.", 0, 10)] + [
+        Chunk(chunk, chunk.start + 11, chunk.end + 11) for chunk in third
+    ]
+    stats = updater.update("doc", inserted, {"content_hash": "v4"})
+    print(f"   📊 {stats}")
+    assert service.embedded == ["Преамбула."]
+    assert stats["written"] == len(inserted)
+    assert stored()[1] == service.embed_chunks(inserted)
+
+    # Тест 5: переименование обновляет поля документа у всех записей без новых эмбедингов
+    print("5️⃣ Тест переименования:")
+    service.embedded.clear()
+    stats = updater.update("doc", inserted, {"filename": "renamed.txt", "content_hash": "v5"})
+    print(f"   📊 {stats}")
+    assert service.embedded == [] and stats["refreshed"] == len(inserted)
+    metadatas = stored()[2]
+    assert len(metadatas) == len(inserted)
+    assert all(metadata["filename"] == "renamed.txt" and metadata["content_hash"] == "v5" for metadata in metadatas)
+
+    # Тест 6: поля, пропавшие из метаданных, не остаются у записей
+    print("6️⃣ Тест замены метаданных:")
+    updater.update("doc", inserted, {})
+    assert all("content_hash" not in metadata for metadata in stored()[2])
+
+    print("✅ Тестирование завершено успешно!")
+
+if __name__ == "__main__":
+    test_document_updater()
@@ -0,0 +1,103 @@
+"""
+Тестовый скрипт для проверки батчинга запросов эмбедингов
+"""
+
+import threading
+from services.embedding_batcher import EmbeddingBatcher
+
+def test_embedding_batcher():
+    """Тестирует EmbeddingBatcher"""
+    print("🧪 Тестирование EmbeddingBatcher")
+    print("=" * 50)
+    
+    # Один "токен" на символ, чтобы лимиты было легко проверить
+    batcher = EmbeddingBatcher(
+        max_tokens=10,
+        max_items=3,
+        concurrency=3,
+        max_retries=2,
+        retry_backoff=0.01,
+        count_tokens=len
+    )
+    
+    # Тест 1: разбиение по токенам и числу элементов
+    print("1️⃣ Тест разбиения на батчи:")
+    texts = ["aaaa", "bbbb", "cc", "d", "eeeeeeeeeeee", "f", "g", "h", "i"]
+    batches = batcher.split(texts)
+    print(f"   📦 Батчи: {batches}")
+    assert batches == [[0, 1, 2], [3], [4], [5, 6, 7], [8]]
+    
+    # Тест 2: повтор упавшего батча и сборка в исходном порядке
+    print("2️⃣ Тест повторов и порядка векторов:")
+    calls = []
+    failed_once = set()
+    lock = threading.Lock()
+    
+    def embed_batch(batch_texts):
+        with lock:
+            calls.append(list(batch_texts))
+            if "cc" in batch_texts and "cc" not in failed_once:
+                failed_once.add("cc")
+                raise ConnectionError("Connection reset by peer")
+        return [[float(len(text)), float(ord(text[0]))] for text in batch_texts]
+    
+    embeddings = batcher.run(texts, embed_batch)
+    print(f"   🔁 Вызовов embed_batch: {len(calls)}")
+    assert embeddings == [[float(len(text)), float(ord(text[0]))] for text in texts]
+    assert len(calls) == len(batches) + 1
+    
+    # Тест 3: исчерпание повторов
+    print("3️⃣ Тест исчерпания повторов:")
+    
+    class ServerError(Exception):
+        status_code = 500
+    
+    def always_fails(batch_texts):
+        raise ServerError("500 Internal Server Error")
+    
+    try:
+        batcher.run(["a"], always_fails)
+        raise AssertionError("Ожидалась ошибка после исчерпания повторов")
+    except Exception as e:
+        print(f"   ✅ Правильно обработана ошибка: {e}")
+        assert "3 попыток" in str(e)
+    
+    # Тест 4: ошибки, которые повтор не исправит, не повторяются
+    print("4️⃣ Тест ошибок без повтора:")
+    
+    class BadRequest(Exception):
+        status_code = 400
+    
+    calls.clear()
+    
+    def rejects(batch_texts):
+        calls.append(list(batch_texts))
+        raise BadRequest("400 Bad Request")
+    
+    try:
+        batcher.run(["a"], rejects)
+        raise AssertionError("Ожидалась ошибка запроса")
+    except Exception as e:
+        print(f"   ✅ Правильно обработана ошибка: {e}")
+        assert "400 Bad Request" in str(e) and len(calls) == 1
+    
+    # Тест 5: текст длиннее лимита модели отклоняется до отправки
+    print("5️⃣ Тест слишком длинного текста:")
+    limited = EmbeddingBatcher(max_tokens=100, max_input_tokens=5, count_tokens=len)
+    calls.clear()
+    try:
+        limited.run(["abc", "abcdefgh"], embed_batch)
+        raise AssertionError("Ожидалась ошибка для длинного текста")
+    except ValueError as e:
+        print(f"   ✅ Правильно обработана ошибка: {e}")
+        assert calls == []
+    
+    print()
+    print("✅ Тестирование EmbeddingBatcher завершено!")
+
+def main():
+    """Основная функция"""
+    test_embedding_batcher()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Тестовый скрипт для проверки кэша эмбедингов поисковых запросов
+"""
+
+import os
+import tempfile
+import time
+from services.embedding_cache import QueryEmbeddingCache
+
+def test_query_embedding_cache():
+    """Тестирует QueryEmbeddingCache"""
+    print("🧪 Тестирование QueryEmbeddingCache")
+    print("=" * 50)
+    
+    calls = []
+    
+    def compute(text):
+        calls.append(text)
+        return [float(len(text)), 0.5]
+    
+    # Тест 1: повторный и почти идентичный запрос берутся из кэша
+    print("1️⃣ Тест попаданий в кэш:")
+    cache = QueryEmbeddingCache(max_size=2, ttl=0)
+    cache.get_or_compute("Что такое ИИ?", "model-a", compute)
+    cache.get_or_compute("  Что  такое ИИ? ", "model-a", compute)
+    cache.get_or_compute("Что такое ИИ?", "model-b", compute)
+    stats = cache.stats()
+    print(f"   📊 Вычислений: {len(calls)}, метрики: {stats}")
+    assert len(calls) == 2
+    assert stats["hits"] == 1 and stats["misses"] == 2
+    
+    # Тест 2: вытеснение самой старой записи
+    print("2️⃣ Тест LRU-вытеснения:")
+    cache.get_or_compute("Другой вопрос", "model-a", compute)
+    assert cache.get("Что такое ИИ?", "model-a") is None
+    assert cache.stats()["evictions"] == 1
+    print("   ✅ Самая давно использованная запись вытеснена")
+    
+    # Тест 3: устаревание по TTL
+    print("3️⃣ Тест TTL:")
+    short_cache = QueryEmbeddingCache(max_size=10, ttl=0.05)
+    short_cache.put("вопрос", "model-a", [1.0])
+    assert short_cache.get("вопрос", "model-a") == [1.0]
+    time.sleep(0.1)
+    assert short_cache.get("вопрос", "model-a") is None
+    print("   ✅ Устаревшая запись не возвращается")
+    
+    # Тест 4: дисковый уровень переживает перезапуск
+    print("4️⃣ Тест хранения на диске:")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        disk_path = os.path.join(tmp_dir, "query_cache.sqlite3")
+        QueryEmbeddingCache(disk_path=disk_path).put("вопрос", "model-a", [0.25, -1.5])
+        restarted = QueryEmbeddingCache(disk_path=disk_path)
+        assert restarted.get("вопрос", "model-a") == [0.25, -1.5]
+        assert restarted.stats()["disk_hits"] == 1
+        print("   ✅ Эмбединг восстановлен с диска после перезапуска")
+    
+    # Тест 5: размер кэша на диске ограничен, устаревшие записи удаляются
+    print("5️⃣ Тест ограничения кэша на диске:")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        disk_path = os.path.join(tmp_dir, "query_cache.sqlite3")
+        bounded = QueryEmbeddingCache(max_size=1, ttl=0, disk_path=disk_path, disk_max_size=2)
+        bounded.put("первый", "model-a", [1.0])
+        bounded.put("второй", "model-a", [2.0])
+        time.sleep(0.01)
+        assert bounded.get("первый", "model-a") == [1.0]
+        bounded.put("третий", "model-a", [3.0])
+        restarted = QueryEmbeddingCache(ttl=0, disk_path=disk_path, disk_max_size=2)
+        assert restarted.get("второй", "model-a") is None
+        assert restarted.get("первый", "model-a") == [1.0]
+        assert bounded.stats()["disk_evictions"] == 1
+        
+        expiring = QueryEmbeddingCache(ttl=0.05, disk_path=disk_path)
+        time.sleep(0.1)
+        expiring.put("четвертый", "model-a", [4.0])
+        rows = expiring._disk.execute("SELECT COUNT(*) FROM query_embeddings").fetchone()[0]
+        print(f"   📊 Записей на диске: {rows}")
+        assert rows == 1
+    
+    print()
+    print("✅ Тестирование QueryEmbeddingCache завершено!")
+
+def main():
+    """Основная функция"""
+    test_query_embedding_cache()
+
+if __name__ == "__main__":
+    main()
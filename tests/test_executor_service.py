@@ -0,0 +1,67 @@
+"""
+Тестовый скрипт для проверки пулов исполнения блокирующих операций
+"""
+
+import asyncio
+import time
+from services.executor_service import ExecutorPool, ExecutorOverloadedError
+
+def test_executor_pool():
+    """Тестирует ExecutorPool"""
+    print("🧪 Тестирование ExecutorPool")
+    print("=" * 50)
+
+    async def scenario():
+        pool = ExecutorPool("test", max_workers=2, max_queue=2)
+
+        # Тест 1: блокирующие задачи не останавливают event loop
+        print("1️⃣ Тест параллельного выполнения:")
+        started = time.monotonic()
+        tasks = [asyncio.ensure_future(pool.run(time.sleep, 0.2)) for _ in range(4)]
+        await asyncio.sleep(0)
+        ticks = 0
+        while not all(task.done() for task in tasks):
+            ticks += 1
+            await asyncio.sleep(0.01)
+        elapsed = time.monotonic() - started
+        print(f"   ⏱ 4 задачи по 0.2с на 2 потоках: {elapsed:.2f}с, тиков event loop: {ticks}")
+        assert ticks > 10, "Event loop был заблокирован"
+
+        stats = pool.stats()
+        print(f"   📊 Метрики: {stats}")
+        assert stats["completed"] == 4
+        assert stats["peak_queue_depth"] == 2
+        assert stats["in_flight"] == 0
+
+        # Тест 2: переполнение очереди
+        print("2️⃣ Тест ограничения очереди:")
+        futures = [pool.submit(time.sleep, 0.1) for _ in range(4)]
+        try:
+            pool.submit(time.sleep, 0.1)
+            raise AssertionError("Ожидалась ошибка переполнения очереди")
+        except ExecutorOverloadedError as e:
+            print(f"   ✅ Правильно отклонена задача: {e}")
+        for future in futures:
+            future.result()
+        assert pool.stats()["rejected"] == 1
+
+        # Тест 3: ошибки задач попадают в метрики
+        print("3️⃣ Тест учёта ошибок:")
+        try:
+            await pool.run(int, "не число")
+        except ValueError:
+            print("   ✅ Исключение передано вызывающему")
+        assert pool.stats()["failed"] == 1
+
+        pool.shutdown()
+
+    asyncio.run(scenario())
+    print()
+    print("✅ Тестирование ExecutorPool завершено!")
+
+def main():
+    """Основная функция"""
+    test_executor_pool()
+
+if __name__ == "__main__":
+    main()
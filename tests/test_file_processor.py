@@ -2,9 +2,19 @@
 Тестовый скрипт для проверки FileProcessor сервиса
 """
 
+import gzip
+import hashlib
+import io
 import os
 import sys
-from services.file_processor import FileProcessor
+import tarfile
+import tempfile
+import zipfile
+from services.file_processor import FileProcessor, FileTooLargeError
+
+def uploaded_files():
+    """Файлы в uploads, включая каталоги документов"""
+    return {os.path.join(root, name) for root, _, names in os.walk("uploads") for name in names}
 
 def test_file_processor():
     """Тестирует FileProcessor"""
@@ -95,6 +105,217 @@ def test_file_processor():
     print()
     print("✅ Тестирование FileProcessor завершено!")
 
+def test_streaming_upload():
+    """Тестирует потоковое сохранение загрузки"""
+    print("🧪 Тестирование потокового сохранения загрузки")
+    print("=" * 50)
+    
+    class TrackingReader(io.BytesIO):
+        """Запоминает максимальный размер запрошенного блока"""
+        max_read = 0
+        
+        def read(self, size=-1):
+            TrackingReader.max_read = max(TrackingReader.max_read, size)
+            return super().read(size)
+    
+    processor = FileProcessor("uploads", read_chunk_size=64 * 1024, max_file_size=2 * 1024 * 1024)
+    content = ("Строка для проверки потоковой загрузки.\n" * 20000).encode("utf-8")[:1500000]
+    
+    # Тест 1: файл пишется блоками, размер и хэш считаются по пути
+    print("1️⃣ Тест блочной записи, размера и хэша:")
+    saved = processor.save_upload(TrackingReader(content), "stream.txt")
+    print(f"   📊 Размер: {saved['file_size']} байт, максимальный блок: {TrackingReader.max_read} байт")
+    assert saved["file_size"] == len(content)
+    assert saved["content_hash"] == hashlib.sha256(content).hexdigest()
+    assert TrackingReader.max_read == 64 * 1024
+    
+    result = processor.process_saved_file(saved)
+    assert result["content_hash"] == saved["content_hash"]
+    assert os.path.exists(result["txt_path"])
+    processor.delete_file_versions(saved["file_id"])
+    
+    # Тест 2: превышение лимита размера прерывает запись и удаляет частичный файл
+    print("2️⃣ Тест ограничения размера:")
+    before = uploaded_files()
+    try:
+        processor.save_upload(io.BytesIO(content * 2), "big.txt")
+        raise AssertionError("Ожидалась ошибка превышения размера")
+    except FileTooLargeError as e:
+        print(f"   ✅ Правильно обработана ошибка: {e}")
+    assert uploaded_files() == before
+    
+    print()
+    print("✅ Тестирование потокового сохранения завершено!")
+
+def test_archive_upload():
+    """Тестирует распаковку архивов для пакетной загрузки"""
+    print("🧪 Тестирование распаковки архивов")
+    print("=" * 50)
+    
+    processor = FileProcessor("uploads")
+    
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zf:
+        zf.writestr("docs/one.txt", "Первый документ")
+        zf.writestr("docs/two.txt", "Второй документ")
+        zf.writestr("image.png", b"png")
+        zf.writestr("__MACOSX/docs/._one.txt", b"mac")
+    
+    # Тест 1: документы сохраняются, неподдерживаемые файлы пропускаются
+    print("1️⃣ Тест zip архива:")
+    archive.seek(0)
+    entries = processor.save_archive(archive, "docs.zip")
+    names = [entry["original_filename"] for entry in entries]
+    print(f"   📦 Файлы: {names}")
+    assert names == ["docs.zip/docs/one.txt", "docs.zip/docs/two.txt", "docs.zip/image.png"]
+    assert entries[2]["skipped"]
+    saved = [entry for entry in entries if "file_id" in entry]
+    assert [entry["content_hash"] for entry in saved] == [
+        hashlib.sha256("Первый документ".encode("utf-8")).hexdigest(),
+        hashlib.sha256("Второй документ".encode("utf-8")).hexdigest()
+    ]
+    for entry in saved:
+        processor.discard_upload(entry)
+    
+    # Тест 2: tar.gz архив
+    print("2️⃣ Тест tar.gz архива:")
+    archive = io.BytesIO()
+    with tarfile.open(fileobj=archive, mode="w:gz") as tf:
+        data = "Документ из tar".encode("utf-8")
+        info = tarfile.TarInfo("three.txt")
+        info.size = len(data)
+        tf.addfile(info, io.BytesIO(data))
+    archive.seek(0)
+    entries = processor.save_archive(archive, "more.tar.gz")
+    assert [entry["original_filename"] for entry in entries] == ["more.tar.gz/three.txt"]
+    processor.discard_upload(entries[0])
+    
+    # Тест 3: превышение лимита документов удаляет уже сохраненные файлы
+    print("3️⃣ Тест ограничения числа документов:")
+    before = uploaded_files()
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zf:
+        for i in range(3):
+            zf.writestr(f"{i}.txt", f"документ {i}")
+    archive.seek(0)
+    try:
+        processor.save_archive(archive, "many.zip", max_files=2)
+        raise AssertionError("Ожидалась ошибка превышения лимита")
+    except ValueError as e:
+        print(f"   ✅ Правильно обработана ошибка: {e}")
+    assert uploaded_files() == before
+    
+    print()
+    print("✅ Тестирование распаковки архивов завершено!")
+
+def test_file_layout():
+    """Тестирует раскладку файлов по каталогам документов"""
+    print("🧪 Тестирование раскладки файлов")
+    print("=" * 50)
+    
+    processor = FileProcessor("uploads")
+    
+    # Тест 1: файлы документа лежат в каталоге по префиксу file_id
+    print("1️⃣ Тест каталога документа:")
+    result = processor.process_uploaded_file("Текст документа".encode("utf-8"), "layout.txt")
+    file_id = result["file_id"]
+    expected_dir = os.path.join("uploads", file_id[:2], file_id[2:4])
+    assert os.path.dirname(result["original_path"]) == expected_dir
+    assert result["txt_path"] == os.path.join(expected_dir, f"{file_id}.txt")
+    file_info = processor.get_file_info(file_id)
+    assert file_info["original_path"] == result["original_path"]
+    assert file_info["txt_path"] == result["txt_path"]
+    assert processor.delete_file_versions(file_id)
+    assert not processor.get_file_info(file_id)["exists"]
+    
+    # Тест 2: файлы, загруженные до разбиения по каталогам, находятся и удаляются
+    print("2️⃣ Тест файлов в корне uploads:")
+    legacy_id = "legacy-0000"
+    for filename in (f"{legacy_id}_original.pdf", f"{legacy_id}.txt"):
+        with open(os.path.join("uploads", filename), "wb") as f:
+            f.write(b"legacy")
+    assert legacy_id in processor.legacy_file_ids()
+    file_info = processor.get_file_info(legacy_id)
+    assert file_info["original_path"] == os.path.join("uploads", f"{legacy_id}_original.pdf")
+    assert file_info["txt_path"] == os.path.join("uploads", f"{legacy_id}.txt")
+    assert processor.delete_file_versions(legacy_id)
+    assert not processor.get_file_info(legacy_id)["exists"]
+    assert legacy_id not in processor.legacy_file_ids()
+    
+    # Тест 3: file_id с путем не выходит за пределы uploads
+    print("3️⃣ Тест недопустимого file_id:")
+    assert not processor.get_file_info("../config")["exists"]
+    assert not processor.delete_file_versions("../config")
+    
+    print()
+    print("✅ Тестирование раскладки файлов завершено!")
+
+def test_compressed_storage():
+    """Тестирует сжатое хранение txt-версий и политики хранения оригиналов"""
+    print("🧪 Тестирование сжатого хранения файлов")
+    print("=" * 50)
+    
+    workdir = tempfile.mkdtemp()
+    upload_dir = os.path.join(workdir, "uploads")
+    archive_dir = os.path.join(workdir, "originals")
+    os.makedirs(upload_dir)
+    text = "Строка документа для проверки сжатого хранения.\n" * 2000
+    content = text.encode("utf-8")
+    
+    # Тест 1: txt-версия пишется сжатой и прозрачно читается
+    print("1️⃣ Тест сжатой txt-версии:")
+    processor = FileProcessor(upload_dir, text_compression="gzip", originals="archive", archive_dir=archive_dir)
+    result = processor.process_uploaded_file(content, "doc.txt")
+    file_id = result["file_id"]
+    print(f"   📊 Оригинал {len(content)} байт, txt-версия {os.path.getsize(result['txt_path'])} байт")
+    assert result["txt_path"].endswith(".txt.gz")
+    assert os.path.getsize(result["txt_path"]) * 10 < len(content)
+    with gzip.open(result["txt_path"], "rt", encoding="utf-8") as f:
+        assert f.read() == text
+    file_info = processor.get_file_info(file_id, include_text=True)
+    assert file_info["text"] == text and file_info["text_compression"] == "gzip"
+    assert processor.read_text(file_id) == text
+    
+    # Тест 2: оригинал после загрузки переносится в архив сжатым
+    print("2️⃣ Тест архивирования оригинала:")
+    archived = processor.store_original(result)
+    assert archived == processor.stored_original_path(file_id, ".txt")
+    assert archived.startswith(archive_dir) and archived.endswith("_original.txt.gz")
+    assert not os.path.exists(result["original_path"])
+    with gzip.open(archived, "rb") as f:
+        assert f.read() == content
+    assert processor.get_file_info(file_id)["original_path"] == archived
+    
+    # Тест 3: файлы, записанные в другом режиме, находятся по путям из записи реестра
+    print("3️⃣ Тест смены режима хранения:")
+    plain = FileProcessor(upload_dir, archive_dir=archive_dir, text_compression="none", originals="keep")
+    record = {**result, "original_path": archived}
+    assert plain.read_text(file_id) is None
+    assert plain.read_text(file_id, record) == text
+    assert plain.delete_file_versions(file_id, record)
+    assert not os.path.exists(archived) and not processor.get_file_info(file_id)["exists"]
+    
+    # Тест 4: с политикой drop оригинал удаляется
+    print("4️⃣ Тест удаления оригинала:")
+    dropping = FileProcessor(upload_dir, text_compression="gzip", originals="drop", archive_dir=archive_dir)
+    result = dropping.process_uploaded_file(content, "doc.txt")
+    assert dropping.store_original(result) is None
+    assert not os.path.exists(result["original_path"])
+    assert dropping.get_file_info(result["file_id"])["original_path"] is None
+    assert dropping.read_text(result["file_id"]) == text
+    
+    # Тест 5: неизвестные режимы отклоняются
+    print("5️⃣ Тест неизвестных режимов:")
+    for options in ({"text_compression": "lz4"}, {"originals": "move"}):
+        try:
+            FileProcessor(upload_dir, **options)
+            raise AssertionError(f"Ожидалась ошибка для {options}")
+        except ValueError as e:
+            print(f"   ✅ Правильно обработана ошибка: {e}")
+    
+    print()
+    print("✅ Тестирование сжатого хранения завершено!")
+
 def main():
     """Основная функция"""
     if not os.path.exists("uploads"):
@@ -102,6 +323,10 @@ def main():
         return
     
     test_file_processor()
+    test_streaming_upload()
+    test_archive_upload()
+    test_file_layout()
+    test_compressed_storage()
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
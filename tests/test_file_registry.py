@@ -0,0 +1,110 @@
+"""
+Тестовый скрипт для проверки реестра загруженных документов
+"""
+
+import io
+import os
+import tempfile
+from services.file_processor import FileProcessor
+from services.file_registry import FileRegistry
+
+def test_file_registry():
+    """Тестирует FileRegistry"""
+    print("🧪 Тестирование FileRegistry")
+    print("=" * 50)
+
+    workdir = tempfile.mkdtemp()
+    upload_dir = os.path.join(workdir, "uploads")
+    os.makedirs(upload_dir)
+    processor = FileProcessor(upload_dir)
+    registry = FileRegistry(os.path.join(workdir, "registry.sqlite3"))
+
+    def save(content, filename="doc.txt"):
+        return processor.save_upload(io.BytesIO(content), filename)
+
+    # Тест 1: первая загрузка регистрируется, повторная находит существующий документ
+    print("1️⃣ Тест повторной загрузки:")
+    first = save(b"one document")
+    assert registry.claim("docs", first) is None
+    duplicate = save(b"one document", "copy.txt")
+    existing = registry.claim("docs", duplicate)
+    assert existing["file_id"] == first["file_id"]
+    assert existing["status"] == FileRegistry.PROCESSING
+
+    assert registry.complete("docs", first, 3) == []
+    existing = registry.claim("docs", duplicate)
+    print(f"   📋 Существующий документ: {existing['file_id']}, чанков {existing['chunks_count']}")
+    assert existing["status"] == FileRegistry.READY
+    assert existing["chunks_count"] == 3
+    assert existing["filename"] == "doc.txt"
+
+    # Тест 2: то же содержимое в другой коллекции и другое содержимое — новые документы
+    print("2️⃣ Тест другой коллекции и другого содержимого:")
+    assert registry.claim("other", duplicate) is None
+    assert registry.claim("docs", save(b"another document")) is None
+
+    # Тест 3: загрузка с force заменяет прежнюю копию после успешной обработки
+    print("3️⃣ Тест принудительной повторной загрузки:")
+    forced = save(b"one document")
+    replaced = registry.complete("docs", forced, 4)
+    assert [record["file_id"] for record in replaced] == [first["file_id"]]
+    assert replaced[0]["txt_path"] == first["txt_path"]
+    assert registry.get(first["file_id"]) is None
+    assert registry.claim("docs", duplicate)["file_id"] == forced["file_id"]
+
+    # Тест 4: неудачная обработка снимает регистрацию, готовый документ не трогается
+    print("4️⃣ Тест неудачной обработки:")
+    failed = save(b"broken document")
+    assert registry.claim("docs", failed) is None
+    registry.release(failed["file_id"])
+    assert registry.get(failed["file_id"]) is None
+    registry.release(forced["file_id"])
+    assert registry.get(forced["file_id"])["status"] == FileRegistry.READY
+
+    # Тест 5: удаление документа и коллекции
+    print("5️⃣ Тест удаления:")
+    registry.remove(forced["file_id"])
+    assert registry.claim("docs", duplicate) is None
+    removed = registry.remove_collection("docs")
+    assert forced["file_id"] not in {record["file_id"] for record in removed} and len(removed) == 1
+    assert registry.claim("docs", forced) is None
+    assert registry.claim("other", first)["file_id"] == duplicate["file_id"]
+
+    # Тест 6: записи хранят пути к файлам, список постраничный
+    print("6️⃣ Тест списка документов:")
+    assert registry.get(duplicate["file_id"])["original_path"] == duplicate["original_path"]
+    assert registry.get(duplicate["file_id"])["txt_path"] == processor.txt_path(duplicate["file_id"])
+    for i in range(5):
+        registry.claim("paged", save(f"page {i}".encode()))
+    page, total = registry.list_files("paged", limit=2, offset=2)
+    assert total == 5 and len(page) == 2
+    all_files, _ = registry.list_files("paged", limit=10)
+    assert [record["file_id"] for record in all_files[2:4]] == [record["file_id"] for record in page]
+    assert registry.list_files(limit=1)[1] == 7
+
+    # Записи сохраняются между перезапусками
+    reopened = FileRegistry(registry.path)
+    assert reopened.get(duplicate["file_id"])["collection"] == "other"
+
+    # Тест 7: загрузки, прерванные остановкой процесса, снимаются с учета при старте
+    print("7️⃣ Тест прерванных загрузок:")
+    crashed = save(b"crashed upload")
+    queued = save(b"queued upload")
+    ready = save(b"ready upload")
+    assert reopened.claim("docs", ready) is None
+    reopened.complete("docs", ready, 2)
+    assert reopened.claim("docs", crashed) is None
+    assert reopened.claim("docs", queued) is None
+    stale = reopened.release_stale([queued["file_id"]])
+    print(f"   📋 Снято с учета: {[record['file_id'] for record in stale]}")
+    stale_ids = {record["file_id"] for record in stale}
+    assert crashed["file_id"] in stale_ids and queued["file_id"] not in stale_ids
+    assert all(record["status"] == FileRegistry.PROCESSING for record in stale)
+    assert reopened.get(ready["file_id"])["status"] == FileRegistry.READY
+    assert reopened.claim("docs", save(b"crashed upload")) is None
+    assert reopened.claim("docs", save(b"queued upload"))["file_id"] == queued["file_id"]
+
+    print("✅ Тестирование завершено успешно!")
+
+if __name__ == "__main__":
+    test_file_registry()
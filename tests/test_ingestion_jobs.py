@@ -0,0 +1,91 @@
+"""
+Тестовый скрипт для проверки очереди заданий загрузки
+"""
+
+import os
+import tempfile
+import threading
+import time
+from services.ingestion_jobs import IngestionJobQueue, QueueFullError
+
+def wait_for(queue, job_id, statuses=("done", "failed"), timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = queue.get(job_id)
+        if job["status"] in statuses:
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"Задание {job_id} не завершилось")
+
+def test_ingestion_jobs():
+    """Тестирует IngestionJobQueue"""
+    print("🧪 Тестирование IngestionJobQueue")
+    print("=" * 50)
+
+    db_path = os.path.join(tempfile.mkdtemp(), "jobs.sqlite3")
+    release = threading.Event()
+
+    def handler(payload, progress):
+        if payload.get("fail"):
+            raise Exception("ошибка извлечения")
+        with progress.stage("extract"):
+            for page in range(1, 4):
+                progress.update(pages_done=page, pages_total=3)
+        with progress.stage("embed"):
+            if payload.get("block"):
+                release.wait(5)
+            progress.update(chunks_done=2, chunks_total=2)
+        return {"chunks_count": 2, "name": payload["name"]}
+
+    queue = IngestionJobQueue(db_path, handler, workers=1, max_queue=2)
+    queue.start()
+
+    # Тест 1: submit возвращается сразу, задание выполняется в фоне
+    print("1️⃣ Тест выполнения задания:")
+    job_id = queue.submit({"name": "a.txt"})
+    job = wait_for(queue, job_id)
+    print(f"   📋 Статус: {job['status']}, этапы: {job['timings']}")
+    assert job["status"] == "done"
+    assert job["result"] == {"chunks_count": 2, "name": "a.txt"}
+    assert job["progress"] == {"pages_done": 3, "pages_total": 3, "chunks_done": 2, "chunks_total": 2}
+    assert set(job["timings"]) == {"extract", "embed"}
+
+    # Тест 2: ошибка обработчика сохраняется в задании
+    print("2️⃣ Тест ошибки задания:")
+    job = wait_for(queue, queue.submit({"name": "b.txt", "fail": True}))
+    assert job["status"] == "failed"
+    assert "ошибка извлечения" in job["error"]
+
+    # Тест 3: при заполненной очереди новые задания отклоняются
+    print("3️⃣ Тест ограничения очереди:")
+    running = queue.submit({"name": "c.txt", "block": True})
+    wait_for(queue, running, statuses=("running",))
+    queued = queue.submit({"name": "d.txt"})
+    assert queue.get(queued)["queue_position"] == 0
+    try:
+        queue.submit({"name": "e.txt"})
+        raise AssertionError("Ожидалась ошибка заполненной очереди")
+    except QueueFullError as e:
+        print(f"   ✅ Правильно обработана ошибка: {e}")
+    assert sorted(payload["name"] for payload in queue.pending_payloads()) == ["c.txt", "d.txt"]
+
+    # Тест 4: после перезапуска прерванные задания возвращаются в очередь
+    print("4️⃣ Тест восстановления после перезапуска:")
+    queue.shutdown()
+    restarted = IngestionJobQueue(db_path, handler, workers=1, max_queue=2)
+    release.set()
+    restarted.start()
+    assert wait_for(restarted, running)["status"] == "done"
+    assert wait_for(restarted, queued)["status"] == "done"
+    print(f"   📊 Статистика: {restarted.stats()}")
+    restarted.shutdown()
+
+    print()
+    print("✅ Тестирование IngestionJobQueue завершено!")
+
+def main():
+    """Основная функция"""
+    test_ingestion_jobs()
+
+if __name__ == "__main__":
+    main()
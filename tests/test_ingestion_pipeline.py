@@ -0,0 +1,174 @@
+"""
+Тестовый скрипт для проверки конвейерной загрузки документа
+"""
+
+import io
+import os
+import tempfile
+import threading
+import time
+import fitz  # PyMuPDF
+from services.executor_service import ExecutorPool
+from services.file_processor import FileProcessor
+from services.ingestion_pipeline import IngestionPipeline
+from services.vector_store import VectorStore
+from utils.chunking import chunk_document
+from utils.text_extractor import TextExtractor
+
+class FakeEmbeddingsService:
+    """Сервис эмбедингов с предсказуемыми векторами и задержкой на порцию"""
+
+    tokenizer = None
+
+    def __init__(self, vector_store, delay=0.0, fail_after=None):
+        self.vector_store = vector_store
+        self.delay = delay
+        self.fail_after = fail_after
+        self.embedded = 0
+        self.first_embed_at = None
+
+    def embed_chunks(self, chunks):
+        if self.first_embed_at is None:
+            self.first_embed_at = time.monotonic()
+        if self.fail_after is not None and self.embedded >= self.fail_after:
+            raise Exception("ошибка эмбедингов")
+        time.sleep(self.delay)
+        self.embedded += len(chunks)
+        return [[float(len(chunk)), 1.0] for chunk in chunks]
+
+    def chunk_records(self, file_id, chunks, metadata=None, start_index=0):
+        ids = [f"{file_id}_{i}" for i in range(start_index, start_index + len(chunks))]
+        metadatas = [
+            {**(metadata or {}), "file_id": file_id, "chunk_index": i}
+            for i in range(start_index, start_index + len(chunks))
+        ]
+        return ids, metadatas
+
+    def delete_document(self, file_id, collection_name):
+        collection = self.vector_store.get_collection(collection_name)
+        ids = collection.get(where={"file_id": file_id})["ids"]
+        if ids:
+            collection.delete(ids=ids)
+
+def slow_document(pages, delay):
+    """Генератор фрагментов текста, как FileProcessor.iter_saved_file, с задержкой на страницу"""
+    for page_number, text in enumerate(pages, 1):
+        time.sleep(delay)
+        yield page_number, text + "\n"
+    text = "".join(text + "\n" for text in pages)
+    return {"text": text, "extraction_metadata": {}}
+
+def test_ingestion_pipeline():
+    """Тестирует IngestionPipeline"""
+    print("🧪 Тестирование IngestionPipeline")
+    print("=" * 50)
+
+    workdir = tempfile.mkdtemp()
+    vector_store = VectorStore(os.path.join(workdir, "chroma"))
+    chunking = {"chunking_strategy": "chars", "chunk_size": 200, "chunk_overlap": 40}
+
+    # Тест 1: чанки и txt-версия совпадают с последовательной обработкой
+    print("1️⃣ Тест совпадения с последовательной обработкой:")
+    upload_dir = os.path.join(workdir, "uploads")
+    os.makedirs(upload_dir)
+    processor = FileProcessor(upload_dir)
+    text = " ".join(f"Предложение номер {i} о конвейерной загрузке." for i in range(200))
+    saved = processor.save_upload(io.BytesIO(text.encode("utf-8")), "doc.txt")
+    service = FakeEmbeddingsService(vector_store)
+    pipeline = IngestionPipeline(service, "pipeline-test", chunking, queue_size=2, embed_batch=8, write_batch=16)
+    result = pipeline.run(saved["file_id"], processor.iter_saved_file(saved), {"filename": "doc.txt"})
+
+    expected = chunk_document(text, None, 200, 40)
+    stored = vector_store.get_collection("pipeline-test").get(where={"file_id": saved["file_id"]})
+    documents = dict(zip(stored["ids"], stored["documents"]))
+    print(f"   📊 Чанков: {result['chunks_count']}, этапы: {result['timings']}")
+    assert result["chunks_count"] == len(expected)
+    assert [documents[f"{saved['file_id']}_{i}"] for i in range(len(expected))] == list(expected)
+    assert all(metadata["total_chunks"] == len(expected) for metadata in stored["metadatas"])
+    with open(result["file_data"]["txt_path"], encoding="utf-8") as f:
+        assert f.read() == text
+    assert set(result["timings"]) == {"extract", "chunk", "embed", "write", "total"}
+
+    # Тест 2: эмбединги начинаются до конца извлечения, время близко к самому медленному этапу
+    print("2️⃣ Тест перекрытия этапов:")
+    pages = [f"Страница {n}: " + "текст " * 60 for n in range(1, 21)]
+    service = FakeEmbeddingsService(vector_store, delay=0.03)
+    pipeline = IngestionPipeline(service, "pipeline-test", chunking, queue_size=2, embed_batch=4, write_batch=8)
+    started = time.monotonic()
+    result = pipeline.run("slow", slow_document(pages, 0.03), {})
+    elapsed = time.monotonic() - started
+    timings = result["timings"]
+    print(f"   ⏱️ Всего {elapsed:.2f}с, этапы: {timings}")
+    assert service.first_embed_at - started < 0.3
+    assert elapsed < timings["extract"] + timings["embed"]
+
+    # Тест 3: ошибка этапа останавливает конвейер и откатывает записанные чанки
+    print("3️⃣ Тест ошибки этапа:")
+    service = FakeEmbeddingsService(vector_store, fail_after=16)
+    pipeline = IngestionPipeline(service, "pipeline-test", chunking, queue_size=2, embed_batch=4, write_batch=4)
+    closed = threading.Event()
+
+    def failing_document():
+        try:
+            yield from slow_document(pages, 0.0)
+        finally:
+            closed.set()
+
+    try:
+        pipeline.run("broken", failing_document(), {})
+        raise AssertionError("Ожидалась ошибка эмбедингов")
+    except Exception as e:
+        assert "ошибка эмбедингов" in str(e)
+        print(f"   ✅ Правильно обработана ошибка: {e}")
+    assert closed.is_set()
+    assert vector_store.get_collection("pipeline-test").get(where={"file_id": "broken"})["ids"] == []
+
+    # Тест 4: потоковые фрагменты PDF склеиваются в тот же текст с теми же страницами
+    print("4️⃣ Тест потокового извлечения PDF:")
+    pdf_path = os.path.join(workdir, "stream.pdf")
+    doc = fitz.open()
+    doc.new_page()
+    for page_number in range(2, 6):
+        doc.new_page().insert_text((72, 72), f"Text layer of page {page_number} long enough\n\n")
+    doc.new_page()
+    doc.save(pdf_path)
+    doc.close()
+
+    stream = TextExtractor.iter_text_with_metadata(pdf_path)
+    segments = []
+    while True:
+        try:
+            segments.append(next(stream))
+        except StopIteration as stop:
+            streamed = stop.value
+            break
+    assert "".join(piece for _, piece in segments) == streamed["text"]
+    assert streamed == TextExtractor.extract_text_with_metadata(pdf_path)
+    for page_number, piece in segments:
+        if piece.strip():
+            assert f"page {page_number} " in piece
+
+    # Тест 5: эмбединги считаются через переданный вызов (в main — в пуле эмбедингов)
+    print("5️⃣ Тест эмбедингов в отдельном пуле:")
+    embedding_pool = ExecutorPool("embedding", 1)
+    service = FakeEmbeddingsService(vector_store)
+    threads = set()
+
+    def embed_in_pool(chunks):
+        threads.add(threading.current_thread().name)
+        return service.embed_chunks(chunks)
+
+    def pooled_embed(chunks):
+        return embedding_pool.submit(embed_in_pool, chunks).result()
+
+    pipeline = IngestionPipeline(service, "pipeline-test", chunking, embed_batch=4, embed=pooled_embed)
+    result = pipeline.run("pooled", slow_document(pages, 0.0), {})
+    assert result["chunks_count"] > 0 and service.embedded == result["chunks_count"]
+    assert threads and all(name.startswith("embedding-pool") for name in threads)
+    assert embedding_pool.stats()["completed"] == len(range(0, result["chunks_count"], 4))
+    embedding_pool.shutdown()
+
+    print("✅ Тестирование завершено успешно!")
+
+if __name__ == "__main__":
+    test_ingestion_pipeline()
@@ -0,0 +1,132 @@
+"""
+Тестовый скрипт для проверки асинхронного LLM клиента на локальном mock-сервере
+"""
+
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from services.llm_service import LLMService
+
+class MockOpenRouterHandler(BaseHTTPRequestHandler):
+    """Имитирует OpenRouter: первые ответы — 503, затем успешный ответ"""
+    protocol_version = "HTTP/1.1"
+    failures_left = 0
+    client_ports = set()
+    requests_count = 0
+    
+    def do_POST(self):
+        cls = type(self)
+        cls.requests_count += 1
+        cls.client_ports.add(self.client_address[1])
+        payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        
+        if cls.failures_left > 0:
+            cls.failures_left -= 1
+            self._send(503, {"error": "overloaded"})
+            return
+        
+        if payload.get("stream"):
+            self._send_stream(["Тестовый", " ответ"])
+            return
+        
+        self._send(200, {
+            "choices": [{"message": {"content": "Тестовый ответ"}}],
+            "usage": {"prompt_tokens": 10, "completion_tokens": 3, "total_tokens": 13}
+        })
+    
+    def _send(self, status: int, body: dict):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+    
+    def _send_stream(self, tokens: list):
+        events = [": OPENROUTER PROCESSING"]
+        for token in tokens:
+            events.append("data: " + json.dumps({"choices": [{"delta": {"content": token}}]}))
+        events.append("data: " + json.dumps({
+            "choices": [],
+            "usage": {"prompt_tokens": 10, "completion_tokens": 2, "total_tokens": 12}
+        }))
+        events.append("data: [DONE]")
+        data = "\n\n".join(events).encode("utf-8") + b"\n\n"
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+    
+    def log_message(self, format, *args):
+        pass
+
+def test_llm_service():
+    """Тестирует LLMService на локальном mock-сервере"""
+    print("🧪 Тестирование асинхронного LLMService")
+    print("=" * 50)
+    
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MockOpenRouterHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/chat/completions"
+    
+    async def scenario():
+        service = LLMService(base_url=base_url)
+        service.api_key = "test-key"
+        service.retry_backoff = 0.01
+        
+        # Тест 1: повтор после 503
+        print("1️⃣ Тест повтора на 5xx:")
+        MockOpenRouterHandler.failures_left = 2
+        result = await service.generate_response("Вопрос?", [])
+        print(f"   📝 Ответ: {result['answer']}, токены: {result['tokens']}")
+        assert result["answer"] == "Тестовый ответ"
+        assert result["tokens"]["total_tokens"] == 13
+        assert MockOpenRouterHandler.requests_count == 3
+        
+        # Тест 2: параллельные запросы через общий пул соединений
+        print("2️⃣ Тест пула keep-alive соединений:")
+        MockOpenRouterHandler.client_ports.clear()
+        for _ in range(3):
+            await asyncio.gather(*[service.generate_response("Вопрос?", []) for _ in range(5)])
+        print(f"   🔌 15 запросов, открыто соединений: {len(MockOpenRouterHandler.client_ports)}")
+        assert len(MockOpenRouterHandler.client_ports) <= 5
+        
+        # Тест 3: исчерпание повторов
+        print("3️⃣ Тест исчерпания повторов:")
+        MockOpenRouterHandler.failures_left = service.max_retries + 1
+        try:
+            await service.generate_response("Вопрос?", [])
+            raise AssertionError("Ожидалась ошибка после исчерпания повторов")
+        except Exception as e:
+            print(f"   ✅ Правильно обработана ошибка: {e}")
+            assert "503" in str(e)
+        
+        # Тест 4: потоковая генерация
+        print("4️⃣ Тест потоковой генерации:")
+        MockOpenRouterHandler.failures_left = 1
+        events = [event async for event in service.stream_response("Вопрос?", [])]
+        tokens = [event["content"] for event in events if event["type"] == "token"]
+        print(f"   📡 Получены фрагменты: {tokens}, итог: {events[-1]}")
+        assert tokens == ["Тестовый", " ответ"]
+        assert events[-1]["type"] == "done"
+        assert events[-1]["answer"] == "Тестовый ответ"
+        assert events[-1]["tokens"]["total_tokens"] == 12
+        
+        await service.aclose()
+    
+    try:
+        asyncio.run(scenario())
+    finally:
+        server.shutdown()
+    
+    print()
+    print("✅ Тестирование LLMService завершено!")
+
+def main():
+    """Основная функция"""
+    test_llm_service()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Тестовый скрипт для проверки микро-батчинга локальной модели
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from services.micro_batcher import MicroBatcher
+
+def test_micro_batcher():
+    """Тестирует MicroBatcher"""
+    print("🧪 Тестирование MicroBatcher")
+    print("=" * 50)
+    
+    encode_calls = []
+    lock = threading.Lock()
+    
+    def fake_encode(texts):
+        # Имитируем проход модели: фиксированная стоимость на батч
+        with lock:
+            encode_calls.append(list(texts))
+        time.sleep(0.02)
+        return [[float(len(text)), 1.0] for text in texts]
+    
+    batcher = MicroBatcher(fake_encode, max_batch_size=16, max_wait_ms=20, bucket_boundaries=[10])
+    
+    # Тест 1: одновременные запросы объединяются в общие батчи
+    print("1️⃣ Тест объединения запросов:")
+    questions = [f"вопрос {i}" for i in range(32)]
+    with ThreadPoolExecutor(max_workers=32) as executor:
+        results = list(executor.map(lambda q: batcher.encode([q]), questions))
+    print(f"   📦 32 запроса выполнены за {len(encode_calls)} проходов модели")
+    assert results == [[[float(len(q)), 1.0]] for q in questions]
+    assert len(encode_calls) < len(questions)
+    
+    # Тест 2: короткие и длинные тексты попадают в разные проходы
+    print("2️⃣ Тест группировки по длине:")
+    encode_calls.clear()
+    long_text = "длинный текст " * 20
+    result = batcher.encode(["коротко", long_text, "кратко"])
+    print(f"   📏 Проходы модели: {[len(call) for call in encode_calls]}")
+    assert result == [[7.0, 1.0], [float(len(long_text)), 1.0], [6.0, 1.0]]
+    assert sorted(len(call) for call in encode_calls) == [1, 2]
+    
+    # Тест 3: ошибка модели передается всем ожидающим
+    print("3️⃣ Тест передачи ошибки:")
+    failing = MicroBatcher(lambda texts: 1 / 0, max_wait_ms=1)
+    try:
+        failing.encode(["текст"])
+        raise AssertionError("Ожидалась ошибка модели")
+    except ZeroDivisionError:
+        print("   ✅ Ошибка модели передана вызывающему")
+    
+    batcher.close()
+    failing.close()
+    print()
+    print("✅ Тестирование MicroBatcher завершено!")
+
+def main():
+    """Основная функция"""
+    test_micro_batcher()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Тестовый скрипт для проверки реестра сервисов эмбедингов
+"""
+
+import asyncio
+import threading
+import time
+from services.model_registry import ModelRegistry
+
+def test_model_registry():
+    """Тестирует ModelRegistry"""
+    print("🧪 Тестирование ModelRegistry")
+    print("=" * 50)
+
+    created = []
+    lock = threading.Lock()
+    fail_once = {"broken"}
+
+    def fake_factory(embedding_type):
+        # Имитируем медленную загрузку модели
+        time.sleep(0.2)
+        with lock:
+            created.append(embedding_type)
+            if embedding_type in fail_once:
+                fail_once.discard(embedding_type)
+                raise Exception("модель не найдена")
+        return {"type": embedding_type}
+
+    async def scenario():
+        registry = ModelRegistry(fake_factory, "openai")
+
+        # Тест 1: загрузка идет в фоне и не блокирует event loop
+        print("1️⃣ Тест фоновой загрузки:")
+        registry.load()
+        task = asyncio.ensure_future(registry.get())
+        ticks = 0
+        while not task.done():
+            ticks += 1
+            await asyncio.sleep(0.01)
+        print(f"   ⏱ Тиков event loop во время загрузки: {ticks}")
+        assert task.result() == {"type": "openai"}
+        assert ticks > 5, "Event loop был заблокирован"
+
+        # Тест 2: повторные запросы берут сервис из кэша
+        print("2️⃣ Тест кэширования:")
+        await asyncio.gather(*[registry.get() for _ in range(10)])
+        assert created == ["openai"]
+
+        # Тест 3: пока новый сервис грузится, запросы работают на старом
+        print("3️⃣ Тест атомарного переключения:")
+        switch = asyncio.ensure_future(registry.activate("local"))
+        await asyncio.sleep(0.05)
+        in_flight = await registry.get()
+        assert in_flight == {"type": "openai"}
+        assert registry.active_type == "openai"
+        assert registry.status()["local"]["state"] == "loading"
+        await switch
+        assert registry.active_type == "local"
+        assert await registry.get() == {"type": "local"}
+        print(f"   🔀 Состояние: {registry.status()}")
+
+        # Обратное переключение не загружает модель заново
+        await registry.activate("openai")
+        assert created == ["openai", "local"]
+
+        # Тест 4: ошибка загрузки не меняет активный сервис, повторная попытка возможна
+        print("4️⃣ Тест ошибки загрузки:")
+        try:
+            await registry.activate("broken")
+            raise AssertionError("Ожидалась ошибка загрузки")
+        except Exception as e:
+            assert "модель не найдена" in str(e)
+            print(f"   ✅ Правильно обработана ошибка: {e}")
+        assert registry.active_type == "openai"
+        assert registry.status()["broken"]["state"] == "error"
+        await registry.activate("broken")
+        assert registry.active_type == "broken"
+
+        registry.shutdown()
+
+    asyncio.run(scenario())
+    print()
+    print("✅ Тестирование ModelRegistry завершено!")
+
+def main():
+    """Основная функция"""
+    test_model_registry()
+
+if __name__ == "__main__":
+    main()
@@ -4,7 +4,9 @@
 
 import os
 import sys
-from utils.text_extractor import TextExtractor
+import tempfile
+from config import Config
+from utils.text_extractor import TextExtractor, shutdown_pdf_pool
 
 def test_pdf_extraction(file_path: str):
     """Тестирует различные методы извлечения PDF"""
@@ -77,6 +79,84 @@ def test_pdf_extraction(file_path: str):
         import traceback
         traceback.print_exc()
 
+def test_parallel_pdf_extraction():
+    """Тестирует параллельный разбор большого PDF диапазонами страниц"""
+    import fitz
+    
+    print("🧪 Тестирование параллельного извлечения PDF")
+    print("=" * 60)
+    
+    pdf_path = os.path.join(tempfile.mkdtemp(), "large.pdf")
+    doc = fitz.open()
+    for page_number in range(1, 24):
+        page = doc.new_page()
+        if page_number != 10:
+            page.insert_text((72, 72), f"Page {page_number} of a long contract text")
+    doc.save(pdf_path)
+    doc.close()
+    
+    saved = (Config.PDF_PARALLEL_MIN_PAGES, Config.PDF_PARALLEL_WORKERS, Config.PDF_PARALLEL_SHARD_PAGES)
+    try:
+        Config.PDF_PARALLEL_MIN_PAGES = 0
+        sequential = TextExtractor.extract_text_with_metadata(pdf_path)
+        
+        # Порог ниже числа страниц: разбор идет в пуле процессов диапазонами по 5 страниц
+        Config.PDF_PARALLEL_MIN_PAGES, Config.PDF_PARALLEL_WORKERS, Config.PDF_PARALLEL_SHARD_PAGES = 20, 2, 5
+        progress = []
+        parallel = TextExtractor.extract_text_with_metadata(
+            pdf_path, on_page=lambda done, total: progress.append((done, total))
+        )
+    finally:
+        Config.PDF_PARALLEL_MIN_PAGES, Config.PDF_PARALLEL_WORKERS, Config.PDF_PARALLEL_SHARD_PAGES = saved
+        shutdown_pdf_pool()
+    
+    print(f"   📄 Страниц: {parallel['metadata']['total_pages']}, символов: {len(parallel['text'])}")
+    assert parallel["text"] == sequential["text"]
+    assert parallel["metadata"]["pages"] == sequential["metadata"]["pages"]
+    assert [page["page_number"] for page in parallel["metadata"]["pages"]] == list(range(1, 24))
+    assert parallel["metadata"]["pages"][9]["page_type"] == "empty"
+    # Метаданные хранят смещения страниц в тексте, а не копии текста
+    for page in parallel["metadata"]["pages"]:
+        assert "text" not in page
+        if page["page_type"] == "text":
+            assert parallel["text"][page["start"]:page["end"]].strip() == f"Page {page['page_number']} of a long contract text"
+    assert parallel["metadata"]["total_words"] == len(parallel["text"].split())
+    assert progress[-1] == (23, 23) and len(progress) == 23
+    print("✅ Результат параллельного разбора совпадает с последовательным")
+
+def test_pdf_page_classification():
+    """Тестирует классификацию страниц PDF со сканами под текстовым слоем"""
+    import fitz
+    
+    print("🧪 Тестирование классификации страниц PDF")
+    print("=" * 60)
+    
+    scan = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 64, 64), False)
+    scan.clear_with(200)
+    doc = fitz.open()
+    # Скан с распознанным невидимым текстом: изображение на всю страницу под текстовым слоем
+    page = doc.new_page()
+    page.insert_image(page.rect, pixmap=scan)
+    for line in range(22):
+        page.insert_text(
+            (72, 90 + line * 32),
+            f"Recognized line {line:02d} of the scanned contract page, invisible OCR text layer over the image.",
+            fontsize=11,
+            render_mode=3
+        )
+    # Фотография с подписью: текст занимает малую часть изображения
+    page = doc.new_page()
+    page.insert_image(page.rect, pixmap=scan)
+    page.insert_text((72, 72), "Figure 1: photo of the signed contract")
+    # Обычная текстовая страница
+    doc.new_page().insert_text((72, 72), "Plain text page of the contract")
+    
+    page_types = [TextExtractor._extract_pdf_page(page)["page_type"] for page in doc]
+    print(f"   📄 Типы страниц: {page_types}, символов на скане: {len(doc[0].get_text())}")
+    doc.close()
+    assert page_types == ["text", "mixed", "text"]
+    print("✅ Скан с текстовым слоем не отправляется на распознавание")
+
 def main():
     """Основная функция"""
     print("🧪 Тестирование новой логики извлечения PDF")
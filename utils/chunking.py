@@ -0,0 +1,296 @@
+import logging
+import re
+from bisect import bisect_right
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from config import Config
+
+# Фрагмент потока текста: (номер страницы или None, текст). Фрагменты идут подряд,
+# их конкатенация — это весь документ
+TextSegment = Tuple[Optional[int], str]
+
+logger = logging.getLogger(__name__)
+
+class Chunk(str):
+    """Текст чанка со смещениями [start, end) в исходном документе и номерами страниц.
+
+    Наследует str, поэтому везде, где ожидается список строк (эмбединги,
+    кэш, ChromaDB), чанк передается как есть.
+    """
+    
+    def __new__(cls, text: str, start: int, end: int, page_start: Optional[int] = None, page_end: Optional[int] = None):
+        chunk = super().__new__(cls, text)
+        chunk.start = start
+        chunk.end = end
+        chunk.page_start = page_start
+        chunk.page_end = page_end
+        return chunk
+    
+    def __getnewargs__(self):
+        return (str(self), self.start, self.end, self.page_start, self.page_end)
+    
+    def location(self) -> Dict[str, int]:
+        """Положение чанка в документе для метаданных ChromaDB (только заданные поля)"""
+        location = {"char_start": self.start, "char_end": self.end}
+        if self.page_start is not None:
+            location["page_start"] = self.page_start
+        if self.page_end is not None:
+            location["page_end"] = self.page_end
+        return location
+
+def text_segments(text: str, pages: Optional[List[Dict[str, Any]]] = None) -> Iterator[TextSegment]:
+    """Делит текст документа на фрагменты по страницам из метаданных извлечения (start/end)"""
+    if not pages:
+        yield None, text
+        return
+    
+    boundaries = [0] + [page["start"] for page in pages[1:]] + [len(text)]
+    for page, start, end in zip(pages, boundaries, boundaries[1:]):
+        if end > start:
+            yield page["page_number"], text[start:end]
+
+def iter_chunks(segments: Iterable[TextSegment], chunk_size: int = 1000, overlap: int = 200) -> Iterator[Chunk]:
+    """
+    Разбивает поток текста на чанки с перекрытием по мере поступления фрагментов.
+    В памяти держится только несобранный хвост текста (порядка chunk_size и одной
+    страницы), поэтому чанки можно отдавать на эмбединги до конца разбора документа.
+    Граница чанка сдвигается к последнему пробелу, как в TextExtractor.chunk_text.
+    """
+    segments = iter(segments)
+    buffer = ""
+    base = 0  # смещение начала buffer в документе
+    page_offsets: List[int] = []
+    page_numbers: List[Optional[int]] = []
+    start = 0
+    exhausted = False
+    
+    def page_at(offset: int) -> Optional[int]:
+        position = bisect_right(page_offsets, offset) - 1
+        return page_numbers[position] if position >= 0 else None
+    
+    while True:
+        # Подгружаем текст, пока не станет известно, есть ли что-то за концом чанка
+        while not exhausted and base + len(buffer) <= start + chunk_size:
+            try:
+                page_number, piece = next(segments)
+            except StopIteration:
+                exhausted = True
+                break
+            if piece:
+                page_offsets.append(base + len(buffer))
+                page_numbers.append(page_number)
+                buffer += piece
+        
+        total = base + len(buffer)
+        if start >= total:
+            return
+        
+        end = min(start + chunk_size, total)
+        if end < total:
+            # Ищем последний пробел в пределах чанка
+            last_space = buffer.rfind(' ', start - base, end - base)
+            if last_space + base > start:
+                end = last_space + base
+        
+        raw = buffer[start - base:end - base]
+        text = raw.strip()
+        if text:
+            chunk_start = start + len(raw) - len(raw.lstrip())
+            chunk_end = chunk_start + len(text)
+            yield Chunk(text, chunk_start, chunk_end, page_at(chunk_start), page_at(chunk_end - 1))
+        
+        # Последний чанк дошел до конца текста: хвост перекрытия уже целиком в нем
+        if end >= total:
+            return
+        
+        # Следующий чанк начинается с учетом перекрытия, но всегда продвигается вперед
+        start = end - overlap if end - overlap > start else end
+        
+        # Отбрасываем обработанное начало буфера (амортизированно, без копирования на каждом чанке)
+        consumed = start - base
+        if consumed > chunk_size and consumed * 2 > len(buffer):
+            buffer = buffer[consumed:]
+            base = start
+            keep = max(bisect_right(page_offsets, base) - 1, 0)
+            del page_offsets[:keep], page_numbers[:keep]
+
+# Стратегии разбивки: размер и перекрытие задаются в символах (chars) или в токенах модели эмбедингов
+CHUNKING_STRATEGIES = ("chars", "tokens", "sentences", "pages")
+
+_WORD = re.compile(r"\S+\s*")
+# Граница предложения: знак конца предложения (с закрывающими кавычками/скобками) и пробел, либо перевод строки
+_SENTENCE_END = re.compile(r"[.!?…]+[\"»”)\]]*\s+|\n\s*")
+
+def _estimate_tokens(texts: List[str]) -> List[int]:
+    # Оценка сверху: не меньше токена на каждые 3 байта UTF-8 (для кириллицы — 1.5 символа)
+    return [len(text.encode("utf-8")) // 3 + 1 for text in texts]
+
+@lru_cache(maxsize=8)
+def get_token_counter(tokenizer: Optional[str]) -> Callable[[List[str]], List[int]]:
+    """
+    Счетчик токенов для списка текстов по описанию токенизатора модели эмбедингов:
+    "tiktoken:<кодировка>" для OpenAI, "hf:<модель>" для локальных моделей.
+    Если токенизатор недоступен, используется консервативная оценка (с
+    предупреждением в логе: чанки получаются меньше заданного размера).
+    Описание — строка, чтобы разбивку можно было выполнять в пуле процессов.
+    """
+    kind, _, name = (tokenizer or "").partition(":")
+    try:
+        if kind == "tiktoken":
+            import tiktoken
+            encoding = tiktoken.get_encoding(name)
+            return lambda texts: [len(tokens) for tokens in encoding.encode_batch(texts, disallowed_special=())]
+        if kind == "hf":
+            from transformers import AutoTokenizer
+            hf_tokenizer = AutoTokenizer.from_pretrained(name)
+            return lambda texts: [
+                len(ids) for ids in hf_tokenizer(texts, add_special_tokens=False, verbose=False)["input_ids"]
+            ] if texts else []
+    except Exception as e:
+        logger.warning(f"Токенизатор {tokenizer} недоступен, размер чанков оценивается по байтам: {e}")
+    return _estimate_tokens
+
+def chunking_settings(*layers: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Собирает параметры разбивки: для каждого параметра берется первое заданное
+    значение из слоев (например, параметры загрузки, затем настройки коллекции),
+    иначе значение по умолчанию из Config для выбранной стратегии
+    """
+    layers = [layer for layer in layers if layer]
+    
+    def pick(key: str):
+        for layer in layers:
+            if layer.get(key) is not None:
+                return layer[key]
+        return None
+    
+    strategy = (pick("chunking_strategy") or Config.CHUNKING_STRATEGY).lower()
+    if strategy not in CHUNKING_STRATEGIES:
+        raise ValueError(f"Неизвестная стратегия разбивки: {strategy}. Поддерживаемые: {', '.join(CHUNKING_STRATEGIES)}")
+    
+    # Размеры слоя с другой стратегией не наследуются: они могут быть в других единицах
+    layers = [
+        layer for layer in layers
+        if (layer.get("chunking_strategy") or strategy).lower() == strategy
+    ]
+    
+    in_tokens = strategy != "chars"
+    chunk_size = pick("chunk_size") or (Config.CHUNK_TOKENS if in_tokens else Config.CHUNK_SIZE)
+    chunk_overlap = pick("chunk_overlap")
+    if chunk_overlap is None:
+        chunk_overlap = Config.CHUNK_TOKEN_OVERLAP if in_tokens else Config.CHUNK_OVERLAP
+    if chunk_size <= 0 or not 0 <= chunk_overlap < chunk_size:
+        raise ValueError("Размер чанка должен быть больше нуля, а перекрытие — от нуля до размера чанка")
+    
+    return {"chunking_strategy": strategy, "chunk_size": int(chunk_size), "chunk_overlap": int(chunk_overlap)}
+
+def _spans(pattern: re.Pattern, text: str, start: int = 0, end: Optional[int] = None) -> List[Tuple[int, int]]:
+    """Делит text[start:end] на смежные отрезки, заканчивающиеся совпадениями pattern"""
+    end = len(text) if end is None else end
+    spans = []
+    position = start
+    for match in pattern.finditer(text, start, end):
+        if match.end() > position:
+            spans.append((position, match.end()))
+            position = match.end()
+    if position < end:
+        spans.append((position, end))
+    return spans
+
+def _word_spans(text: str, start: int, end: int) -> List[Tuple[int, int]]:
+    spans = [(match.start(), match.end()) for match in _WORD.finditer(text, start, end)]
+    if spans:
+        spans[0] = (start, spans[0][1])
+    return spans
+
+def _pack(spans: List[Tuple[int, int]], sizes: List[int], budget: int, overlap: int) -> Iterator[Tuple[int, int]]:
+    """Жадно собирает подряд идущие отрезки в чанки до budget; следующий чанк
+    начинается с хвостовых отрезков предыдущего общим размером до overlap"""
+    i = 0
+    while i < len(spans):
+        j, total = i, 0
+        while j < len(spans) and (j == i or total + sizes[j] <= budget):
+            total += sizes[j]
+            j += 1
+        yield spans[i][0], spans[j - 1][1]
+        if j >= len(spans):
+            return
+        
+        k, carried = j, 0
+        while k - 1 > i and carried + sizes[k - 1] <= overlap:
+            k -= 1
+            carried += sizes[k]
+        i = k
+
+def _units(text: str, start: int, end: int, count_tokens, budget: int, by_sentences: bool) -> Tuple[List[Tuple[int, int]], List[int]]:
+    """Отрезки текста (предложения или слова) и их размер в токенах; предложения
+    длиннее бюджета делятся на слова"""
+    spans = _spans(_SENTENCE_END, text, start, end) if by_sentences else _word_spans(text, start, end)
+    sizes = count_tokens([text[a:b] for a, b in spans])
+    if not by_sentences or max(sizes, default=0) <= budget:
+        return spans, sizes
+    
+    units, unit_sizes = [], []
+    for span, size in zip(spans, sizes):
+        if size <= budget:
+            units.append(span)
+            unit_sizes.append(size)
+        else:
+            words = _word_spans(text, *span)
+            units.extend(words)
+            unit_sizes.extend(count_tokens([text[a:b] for a, b in words]))
+    return units, unit_sizes
+
+def _make_chunk(text: str, start: int, end: int, page_at: Callable[[int], Optional[int]]) -> Optional[Chunk]:
+    raw = text[start:end]
+    stripped = raw.strip()
+    if not stripped:
+        return None
+    chunk_start = start + len(raw) - len(raw.lstrip())
+    chunk_end = chunk_start + len(stripped)
+    return Chunk(stripped, chunk_start, chunk_end, page_at(chunk_start), page_at(chunk_end - 1))
+
+def chunk_document(
+    text: str,
+    metadata: Optional[Dict[str, Any]],
+    chunk_size: int = 1000,
+    overlap: int = 200,
+    strategy: str = "chars",
+    tokenizer: Optional[str] = None
+) -> List[Chunk]:
+    """
+    Чанки документа с номерами страниц из метаданных извлечения.
+
+    chars — по символам с разрывом на пробеле (потоково, iter_chunks);
+    tokens — по числу токенов модели эмбедингов, с разрывом между словами;
+    sentences — целые предложения, упакованные до chunk_size токенов;
+    pages — страница целиком, если помещается в chunk_size токенов, иначе
+    предложения в пределах страницы (для документов без страниц — как sentences).
+    """
+    pages = (metadata or {}).get("pages")
+    if strategy == "chars":
+        return list(iter_chunks(text_segments(text, pages), chunk_size, overlap))
+    if strategy not in CHUNKING_STRATEGIES:
+        raise ValueError(f"Неизвестная стратегия разбивки: {strategy}. Поддерживаемые: {', '.join(CHUNKING_STRATEGIES)}")
+    
+    page_starts = [page["start"] for page in pages] if pages else []
+    
+    def page_at(offset: int) -> Optional[int]:
+        position = bisect_right(page_starts, offset) - 1
+        return pages[max(position, 0)]["page_number"] if pages else None
+    
+    count_tokens = get_token_counter(tokenizer)
+    if strategy == "pages" and pages:
+        boundaries = [0] + page_starts[1:] + [len(text)]
+        regions = [(start, end) for start, end in zip(boundaries, boundaries[1:]) if end > start]
+    else:
+        regions = [(0, len(text))]
+    
+    chunks = []
+    for region_start, region_end in regions:
+        spans, sizes = _units(text, region_start, region_end, count_tokens, chunk_size, strategy != "tokens")
+        for start, end in _pack(spans, sizes, chunk_size, overlap):
+            chunk = _make_chunk(text, start, end, page_at)
+            if chunk is not None:
+                chunks.append(chunk)
+    return chunks
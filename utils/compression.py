@@ -0,0 +1,53 @@
+import gzip
+import io
+import shutil
+from typing import IO
+
+# Сжатие файлов загрузок: расширение файла определяет способ сжатия при чтении
+COMPRESSION_SUFFIXES = {"none": "", "gzip": ".gz", "zstd": ".zst"}
+DEFAULT_LEVELS = {"gzip": 6, "zstd": 3}
+
+def compression_suffix(compression: str) -> str:
+    """Расширение файлов со сжатием compression"""
+    if compression not in COMPRESSION_SUFFIXES:
+        raise ValueError(
+            f"Неподдерживаемое сжатие: {compression}. Доступны: {', '.join(COMPRESSION_SUFFIXES)}"
+        )
+    return COMPRESSION_SUFFIXES[compression]
+
+def compression_of(path: str) -> str:
+    """Способ сжатия файла по его расширению"""
+    for compression, suffix in COMPRESSION_SUFFIXES.items():
+        if suffix and path.endswith(suffix):
+            return compression
+    return "none"
+
+def open_file(path: str, mode: str = "rb", level: int = 0) -> IO:
+    """
+    Открывает файл, сжимая при записи и распаковывая при чтении по расширению
+    (.gz, .zst). Текстовые режимы (rt, wt) работают в UTF-8.
+    
+    Args:
+        level: уровень сжатия при записи (0 — по умолчанию для способа сжатия)
+    """
+    compression = compression_of(path)
+    binary_mode = mode.replace("t", "") + ("b" if "b" not in mode else "")
+    level = level or DEFAULT_LEVELS.get(compression)
+    
+    if compression == "gzip":
+        stream = gzip.open(path, binary_mode, compresslevel=level)
+    elif compression == "zstd":
+        import zstandard
+        if "w" in binary_mode:
+            stream = zstandard.open(path, binary_mode, cctx=zstandard.ZstdCompressor(level=level))
+        else:
+            stream = zstandard.open(path, binary_mode)
+    else:
+        stream = open(path, binary_mode)
+    
+    return io.TextIOWrapper(stream, encoding="utf-8") if "t" in mode else stream
+
+def compress_file(source_path: str, target_path: str, level: int = 0, block_size: int = 1024 * 1024):
+    """Копирует файл потоково, сжимая его по расширению target_path"""
+    with open(source_path, "rb") as source, open_file(target_path, "wb", level) as target:
+        shutil.copyfileobj(source, target, block_size)
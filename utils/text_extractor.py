@@ -1,7 +1,49 @@
+import io
 import os
+import multiprocessing
+import threading
 import fitz  # PyMuPDF
 from docx import Document
-from typing import List, Dict, Any
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Any, Callable, Generator, Iterator, Optional, Tuple
+from config import Config
+from utils.chunking import TextSegment, iter_chunks
+
+_pdf_pool: Optional[ProcessPoolExecutor] = None
+_pdf_pool_lock = threading.Lock()
+
+def _get_pdf_pool() -> ProcessPoolExecutor:
+    """Общий пул процессов для разбора больших PDF, создается при первом использовании"""
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is None:
+            # spawn: процесс сервера многопоточный, fork в нем небезопасен
+            _pdf_pool = ProcessPoolExecutor(
+                max_workers=max(1, Config.PDF_PARALLEL_WORKERS),
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pdf_pool
+
+def shutdown_pdf_pool():
+    """Останавливает пул процессов разбора PDF (следующий разбор создаст новый)"""
+    global _pdf_pool
+    with _pdf_pool_lock:
+        pool, _pdf_pool = _pdf_pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+def _extract_pdf_page_range(file_path: str, start: int, stop: int) -> List[Dict[str, Any]]:
+    """Задача пула процессов: извлекает страницы [start, stop) из PDF"""
+    with fitz.open(file_path) as doc:
+        return [TextExtractor._extract_pdf_page(doc[page_index]) for page_index in range(start, stop)]
+
+def consume(stream: Generator[Any, None, Any]) -> Any:
+    """Прогоняет генератор до конца и возвращает его результат (значение return)"""
+    while True:
+        try:
+            next(stream)
+        except StopIteration as stop:
+            return stop.value
 
 class TextExtractor:
     @staticmethod
@@ -19,12 +61,12 @@ class TextExtractor:
             raise ValueError(f"Неподдерживаемый формат файла: {file_extension}")
     
     @staticmethod
-    def extract_text_with_metadata(file_path: str) -> Dict[str, Any]:
-        """Извлекает текст с дополнительными метаданными"""
+    def extract_text_with_metadata(file_path: str, on_page: Optional[Callable[[int, int], None]] = None) -> Dict[str, Any]:
+        """Извлекает текст с дополнительными метаданными; on_page(обработано, всего) сообщает о страницах PDF"""
         file_extension = os.path.splitext(file_path)[1].lower()
         
         if file_extension == '.pdf':
-            return TextExtractor._extract_from_pdf_with_metadata(file_path)
+            return TextExtractor._extract_from_pdf_with_metadata(file_path, on_page)
         elif file_extension == '.docx':
             return TextExtractor._extract_from_docx_with_metadata(file_path)
         elif file_extension == '.txt':
@@ -32,129 +74,314 @@ class TextExtractor:
         else:
             raise ValueError(f"Неподдерживаемый формат файла: {file_extension}")
     
+    @staticmethod
+    def iter_text_with_metadata(
+        file_path: str,
+        on_page: Optional[Callable[[int, int], None]] = None
+    ) -> Generator[TextSegment, None, Dict[str, Any]]:
+        """
+        Потоковый вариант extract_text_with_metadata: по ходу извлечения отдает
+        фрагменты итогового текста (номер страницы, текст), склейка которых равна
+        тексту результата, и возвращает тот же результат. Страницы PDF отдаются
+        сразу после разбора; DOCX и TXT — одним фрагментом.
+        """
+        if os.path.splitext(file_path)[1].lower() == '.pdf':
+            return (yield from TextExtractor._join_stream(
+                TextExtractor._iter_pdf_with_metadata(file_path, on_page)
+            ))
+        
+        result = TextExtractor.extract_text_with_metadata(file_path, on_page)
+        if result["text"]:
+            yield None, result["text"]
+        return result
+    
     @staticmethod
     def _extract_from_pdf(file_path: str) -> str:
         """Извлекает текст из PDF файла"""
-        text = ""
         try:
-            doc = fitz.open(file_path)
-            for page in doc:
-                text += page.get_text()
-            doc.close()
+            with fitz.open(file_path) as doc:
+                return "".join(page.get_text() for page in doc)
         except Exception as e:
             raise Exception(f"Ошибка при извлечении текста из PDF: {str(e)}")
-        return text
     
     @staticmethod
-    def _extract_from_pdf_with_metadata(file_path: str) -> Dict[str, Any]:
-        """Извлекает текст из PDF файла с метаданными и fallback на ИИ"""
+    def _classify_pdf_page(page: "fitz.Page", page_text: str) -> str:
+        """
+        Определяет тип страницы PDF:
+        text — текстовый слой есть, распознавание не нужно;
+        scanned — текста нет, но страница не пустая (скан, векторная графика);
+        mixed — текст есть, но большую часть страницы занимают изображения,
+        не покрытые текстовым слоем;
+        empty — на странице ничего не нарисовано.
+        
+        Изображение под текстовым слоем (скан с распознанным невидимым текстом)
+        страницу смешанной не делает: учитывается только площадь изображений
+        вне области, которую занимает текст страницы.
+        """
+        if len(page_text.strip()) < Config.PDF_MIN_PAGE_CHARS:
+            return "scanned" if page.get_contents() else "empty"
+        
+        page_area = abs(page.rect) or 1
+        images = [fitz.Rect(info["bbox"]) & page.rect for info in page.get_image_info()]
+        if not images:
+            return "text"
+        # Область текстового слоя: прямоугольник, охватывающий все текстовые блоки
+        text_area = fitz.Rect()
+        for block in page.get_text("blocks"):
+            if block[6] == 0:
+                text_area |= fitz.Rect(block[:4])
+        uncovered_area = sum(abs(image) - abs(image & text_area) for image in images)
+        if uncovered_area / page_area >= Config.PDF_MIXED_IMAGE_COVERAGE:
+            return "mixed"
+        return "text"
+    
+    @staticmethod
+    def _join_with_offsets(parts: List[str]) -> Tuple[str, List[Tuple[int, int]]]:
+        """
+        Склеивает части документа через перевод строки одним join и возвращает
+        текст без пробелов по краям и смещения [start, end) каждой части в нем
+        """
+        offsets = []
+        position = 0
+        for part in parts:
+            offsets.append((position, position + len(part)))
+            position += len(part) + 1
+        
+        text = "\n".join(parts)
+        stripped = text.strip()
+        lead = len(text) - len(text.lstrip())
+        return stripped, [
+            (min(max(start - lead, 0), len(stripped)), min(max(end - lead, 0), len(stripped)))
+            for start, end in offsets
+        ]
+    
+    @staticmethod
+    def _join_stream(parts: Generator[TextSegment, None, Any]) -> Generator[TextSegment, None, Any]:
+        """
+        Потоковый вариант _join_with_offsets: отдает части через перевод строки
+        так, что склейка фрагментов равна тексту _join_with_offsets. Пробелы в начале
+        документа отбрасываются, пробельный хвост придерживается до следующего
+        непустого текста. Возвращает результат генератора parts.
+        """
+        held: List[TextSegment] = []
+        emitted = False
+        previous_label = None
+        first = True
+        while True:
+            try:
+                label, part = next(parts)
+            except StopIteration as stop:
+                return stop.value
+            
+            # Разделитель относится к предыдущей части, как в смещениях _join_with_offsets
+            if not first:
+                held.append((previous_label, "\n"))
+            first = False
+            previous_label = label
+            
+            core = part.rstrip()
+            tail = part[len(core):]
+            if not emitted:
+                held.clear()
+                core = core.lstrip()
+            if core:
+                yield from held
+                held.clear()
+                yield label, core
+                emitted = True
+            if tail:
+                held.append((label, tail))
+    
+    @staticmethod
+    def _extract_pdf_page(page: "fitz.Page") -> Dict[str, Any]:
+        """Извлекает текст и таблицы одной страницы PDF и определяет ее тип"""
+        page_text = page.get_text()
+        page_data = {
+            "page_number": page.number + 1,
+            "text": page_text,
+            "word_count": len(page_text.split()),
+            "char_count": len(page_text),
+            "tables": [],
+            "page_type": TextExtractor._classify_pdf_page(page, page_text),
+            "conversion_method": "standard"
+        }
+        
+        # Пытаемся извлечь таблицы (если метод доступен)
+        try:
+            if hasattr(page, 'get_tables'):
+                tables = page.get_tables()
+                if tables:
+                    for table_idx, table in enumerate(tables):
+                        table_text = ""
+                        for row in table:
+                            table_text += " | ".join([str(cell) if cell else "" for cell in row]) + "\n"
+                        page_data["tables"].append({
+                            "table_index": table_idx + 1,
+                            "text": table_text.strip(),
+                            "rows": len(table)
+                        })
+        except Exception:
+            # Если метод get_tables недоступен, пропускаем
+            pass
+        
+        return page_data
+    
+    @staticmethod
+    def _extract_pdf_pages_parallel(file_path: str, total_pages: int) -> Iterator[Dict[str, Any]]:
+        """
+        Разбирает PDF диапазонами страниц в пуле процессов (каждый процесс сам
+        открывает файл) и отдает страницы в исходном порядке по мере готовности
+        """
+        shard_size = max(1, Config.PDF_PARALLEL_SHARD_PAGES)
+        pool = _get_pdf_pool()
+        futures = [
+            pool.submit(_extract_pdf_page_range, file_path, start, min(start + shard_size, total_pages))
+            for start in range(0, total_pages, shard_size)
+        ]
+        try:
+            for future in futures:
+                yield from future.result()
+        finally:
+            for future in futures:
+                future.cancel()
+    
+    @staticmethod
+    def _extract_from_pdf_with_metadata(
+        file_path: str,
+        on_page: Optional[Callable[[int, int], None]] = None,
+        ai_converter=None
+    ) -> Dict[str, Any]:
+        """Извлекает текст из PDF файла с метаданными (см. _iter_pdf_with_metadata)"""
+        return consume(TextExtractor._iter_pdf_with_metadata(file_path, on_page, ai_converter))
+    
+    @staticmethod
+    def _iter_pdf_with_metadata(
+        file_path: str,
+        on_page: Optional[Callable[[int, int], None]] = None,
+        ai_converter=None
+    ) -> Generator[TextSegment, None, Dict[str, Any]]:
+        """
+        Извлекает текст из PDF файла с метаданными за один проход PyMuPDF.
+        Каждая страница классифицируется (text / scanned / mixed / empty), на
+        ИИ-распознавание уходят только сканы и смешанные страницы, текст
+        остальных берется из уже извлеченного текстового слоя.
+        
+        Генератор: тексты страниц отдаются в порядке документа, как только они
+        окончательны (страницы после распознаваемой ждут ее результата).
+        Возвращает текст и метаданные.
+        """
         try:
-            # Сначала пытаемся стандартным способом
             doc = fitz.open(file_path)
-            text = ""
+        except Exception as e:
+            raise Exception(f"Ошибка при извлечении текста из PDF: {str(e)}")
+        
+        try:
+            total_pages = len(doc)
             pages_data = []
+            page_texts = []
             total_tables = 0
-            has_text_content = False
+            ocr_pages = []
+            pending = set()  # страницы, ожидающие распознавания
+            pages_done = 0
+            emitted = 0
             
-            for page_num, page in enumerate(doc):
-                page_text = page.get_text()
-                if page_text.strip():
-                    has_text_content = True
-                
-                page_data = {
-                    "page_number": page_num + 1,
-                    "text": page_text,
-                    "word_count": len(page_text.split()),
-                    "char_count": len(page_text),
-                    "tables": []
-                }
+            def ready_pages() -> Iterator[TextSegment]:
+                # Страницы с окончательным текстом подряд от последней отданной
+                nonlocal emitted
+                while emitted < len(page_texts) and emitted + 1 not in pending:
+                    emitted += 1
+                    yield emitted, page_texts[emitted - 1]
+            
+            if Config.PDF_PARALLEL_MIN_PAGES and total_pages >= Config.PDF_PARALLEL_MIN_PAGES:
+                extracted_pages = TextExtractor._extract_pdf_pages_parallel(file_path, total_pages)
+            else:
+                extracted_pages = (TextExtractor._extract_pdf_page(page) for page in doc)
+            
+            for page_data in extracted_pages:
+                total_tables += len(page_data["tables"])
+                # Текст страницы хранится один раз — в итоговом тексте, в метаданных только смещения
+                page_texts.append(page_data.pop("text"))
+                pages_data.append(page_data)
                 
-                # Пытаемся извлечь таблицы (если метод доступен)
-                try:
-                    if hasattr(page, 'get_tables'):
-                        tables = page.get_tables()
-                        if tables:
-                            total_tables += len(tables)
-                            for table_idx, table in enumerate(tables):
-                                table_text = ""
-                                for row in table:
-                                    table_text += " | ".join([str(cell) if cell else "" for cell in row]) + "\n"
-                                page_data["tables"].append({
-                                    "table_index": table_idx + 1,
-                                    "text": table_text.strip(),
-                                    "rows": len(table)
-                                })
-                except Exception:
-                    # Если метод get_tables недоступен, пропускаем
-                    pass
+                if page_data["page_type"] in ("scanned", "mixed"):
+                    ocr_pages.append(page_data["page_number"])
+                    pending.add(page_data["page_number"])
+                    continue
                 
-                pages_data.append(page_data)
-                text += page_text + "\n"
-            
-            doc.close()
+                pages_done += 1
+                if on_page:
+                    on_page(pages_done, total_pages)
+                yield from ready_pages()
             
-            # Если текста мало или нет, используем ИИ-конвертацию
-            if not has_text_content or len(text.strip()) < 50:
+            ai_fallback_error = None
+            if ocr_pages:
                 try:
-                    from services.ai_pdf_converter import AIPDFConverter
-                    ai_converter = AIPDFConverter()
-                    ai_result = ai_converter.extract_text_with_ai_fallback(file_path)
+                    if ai_converter is None:
+                        from services.ai_pdf_converter import AIPDFConverter
+                        ai_converter = AIPDFConverter()
                     
-                    return {
-                        "text": ai_result["text"],
-                        "metadata": {
-                            **ai_result["metadata"],
-                            "conversion_method": "ai_fallback",
-                            "original_attempt": {
-                                "total_pages": len(pages_data),
-                                "total_tables": total_tables,
-                                "total_words": len(text.split()),
-                                "total_chars": len(text),
-                                "pages": pages_data
-                            }
-                        }
-                    }
+                    # Документ уже открыт: страницы рендерятся из него же, без повторного разбора файла
+                    for page_number, llm_text, error in ai_converter.recognize_pages(doc, ocr_pages):
+                        page_data = pages_data[page_number - 1]
+                        if error is None:
+                            page_texts[page_number - 1] = llm_text
+                            page_data.update({
+                                "word_count": len(llm_text.split()),
+                                "char_count": len(llm_text),
+                                "conversion_method": "ai"
+                            })
+                        else:
+                            # Остается извлеченный текстовый слой (у смешанных страниц он не пустой)
+                            page_data.update({"conversion_method": "error", "error": str(error)})
+                        
+                        pages_done += 1
+                        if on_page:
+                            on_page(pages_done, total_pages)
+                        pending.discard(page_number)
+                        yield from ready_pages()
                 except Exception as ai_error:
-                    # Если ИИ-конвертация не удалась, возвращаем стандартный результат
-                    return {
-                        "text": text.strip(),
-                        "metadata": {
-                            "total_pages": len(pages_data),
-                            "total_tables": total_tables,
-                            "total_words": len(text.split()),
-                            "total_chars": len(text),
-                            "pages": pages_data,
-                            "conversion_method": "standard",
-                            "ai_fallback_failed": str(ai_error)
-                        }
-                    }
-            
-            return {
-                "text": text.strip(),
-                "metadata": {
-                    "total_pages": len(pages_data),
-                    "total_tables": total_tables,
-                    "total_words": len(text.split()),
-                    "total_chars": len(text),
-                    "pages": pages_data,
-                    "conversion_method": "standard"
-                }
-            }
-            
-        except Exception as e:
-            raise Exception(f"Ошибка при извлечении текста из PDF: {str(e)}")
+                    # Если ИИ-конвертация недоступна, возвращаем текстовый слой
+                    ai_fallback_error = str(ai_error)
+                    if on_page and pages_done < total_pages:
+                        on_page(total_pages, total_pages)
+                
+                pending.clear()
+                yield from ready_pages()
+        finally:
+            doc.close()
+        
+        text, offsets = TextExtractor._join_with_offsets(page_texts)
+        for page_data, (start, end) in zip(pages_data, offsets):
+            page_data["start"], page_data["end"] = start, end
+        ai_converted_pages = sum(1 for page_data in pages_data if page_data["conversion_method"] == "ai")
+        
+        metadata = {
+            "total_pages": total_pages,
+            "total_tables": total_tables,
+            "total_words": sum(page_data["word_count"] for page_data in pages_data),
+            "total_chars": len(text),
+            "pages": pages_data,
+            "ai_converted_pages": ai_converted_pages,
+            "standard_converted_pages": total_pages - ai_converted_pages,
+            "conversion_method": "hybrid" if ai_converted_pages > 0 else "standard"
+        }
+        if ai_fallback_error is not None:
+            metadata["ai_fallback_failed"] = ai_fallback_error
+        
+        return {
+            "text": text,
+            "metadata": metadata
+        }
     
     @staticmethod
     def _extract_from_pdf_structured(file_path: str) -> str:
         """Извлекает текст из PDF с сохранением структуры страниц"""
-        text = ""
+        parts = []
         try:
             doc = fitz.open(file_path)
             for page_num, page in enumerate(doc):
                 # Добавляем заголовок страницы
-                text += f"\n{'='*60}\n"
-                text += f"СТРАНИЦА {page_num + 1}\n"
-                text += f"{'='*60}\n\n"
+                parts.append(f"\n{'='*60}\nСТРАНИЦА {page_num + 1}\n{'='*60}\n\n")
                 
                 # Извлекаем текст страницы
                 page_text = page.get_text()
@@ -163,39 +390,35 @@ class TextExtractor:
                 paragraphs = [p.strip() for p in page_text.split('\n\n') if p.strip()]
                 for i, paragraph in enumerate(paragraphs, 1):
                     if len(paragraph) > 10:  # Игнорируем очень короткие строки
-                        text += f"Абзац {i}: {paragraph}\n\n"
+                        parts.append(f"Абзац {i}: {paragraph}\n\n")
                 
                 # Пытаемся извлечь таблицы (если метод доступен)
                 try:
                     if hasattr(page, 'get_tables'):
                         tables = page.get_tables()
                         if tables:
-                            text += f"--- ТАБЛИЦЫ НА СТРАНИЦЕ {page_num + 1} ---\n"
+                            parts.append(f"--- ТАБЛИЦЫ НА СТРАНИЦЕ {page_num + 1} ---\n")
                             for table_idx, table in enumerate(tables, 1):
-                                text += f"\nТаблица {table_idx}:\n"
-                                text += "-" * 40 + "\n"
+                                parts.append(f"\nТаблица {table_idx}:\n" + "-" * 40 + "\n")
                                 for row in table:
-                                    text += " | ".join([str(cell) if cell else "" for cell in row]) + "\n"
-                                text += "-" * 40 + "\n"
+                                    parts.append(" | ".join([str(cell) if cell else "" for cell in row]) + "\n")
+                                parts.append("-" * 40 + "\n")
                 except Exception:
                     # Если метод get_tables недоступен, пропускаем
                     pass
                 
-                text += "\n"
+                parts.append("\n")
             doc.close()
         except Exception as e:
             raise Exception(f"Ошибка при извлечении текста из PDF: {str(e)}")
-        return text
+        return "".join(parts)
     
     @staticmethod
     def _extract_from_docx(file_path: str) -> str:
         """Извлекает текст из DOCX файла"""
         try:
             doc = Document(file_path)
-            text = ""
-            for paragraph in doc.paragraphs:
-                text += paragraph.text + "\n"
-            return text
+            return "".join(paragraph.text + "\n" for paragraph in doc.paragraphs)
         except Exception as e:
             raise Exception(f"Ошибка при извлечении текста из DOCX: {str(e)}")
     
@@ -204,25 +427,29 @@ class TextExtractor:
         """Извлекает текст из DOCX файла с метаданными"""
         try:
             doc = Document(file_path)
-            text = ""
+            paragraph_texts = []
             paragraphs_data = []
             
             for para_idx, paragraph in enumerate(doc.paragraphs):
                 para_text = paragraph.text
                 if para_text.strip():
-                    text += para_text + "\n"
+                    paragraph_texts.append(para_text)
                     paragraphs_data.append({
                         "index": para_idx + 1,
-                        "text": para_text,
                         "word_count": len(para_text.split()),
                         "style": paragraph.style.name if paragraph.style else "Normal"
                     })
             
+            # Текст абзаца не дублируется в метаданных: start/end — смещения в итоговом тексте
+            text, offsets = TextExtractor._join_with_offsets(paragraph_texts)
+            for paragraph_data, (start, end) in zip(paragraphs_data, offsets):
+                paragraph_data["start"], paragraph_data["end"] = start, end
+            
             return {
-                "text": text.strip(),
+                "text": text,
                 "metadata": {
                     "total_paragraphs": len(paragraphs_data),
-                    "total_words": len(text.split()),
+                    "total_words": sum(paragraph_data["word_count"] for paragraph_data in paragraphs_data),
                     "paragraphs": paragraphs_data
                 }
             }
@@ -245,14 +472,15 @@ class TextExtractor:
             with open(file_path, 'r', encoding='utf-8') as file:
                 text = file.read()
             
-            lines = text.split('\n')
-            paragraphs = [line.strip() for line in lines if line.strip()]
+            # Считаем строки без построения списка их копий
+            total_lines = text.count('\n') + 1
+            total_paragraphs = sum(1 for line in io.StringIO(text, newline='\n') if line.strip())
             
             return {
                 "text": text,
                 "metadata": {
-                    "total_lines": len(lines),
-                    "total_paragraphs": len(paragraphs),
+                    "total_lines": total_lines,
+                    "total_paragraphs": total_paragraphs,
                     "total_words": len(text.split()),
                     "total_chars": len(text)
                 }
@@ -262,33 +490,11 @@ class TextExtractor:
     
     @staticmethod
     def chunk_text(text: str, chunk_size: int = 1000, overlap: int = 200) -> List[str]:
-        """Разбивает текст на чанки с перекрытием"""
+        """Разбивает текст на чанки с перекрытием (чанки несут смещения в тексте, см. utils.chunking)"""
         if len(text) <= chunk_size:
             return [text]
         
-        chunks = []
-        start = 0
-        
-        while start < len(text):
-            end = start + chunk_size
-            
-            # Если это не последний чанк, ищем ближайший пробел для разрыва
-            if end < len(text):
-                # Ищем последний пробел в пределах чанка
-                last_space = text.rfind(' ', start, end)
-                if last_space > start:
-                    end = last_space
-            
-            chunk = text[start:end].strip()
-            if chunk:
-                chunks.append(chunk)
-            
-            # Следующий чанк начинается с учетом перекрытия
-            start = end - overlap
-            if start >= len(text):
-                break
-        
-        return chunks
+        return list(iter_chunks([(None, text)], chunk_size, overlap))
     
     @staticmethod
     def chunk_by_pages(text: str) -> List[str]: